@@ -2,30 +2,140 @@ from __future__ import annotations
 
 import argparse
 import base64
+import gzip
 import json
+import random
+import shutil
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
 from datetime import datetime
 from pathlib import Path
-from typing import Any, Dict, Iterable, List, Tuple
+from typing import Any, Callable, Dict, Iterable, List, Tuple
 
 from tqdm import tqdm
 
-from src.api_client import generate_with_retry, init_client
+from src.api_client import generate_many, generate_many_async, init_client
+from src.batch_state import (
+    BatchStateCache,
+    batch_state_path,
+    fetch_batch_states,
+    is_success_state,
+    is_terminal_state,
+)
 from src.config_loader import (
     load_env,
     load_profile_config,
     load_yaml,
     require_api_key,
 )
-from src.data_manager import filter_plan, load_manifest_by_index, load_plan
+from src.data_manager import (
+    PlanIndex,
+    extend_plan,
+    filter_plan_positions,
+    load_failed_indices,
+    load_manifest_by_index,
+    load_plan,
+    plan_excluded_names,
+    plan_segment_starts,
+    read_plan,
+)
 from src.image_extractor import extract_images_from_response, extract_response_metadata
-from src.output_handler import append_to_manifest, save_images, save_metadata
+from src.manifest_store import default_manifest_path
+from src.output_handler import (
+    ImageListing,
+    WriterStage,
+    append_to_manifest,
+    image_filenames,
+    save_images,
+    save_metadata,
+)
+from src.plan_keys import KeyIndex, load_exclusion_index
+from src.rate_limiter import create_rate_limiter
+
+
+# Rough size of one output JSONL line (base64 image + response envelope) per image_size, used to keep
+# --batch-chunk-bytes chunks under the output file limit as well.
+BATCH_OUTPUT_BYTES_PER_IMAGE = {"1K": 2_500_000, "2K": 9_000_000, "4K": 32_000_000}
 
 
-def chunked(seq: List[dict], size: int) -> Iterable[Tuple[int, List[dict]]]:
+def chunked(seq: Iterable[dict], size: int, boundaries: Iterable[int] = ()) -> Iterable[Tuple[int, List[dict]]]:
+    """
+    Split index-sorted items into chunks of `size`. A chunk never spans a segment boundary index
+    (--extend-plan), so chunks of the original plan keep their index ranges after an extension.
+    """
+    starts = sorted(b for b in boundaries if b > 0)
+    chunk_id = 0
+    chunk: List[dict] = []
+    pos = 0
+    for item in seq:
+        while pos < len(starts) and item["index"] >= starts[pos]:
+            if chunk:
+                yield chunk_id, chunk
+                chunk_id += 1
+                chunk = []
+            pos += 1
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk_id, chunk
+            chunk_id += 1
+            chunk = []
+    if chunk:
+        yield chunk_id, chunk
+
+
+def chunked_by_bytes(
+    seq: Iterable[dict],
+    max_bytes: int,
+    weigh: Callable[[dict], Tuple[int, int]],
+    boundaries: Iterable[int] = (),
+) -> Iterable[Tuple[int, List[dict]]]:
+    """
+    Like chunked, but closes a chunk before its input JSONL or its expected output would exceed
+    `max_bytes`; `weigh(item)` returns (input line bytes, expected output bytes). An item larger than
+    the limit on its own still gets a chunk of its own.
+    """
+    starts = sorted(b for b in boundaries if b > 0)
     chunk_id = 0
-    for i in range(0, len(seq), size):
-        yield chunk_id, seq[i : i + size]
-        chunk_id += 1
+    chunk: List[dict] = []
+    in_bytes = out_bytes = 0
+    pos = 0
+    warned = False
+    for item in seq:
+        item_in, item_out = weigh(item)
+        crosses = False
+        while pos < len(starts) and item["index"] >= starts[pos]:
+            crosses = True
+            pos += 1
+        if chunk and (crosses or in_bytes + item_in > max_bytes or out_bytes + item_out > max_bytes):
+            yield chunk_id, chunk
+            chunk_id += 1
+            chunk = []
+            in_bytes = out_bytes = 0
+        if not warned and (item_in > max_bytes or item_out > max_bytes):
+            print(f"[warn] single items exceed --batch-chunk-bytes={max_bytes} (first: index {item['index']}); one item per chunk")
+            warned = True
+        chunk.append(item)
+        in_bytes += item_in
+        out_bytes += item_out
+    if chunk:
+        yield chunk_id, chunk
+
+
+def parse_byte_size(value: str) -> int:
+    """argparse type for sizes like 500000000, 500MB, 1.5G."""
+    text = value.strip().upper().removesuffix("B")
+    scale = 1
+    for suffix, factor in (("K", 10**3), ("M", 10**6), ("G", 10**9)):
+        if text.endswith(suffix):
+            text, scale = text[: -len(suffix)], factor
+            break
+    try:
+        size = int(float(text) * scale)
+    except ValueError as exc:
+        raise argparse.ArgumentTypeError(f"invalid byte size: {value}") from exc
+    if size <= 0:
+        raise argparse.ArgumentTypeError(f"byte size must be positive: {value}")
+    return size
 
 
 def parse_batch_key(key: str) -> Tuple[str | None, str | None, int | None]:
@@ -42,53 +152,6 @@ def parse_batch_key(key: str) -> Tuple[str | None, str | None, int | None]:
         return profile, plan_name, None
 
 
-def get_state_name(batch_job: object) -> str:
-    state = getattr(batch_job, "state", None) or getattr(batch_job, "status", None)
-    if state is None:
-        return "UNKNOWN"
-    return getattr(state, "name", None) or str(state)
-
-
-def is_success_state(state_name: str) -> bool:
-    state_key = (state_name or "").upper()
-    success_states = {"JOB_STATE_SUCCEEDED", "SUCCEEDED", "JOB_STATE_COMPLETED", "COMPLETED"}
-    if state_key in success_states:
-        return True
-    if "JOB_STATE_SUCCEEDED" in state_key or state_key.endswith("SUCCEEDED"):
-        return True
-    if "JOB_STATE_COMPLETED" in state_key or state_key.endswith("COMPLETED"):
-        return True
-    return False
-
-
-def resolve_output_file_name(batch_info: object) -> Tuple[str | None, str | None]:
-    dest = getattr(batch_info, "dest", None)
-    if dest:
-        file_name = getattr(dest, "file_name", None)
-        if file_name:
-            return file_name, "dest.file_name"
-        file_name = getattr(dest, "fileName", None)
-        if file_name:
-            return file_name, "dest.fileName"
-    output_ref = getattr(batch_info, "output", None)
-    if output_ref:
-        file_name = getattr(output_ref, "name", None)
-        if file_name:
-            return file_name, "output.name"
-        file_name = getattr(output_ref, "file", None)
-        if file_name:
-            return file_name, "output.file"
-        file_name = getattr(output_ref, "file_name", None)
-        if file_name:
-            return file_name, "output.file_name"
-        file_name = getattr(output_ref, "fileName", None)
-        if file_name:
-            return file_name, "output.fileName"
-        if isinstance(output_ref, str):
-            return output_ref, "output(str)"
-    return None, None
-
-
 def download_to_path(client: object, file_name: str, out_path: Path, batch_name: str, chunk_id: int) -> bool:
     out_path.parent.mkdir(parents=True, exist_ok=True)
     try:
@@ -174,6 +237,209 @@ def upload_jsonl(client: object, input_path: Path, *, display_name: str | None,
     return client.files.upload(path=str(input_path), mime_type=mime_type)
 
 
+class BatchRequestEncoder:
+    """
+    Batch input JSONL lines. The key prefix and the generationConfig part (camel or snake case) are
+    JSON-encoded once and spliced around each prompt, so a line costs one json.dumps of the prompt text.
+    Output is byte-identical to json.dumps({"key": ..., "request": ...}, ensure_ascii=False).
+    """
+
+    def __init__(self, *, profile: str, plan_name: str, image_size: str, request_case: str) -> None:
+        if request_case == "camel":
+            config_key = "generationConfig"
+            config_body = {
+                "responseModalities": ["IMAGE"],
+                "imageConfig": {"imageSize": image_size},
+            }
+        else:
+            config_key = "generation_config"
+            config_body = {
+                "response_modalities": ["IMAGE"],
+                "image_config": {"image_size": image_size},
+            }
+        self.key_prefix = '{"key": ' + json.dumps(f"{profile}:{plan_name}:", ensure_ascii=False)[:-1]
+        self.request_prefix = '", "request": {"contents": [{"role": "user", "parts": [{"text": '
+        self.request_suffix = (
+            "}]}], " + json.dumps(config_key) + ": " + json.dumps(config_body, ensure_ascii=False) + "}}\n"
+        )
+
+    def line(self, item: dict) -> str:
+        """One request line including the trailing newline."""
+        return "".join(
+            (
+                self.key_prefix,
+                str(item["index"]),
+                self.request_prefix,
+                json.dumps(item["final_prompt"], ensure_ascii=False),
+                self.request_suffix,
+            )
+        )
+
+
+def write_batch_input(input_path: Path, items: Iterable[dict], encoder: BatchRequestEncoder) -> int:
+    """Stream request lines straight into the input file; returns the bytes written."""
+    input_path.parent.mkdir(parents=True, exist_ok=True)
+    written = 0
+    with open(input_path, "w", encoding="utf-8", newline="\n") as f:
+        for item in items:
+            line = encoder.line(item)
+            f.write(line)
+            written += len(line.encode("utf-8"))
+    return written
+
+
+def gzip_batch_input(input_path: Path) -> Path:
+    """Replace an uploaded input file by <name>.jsonl.gz (kept for reference only; uploads stay plain JSONL)."""
+    gz_path = input_path.with_name(input_path.name + ".gz")
+    with open(input_path, "rb") as src, gzip.open(gz_path, "wb", compresslevel=6) as dst:
+        shutil.copyfileobj(src, dst, 1 << 20)
+    input_path.unlink()
+    return gz_path
+
+
+def uploaded_file_name(uploaded: object) -> str | None:
+    if isinstance(uploaded, dict):
+        return uploaded.get("name") or uploaded.get("file") or uploaded.get("file_name") or uploaded.get("fileName")
+    return (
+        getattr(uploaded, "name", None)
+        or getattr(uploaded, "file", None)
+        or getattr(uploaded, "file_name", None)
+        or getattr(uploaded, "fileName", None)
+    )
+
+
+def create_batch_job(client: object, model_name: str, uploaded: object, uploaded_name: str, display_name: str, chunk_id: int):
+    try:
+        batch_job = client.batches.create(
+            model=model_name,
+            src=uploaded_name,
+            config={"display_name": display_name},
+        )
+        print(f"[info] batch create primary src={uploaded_name}")
+        return batch_job
+    except Exception as exc:  # noqa: BLE001
+        try:
+            batch_job = client.batches.create(
+                model=model_name,
+                src={"file_name": uploaded_name},
+                config={"display_name": display_name},
+            )
+            print(f"[info] batch create fallback src dict for chunk {chunk_id}")
+            return batch_job
+        except Exception as exc2:  # noqa: BLE001
+            try:
+                batch_job = client.batches.create(
+                    model=model_name,
+                    input=uploaded,
+                    config={"display_name": display_name},
+                )
+                print(f"[info] fallback create() signature used for chunk {chunk_id}")
+                return batch_job
+            except Exception as exc3:  # noqa: BLE001
+                print(f"[error] batch create failed for chunk {chunk_id}: {exc3} (orig: {exc}/{exc2})")
+                return None
+
+
+def submit_batch_chunk(
+    client: object,
+    task: Dict[str, Any],
+    *,
+    profile: str,
+    plan_name: str,
+    model_name: str,
+    encoder: BatchRequestEncoder,
+    mime_candidates: List[str],
+    gzip_inputs: bool = False,
+) -> dict | None:
+    """Serialize, upload and create the batch job of one chunk; returns the jobs.jsonl record or None."""
+    chunk_id = task["chunk_id"]
+    input_path = task["input_path"]
+    display_name = task["display_name"]
+    write_batch_input(input_path, task["items"], encoder)
+    uploaded = None
+    used_mime = None
+    for mime in mime_candidates:
+        try:
+            uploaded = upload_jsonl(client, input_path, display_name=display_name, mime_type=mime)
+            used_mime = mime
+            break
+        except Exception as exc:  # noqa: BLE001
+            print(f"[warn] upload failed batch={display_name} chunk={chunk_id} mime={mime}: {exc}")
+            continue
+    if uploaded is None:
+        print(f"[error] upload failed for chunk {chunk_id} (tried mime={mime_candidates}).")
+        return None
+    uploaded_name = uploaded_file_name(uploaded)
+    if not uploaded_name:
+        print(f"[error] upload returned no file name for chunk {chunk_id}; aborting submit.")
+        return None
+    batch_job = create_batch_job(client, model_name, uploaded, uploaded_name, display_name, chunk_id)
+    if batch_job is None:
+        return None
+    if gzip_inputs:
+        input_path = gzip_batch_input(input_path)
+    index_range = task["index_range"]
+    return {
+        "profile": profile,
+        "plan_name": plan_name,
+        "chunk_id": chunk_id,
+        "index_range": [index_range[0], index_range[1]],
+        "chunk_count": len(task["items"]),
+        "input_jsonl_path": str(input_path),
+        "uploaded_file_name": uploaded_name,
+        "batch_name": getattr(batch_job, "name", None),
+        "created_at": datetime.utcnow().isoformat(),
+        "model": model_name,
+        "mime_type": used_mime,
+    }
+
+
+def submit_batch_chunks(client: object, tasks: List[Dict[str, Any]], jobs_path: Path, *, workers: int, **submit_kwargs) -> int:
+    """
+    Run submit_batch_chunk for every chunk on a bounded thread pool (serialize -> upload -> create
+    overlap across chunks). Job records are appended to jobs.jsonl from this thread only, one line per
+    finished chunk, so a partial submit keeps every job that was created. On Ctrl-C, queued chunks are
+    cancelled and the ones already running are waited for and recorded before re-raising.
+    Returns the number submitted.
+    """
+    if not tasks:
+        return 0
+    submitted = 0
+
+    def record(future: Future) -> None:
+        nonlocal submitted
+        task = futures[future]
+        try:
+            job_rec = future.result()
+        except Exception as exc:  # noqa: BLE001
+            print(f"[error] submit failed for chunk {task['chunk_id']}: {exc}")
+            return
+        if job_rec is None:
+            return
+        append_job(jobs_path, job_rec)
+        submitted += 1
+        print(f"[submit] chunk {job_rec['chunk_id']} -> batch {job_rec['batch_name']}")
+
+    pool = ThreadPoolExecutor(max_workers=min(workers, len(tasks)), thread_name_prefix="batch-submit")
+    futures = {pool.submit(submit_batch_chunk, client, task, **submit_kwargs): task for task in tasks}
+    recorded: set = set()
+    try:
+        for future in as_completed(futures):
+            recorded.add(future)
+            record(future)
+    except BaseException:
+        pool.shutdown(wait=False, cancel_futures=True)
+        running = [future for future in futures if future not in recorded and not future.cancelled()]
+        if running:
+            print(f"[warn] interrupted; waiting for {len(running)} chunk(s) in flight so their jobs are recorded")
+        for future in as_completed(running):
+            record(future)
+        raise
+    finally:
+        pool.shutdown(wait=True)
+    return submitted
+
+
 def parse_args() -> argparse.Namespace:
     parser = argparse.ArgumentParser(description="Serendipity Mining image generator")
     parser.add_argument("--count", type=int, help="Generate only the first N items of the plan")
@@ -182,16 +448,36 @@ def parse_args() -> argparse.Namespace:
     parser.add_argument("--dry-run", action="store_true", help="Build prompts without calling the API or saving files")
     parser.add_argument("--no-save-thoughts", action="store_true", help="Do not save thinking images")
     parser.add_argument("--plan-path", type=str, help="Custom plan.jsonl path")
-    parser.add_argument("--manifest-path", type=str, help="Custom manifest.jsonl path")
+    parser.add_argument(
+        "--manifest-path", type=str, help="Custom manifest path (.jsonl, or .sqlite/.db for the SQLite backend)"
+    )
     parser.add_argument("--profile", type=str, default="3labs", help="Profile name (e.g., 3labs, 4cats)")
     parser.add_argument("--seed", type=int, help="Seed for deterministic plan/prompt generation")
     parser.add_argument("--rerun", type=int, default=0, help="Rerun N successes from manifest (optional)")
     parser.add_argument("--plan-name", type=str, default="plan", help="Plan file name without extension (default: plan)")
     parser.add_argument("--regen-plan", action="store_true", help="Force regenerate plan even if it exists")
     parser.add_argument("--exclude-plan", action="append", help="Plan name(s) to exclude (comma separated or repeatable)")
+    parser.add_argument(
+        "--extend-plan",
+        type=int,
+        default=0,
+        help="Append N new unique items to the existing plan (continues indices and the saved sampler state)",
+    )
     parser.add_argument("--mode", choices=["sync", "batch"], default="sync", help="sync (default) or batch")
     parser.add_argument(
-        "--batch-action", choices=["submit", "status", "collect"], help="Batch action: submit, status, collect"
+        "--concurrency",
+        type=int,
+        help="Number of concurrent requests in sync mode (default: config concurrency or 1)",
+    )
+    parser.add_argument(
+        "--sync-driver",
+        choices=["threads", "asyncio"],
+        help="Sync mode request driver: threads (thread pool) or asyncio (single event loop, client.aio)",
+    )
+    parser.add_argument(
+        "--batch-action",
+        choices=["submit", "status", "collect", "watch"],
+        help="Batch action: submit, status, collect, watch (poll + auto-collect until the plan is resolved)",
     )
     parser.add_argument(
         "--batch-chunk-size",
@@ -199,6 +485,23 @@ def parse_args() -> argparse.Namespace:
         default=300,
         help="Chunk size for batch submit (default 300; smaller to avoid large files)",
     )
+    parser.add_argument(
+        "--batch-chunk-bytes",
+        type=parse_byte_size,
+        default=None,
+        help="Pack batch chunks by size instead of count: max input JSONL / expected output bytes per chunk (e.g. 1.5GB)",
+    )
+    parser.add_argument(
+        "--batch-input-gzip",
+        action="store_true",
+        help="Keep submitted batch inputs as .jsonl.gz (upload is still plain JSONL)",
+    )
+    parser.add_argument(
+        "--batch-submit-workers",
+        type=int,
+        default=4,
+        help="Chunks serialized/uploaded/created in parallel during batch submit (default 4)",
+    )
     parser.add_argument("--batch-force-submit", action="store_true", help="Force re-submit even if jobs exist")
     parser.add_argument(
         "--batch-request-case",
@@ -217,6 +520,30 @@ def parse_args() -> argparse.Namespace:
         default=None,
         help="Axis distribution mode for plan generation (weighted or balanced)",
     )
+    parser.add_argument(
+        "--plan-engine",
+        choices=["python", "numpy"],
+        default=None,
+        help="Plan generator (python: default, numpy: vectorized batches for very large plans)",
+    )
+    parser.add_argument(
+        "--plan-format",
+        choices=["jsonl", "compact"],
+        default=None,
+        help="File format for newly generated plans (jsonl: one full item per line, compact: header + id rows)",
+    )
+    parser.add_argument(
+        "--plan-workers",
+        type=int,
+        default=None,
+        help="Processes for plan generation (python engine; default: config plan_workers or 1)",
+    )
+    parser.add_argument(
+        "--sampler",
+        choices=["v1", "v2"],
+        default=None,
+        help="Weighted sampler for plan generation (v1: legacy seeded sequence, v2: alias tables)",
+    )
     parser.add_argument(
         "--batch-mime-type",
         type=str,
@@ -228,6 +555,42 @@ def parse_args() -> argparse.Namespace:
         type=int,
         help="Max number of completed batch jobs to collect in one run",
     )
+    parser.add_argument(
+        "--batch-status-workers",
+        type=int,
+        default=8,
+        help="Concurrent batches.get calls for batch status/collect (default 8)",
+    )
+    parser.add_argument(
+        "--batch-state-ttl",
+        type=float,
+        default=60.0,
+        help="Seconds a cached non-terminal state in batches/<plan>.state.jsonl is reused (default 60; 0 = refetch)",
+    )
+    parser.add_argument(
+        "--batch-watch-interval",
+        type=float,
+        default=60.0,
+        help="watch: base seconds between polls (jittered, backs off x1.5 while nothing changes; default 60)",
+    )
+    parser.add_argument(
+        "--batch-watch-max-interval",
+        type=float,
+        default=600.0,
+        help="watch: upper bound of the poll backoff in seconds (default 600)",
+    )
+    parser.add_argument(
+        "--batch-watch-max-resubmits",
+        type=int,
+        default=2,
+        help="watch with --batch-resubmit-failed: times a failed item is resubmitted (default 2)",
+    )
+    parser.add_argument(
+        "--batch-watch-max-failures",
+        type=int,
+        default=5,
+        help="watch: polls in a row a job's status fetch or output download may fail before it is given up (default 5)",
+    )
     parser.add_argument(
         "--batch-delete-output",
         action="store_true",
@@ -305,20 +668,15 @@ def summarize_counts(plan: List[dict], manifest_cache: Dict[int, dict]) -> None:
     print(f"[summary] total={total} success={success} failed={failed} pending={pending}")
 
 
-def is_completed(meta: Dict[str, Any], images_root: Path) -> bool:
+def is_completed(meta: Dict[str, Any], images_root: Path, listing: ImageListing | None = None) -> bool:
     if not meta:
         return False
     status = meta.get("status")
-    if status == "success":
-        fname = meta.get("final_image_filename")
-        if fname:
-            fpath = images_root / meta.get("axis_id", "") / fname
-            return fpath.exists()
-        return True
-    # legacy fallback
-    if status is None and meta.get("error_type") in (None, "null"):
+    if status == "success" or (status is None and meta.get("error_type") in (None, "null")):  # legacy fallback
         fname = meta.get("final_image_filename")
         if fname:
+            if listing is not None:
+                return listing.exists(meta.get("axis_id", ""), fname)
             fpath = images_root / meta.get("axis_id", "") / fname
             return fpath.exists()
         return True
@@ -390,7 +748,11 @@ def main() -> None:
     meta_root = output_dir / "meta"
     plan_name = args.plan_name
     plan_path = Path(args.plan_path) if args.plan_path else output_dir / f"{plan_name}.jsonl"
-    manifest_path = Path(args.manifest_path) if args.manifest_path else output_dir / "manifest.jsonl"
+    manifest_path = (
+        Path(args.manifest_path)
+        if args.manifest_path
+        else default_manifest_path(output_dir, cfg.get("manifest_backend"))
+    )
     dry_run = bool(cfg.get("dry_run")) or args.dry_run
     save_thoughts = bool(cfg.get("save_thoughts", True)) and not args.no_save_thoughts
     image_size = str(cfg.get("image_config", {}).get("image_size", "2K"))
@@ -426,6 +788,12 @@ def main() -> None:
         axis_distribution = args.axis_distribution
     target_count = int(cfg.get("target_count", cfg.get("standard_per_combo", 0) or 0))
     dedupe_mode = str(cfg.get("dedupe_mode", "strict"))
+    sampler = args.sampler or str(cfg.get("sampler", "v1"))
+    plan_engine = args.plan_engine or str(cfg.get("plan_engine", "python"))
+    plan_format = args.plan_format or str(cfg.get("plan_format", "jsonl"))
+    plan_workers = args.plan_workers if args.plan_workers is not None else int(cfg.get("plan_workers", 1))
+    if plan_workers > 1 and plan_engine != "python":
+        print(f"[warn] plan_workers={plan_workers} ignored for plan_engine {plan_engine}")
     tag_sampling = cfg.get("tag_sampling", {})
     sampling_controls = cfg.get("sampling_controls", {})
 
@@ -434,53 +802,81 @@ def main() -> None:
     if args.exclude_plan:
         for entry in args.exclude_plan:
             exclude_plan_names.extend([name.strip() for name in entry.split(",") if name.strip()])
-    exclude_keys: set[str] = set()
-    if exclude_plan_names and not args.regen_plan and plan_path.exists():
+    if args.extend_plan:
+        if args.regen_plan:
+            raise ValueError("--extend-plan cannot be combined with --regen-plan.")
+        if not plan_path.exists():
+            raise FileNotFoundError(f"plan to extend not found: {plan_path}")
+        # Plans excluded when the plan was generated stay excluded; --exclude-plan adds to them.
+        saved_excluded = plan_excluded_names(plan_path)
+        added = [name for name in exclude_plan_names if name not in saved_excluded]
+        if added:
+            print(f"[info] --exclude-plan adds {', '.join(added)} to the plan's excluded plans")
+        exclude_plan_names = list(dict.fromkeys(saved_excluded + exclude_plan_names))
+    exclude_keys: KeyIndex | set[str] = set()
+    if exclude_plan_names and not (args.regen_plan or args.extend_plan) and plan_path.exists():
         print(f"[info] plan exists at {plan_path}, exclude_plan ignored (use --regen-plan to regenerate).")
-    if exclude_plan_names and args.regen_plan:
-        for name in exclude_plan_names:
-            ex_path = output_dir / f"{name}.jsonl"
+    if exclude_plan_names and (args.regen_plan or args.extend_plan):
+        ex_paths = [output_dir / f"{name}.jsonl" for name in exclude_plan_names]
+        for ex_path in ex_paths:
             if not ex_path.exists():
                 raise FileNotFoundError(f"exclude plan not found: {ex_path}")
-            lines = ex_path.read_text(encoding="utf-8").splitlines()
-            for line in lines:
-                if not line.strip():
-                    continue
-                data = json.loads(line)
-                slots = data.get("slots") or {}
-                key = "|".join(
-                    [data.get("axis_id", "")]
-                    + [f"{k}={v}" for k, v in sorted(slots.items())]
-                )
-                exclude_keys.add(key)
-
-    plan = load_plan(
-        plan_path,
-        axis_templates,
-        vocab,
-        cfg.get("axis_ids", []),
-        target_count,
-        global_suffix,
-        axis_weights,
-        axis_distribution,
-        dedupe_mode,
-        args.seed,
-        profile,
-        args.regen_plan,
-        exclude_keys=exclude_keys,
-        excluded_plans=exclude_plan_names if args.regen_plan else [],
-        tag_sampling=tag_sampling,
-        sampling_controls=sampling_controls,
-    )
+        exclude_keys = load_exclusion_index(ex_paths)
+
+    if args.extend_plan:
+        plan = read_plan(plan_path, as_items=True)
+        new_items = extend_plan(
+            plan_path,
+            args.extend_plan,
+            axis_templates,
+            vocab,
+            cfg.get("axis_ids", []),
+            global_suffix,
+            axis_weights,
+            axis_distribution,
+            dedupe_mode,
+            profile,
+            exclude_keys=exclude_keys,
+            tag_sampling=tag_sampling,
+            sampling_controls=sampling_controls,
+            sampler=sampler,
+            excluded_plans=exclude_plan_names,
+            existing=plan,
+        )
+        plan.extend(new_items)
+        print(f"[info] extended {plan_path.name} by {args.extend_plan} items (now {len(plan)}).")
+    else:
+        plan = load_plan(
+            plan_path,
+            axis_templates,
+            vocab,
+            cfg.get("axis_ids", []),
+            target_count,
+            global_suffix,
+            axis_weights,
+            axis_distribution,
+            dedupe_mode,
+            args.seed,
+            profile,
+            args.regen_plan,
+            exclude_keys=exclude_keys,
+            excluded_plans=exclude_plan_names if args.regen_plan else [],
+            tag_sampling=tag_sampling,
+            sampling_controls=sampling_controls,
+            sampler=sampler,
+            plan_engine=plan_engine,
+            plan_workers=plan_workers,
+            plan_format=plan_format,
+        )
     if args.seed is not None and plan_path.exists() and not args.regen_plan:
         print(f"[info] plan exists at {plan_path}, seed {args.seed} ignored; using existing plan.")
     for item in plan:
         item.setdefault("profile", profile)
         item.setdefault("generation_type", "standard")
-    plan_by_index = {item["index"]: item for item in plan}
-    filtered_plan = filter_plan(plan, axis=args.axis, bundle=None, count=args.count)
+    plan_by_index = PlanIndex(plan)
+    filtered_positions = filter_plan_positions(plan, axis=args.axis, bundle=None, count=args.count)
 
-    manifest_cache = load_manifest_by_index(manifest_path)
+    manifest_cache = load_manifest_by_index(manifest_path, plan_name=plan_name, profile=profile)
 
     def in_current_plan(meta: Dict[str, Any]) -> bool:
         if not meta:
@@ -493,38 +889,35 @@ def main() -> None:
         return True
 
     manifest_cache_filtered = {idx: meta for idx, meta in manifest_cache.items() if in_current_plan(meta)}
-    completed_indices = {idx for idx, meta in manifest_cache_filtered.items() if is_completed(meta, images_root)}
-    failed_indices = {
-        idx
-        for idx, meta in manifest_cache_filtered.items()
-        if meta.get("status") in ("error", "failed", "failure") or meta.get("error")
+    image_listing = ImageListing(images_root, cache_path=output_dir / "images_listing.json")
+    completed_indices = {
+        idx for idx, meta in manifest_cache_filtered.items() if is_completed(meta, images_root, image_listing)
     }
+    if not dry_run:
+        # Only real runs refresh the listing cache; --dry-run still reads it.
+        image_listing.save()
+    failed_indices = load_failed_indices(manifest_path, plan_name, profile, latest=manifest_cache_filtered)
 
     # batch mode handling
     if args.mode == "batch":
         if args.batch_action is None:
-            raise ValueError("In batch mode, --batch-action is required (submit|status|collect).")
+            raise ValueError("In batch mode, --batch-action is required (submit|status|collect|watch).")
         batch_inputs_dir = output_dir / "batch_inputs"
         batch_outputs_dir = output_dir / "batch_outputs"
         jobs_path = output_dir / "batches" / f"{plan_name}.jobs.jsonl"
         collected_path = output_dir / "batches" / f"{plan_name}.collected.jsonl"
+        collected_names = load_collected(collected_path)
+        encoder = BatchRequestEncoder(
+            profile=profile, plan_name=plan_name, image_size=image_size, request_case=args.batch_request_case
+        )
 
-        if args.batch_action == "submit":
-            target_plan = sorted(filtered_plan, key=lambda item: item["index"])
-            if not target_plan:
-                print("No plan items to submit. Check filters or plan file.")
-                return
-            if args.batch_resubmit_failed:
-                if not any(item["index"] in failed_indices for item in target_plan):
-                    print("No failed items found; nothing to resubmit.")
-                    return
-            elif not any(item["index"] not in completed_indices for item in target_plan):
-                print("All filtered plan items already succeeded; nothing to submit.")
-                return
-            existing_jobs = load_jobs(jobs_path)
+        target_positions = sorted(filtered_positions, key=lambda pos: plan[pos]["index"])
+
+        def plan_batch_tasks(select: Callable[[dict], bool], force: bool, verbose: bool = True) -> List[Dict[str, Any]]:
+            """Chunk the target items (stable chunk ids) and keep the selected items of chunks to submit."""
             existing_keys = set()
             existing_chunk_ids = set()
-            for job in existing_jobs:
+            for job in load_jobs(jobs_path):
                 if job.get("profile") != profile or job.get("plan_name") != plan_name:
                     continue
                 chunk_id = int(job.get("chunk_id", -1))
@@ -533,129 +926,77 @@ def main() -> None:
                     existing_keys.add((chunk_id, (index_range[0], index_range[1])))
                 existing_chunk_ids.add(chunk_id)
 
-            for chunk_id, chunk_items in chunked(target_plan, max(args.batch_chunk_size, 1)):
+            segment_starts = plan_segment_starts(plan_path)
+            target_plan = (plan[pos] for pos in target_positions)
+            if args.batch_chunk_bytes:
+                output_bytes = BATCH_OUTPUT_BYTES_PER_IMAGE.get(image_size.upper(), BATCH_OUTPUT_BYTES_PER_IMAGE["4K"])
+
+                def weigh(item: dict) -> Tuple[int, int]:
+                    return len(encoder.line(item).encode("utf-8")), output_bytes
+
+                chunks = chunked_by_bytes(target_plan, args.batch_chunk_bytes, weigh, segment_starts)
+            else:
+                chunks = chunked(target_plan, max(args.batch_chunk_size, 1), segment_starts)
+            tasks: List[Dict[str, Any]] = []
+            for chunk_id, chunk_items in chunks:
                 index_range = (chunk_items[0]["index"], chunk_items[-1]["index"])
-                if args.batch_resubmit_failed:
-                    pending_items = [item for item in chunk_items if item["index"] in failed_indices]
-                else:
-                    pending_items = [item for item in chunk_items if item["index"] not in completed_indices]
+                pending_items = [item for item in chunk_items if select(item)]
                 if not pending_items:
-                    print(f"[skip] chunk {chunk_id} already all success; nothing to submit.")
+                    if verbose:
+                        print(f"[skip] chunk {chunk_id} already all success; nothing to submit.")
                     continue
-                if (chunk_id, index_range) in existing_keys and not (args.batch_force_submit or args.batch_resubmit_failed):
+                if (chunk_id, index_range) in existing_keys and not force:
                     print(
                         f"[skip] chunk {chunk_id} already submitted (jobs.jsonl). Use --batch-force-submit to resubmit."
                     )
                     continue
-                if chunk_id in existing_chunk_ids and not (args.batch_force_submit or args.batch_resubmit_failed):
+                if chunk_id in existing_chunk_ids and not force:
                     print(
                         f"[warn] chunk {chunk_id} exists with different index_range; submitting new job for {index_range}."
                     )
-                input_path = batch_inputs_dir / f"{plan_name}__chunk{chunk_id:04d}.jsonl"
-                input_path.parent.mkdir(parents=True, exist_ok=True)
-                lines = []
-                for it in pending_items:
-                    key = f"{profile}:{plan_name}:{it['index']}"
-                    if args.batch_request_case == "camel":
-                        config_key = "generationConfig"
-                        config_body = {
-                            "responseModalities": ["IMAGE"],
-                            "imageConfig": {"imageSize": image_size},
-                        }
-                    else:
-                        config_key = "generation_config"
-                        config_body = {
-                            "response_modalities": ["IMAGE"],
-                            "image_config": {"image_size": image_size},
-                        }
-                    req = {
-                        "contents": [{"role": "user", "parts": [{"text": it["final_prompt"]}]}],
-                        config_key: config_body,
+                tasks.append(
+                    {
+                        "chunk_id": chunk_id,
+                        "index_range": index_range,
+                        "items": pending_items,
+                        "input_path": batch_inputs_dir / f"{plan_name}__chunk{chunk_id:04d}.jsonl",
+                        "display_name": f"{profile}-{plan_name}-chunk{chunk_id:04d}",
                     }
-                    lines.append(json.dumps({"key": key, "request": req}, ensure_ascii=False))
-                input_path.write_text("\n".join(lines) + "\n", encoding="utf-8")
-                display_name = f"{profile}-{plan_name}-chunk{chunk_id:04d}"
-                mime_candidates = [
-                    args.batch_mime_type,
-                    "jsonl",
-                    "application/jsonl",
-                    "text/plain",
-                ]
-                uploaded = None
-                used_mime = None
-                for mime in mime_candidates:
-                    try:
-                        uploaded = upload_jsonl(client, input_path, display_name=display_name, mime_type=mime)
-                        used_mime = mime
-                        break
-                    except Exception as exc:  # noqa: BLE001
-                        print(f"[warn] upload failed batch={display_name} chunk={chunk_id} mime={mime}: {exc}")
-                        continue
-                if uploaded is None:
-                    print(
-                        f"[error] upload failed for chunk {chunk_id} (tried mime={mime_candidates})."
-                    )
-                    continue
-                if isinstance(uploaded, dict):
-                    uploaded_name = (
-                        uploaded.get("name")
-                        or uploaded.get("file")
-                        or uploaded.get("file_name")
-                        or uploaded.get("fileName")
-                    )
-                else:
-                    uploaded_name = (
-                        getattr(uploaded, "name", None)
-                        or getattr(uploaded, "file", None)
-                        or getattr(uploaded, "file_name", None)
-                        or getattr(uploaded, "fileName", None)
-                    )
-                if not uploaded_name:
-                    print(f"[error] upload returned no file name for chunk {chunk_id}; aborting submit.")
-                    continue
-                try:
-                    batch_job = client.batches.create(
-                        model=model_name_api,
-                        src=uploaded_name,
-                        config={"display_name": display_name},
-                    )
-                    print(f"[info] batch create primary src={uploaded_name}")
-                except Exception as exc:  # noqa: BLE001
-                    try:
-                        batch_job = client.batches.create(
-                            model=model_name_api,
-                            src={"file_name": uploaded_name},
-                            config={"display_name": display_name},
-                        )
-                        print(f"[info] batch create fallback src dict for chunk {chunk_id}")
-                    except Exception as exc2:  # noqa: BLE001
-                        try:
-                            batch_job = client.batches.create(
-                                model=model_name_api,
-                                input=uploaded,
-                                config={"display_name": display_name},
-                            )
-                            print(f"[info] fallback create() signature used for chunk {chunk_id}")
-                        except Exception as exc3:  # noqa: BLE001
-                            print(
-                                f"[error] batch create failed for chunk {chunk_id}: {exc3} (orig: {exc}/{exc2})"
-                            )
-                            continue
-                job_rec = {
-                    "profile": profile,
-                    "plan_name": plan_name,
-                    "chunk_id": chunk_id,
-                    "index_range": [index_range[0], index_range[1]],
-                    "chunk_count": len(pending_items),
-                    "input_jsonl_path": str(input_path),
-                    "uploaded_file_name": uploaded_name,
-                    "batch_name": getattr(batch_job, "name", None),
-                    "created_at": datetime.utcnow().isoformat(),
-                    "model": model_name_api,
-                    "mime_type": used_mime,
-                }
-                append_job(jobs_path, job_rec)
-                print(f"[submit] chunk {chunk_id} -> batch {job_rec['batch_name']}")
+                )
+            return tasks
+
+        def submit_tasks(tasks: List[Dict[str, Any]]) -> int:
+            return submit_batch_chunks(
+                client,
+                tasks,
+                jobs_path,
+                workers=max(int(args.batch_submit_workers or 1), 1),
+                profile=profile,
+                plan_name=plan_name,
+                model_name=model_name_api,
+                encoder=encoder,
+                mime_candidates=[args.batch_mime_type, "jsonl", "application/jsonl", "text/plain"],
+                gzip_inputs=args.batch_input_gzip,
+            )
+
+        if args.batch_action == "submit":
+            if not target_positions:
+                print("No plan items to submit. Check filters or plan file.")
+                return
+            if args.batch_resubmit_failed:
+                if not any(plan[pos]["index"] in failed_indices for pos in target_positions):
+                    print("No failed items found; nothing to resubmit.")
+                    return
+            elif not any(plan[pos]["index"] not in completed_indices for pos in target_positions):
+                print("All filtered plan items already succeeded; nothing to submit.")
+                return
+            if args.batch_resubmit_failed:
+                tasks = plan_batch_tasks(lambda item: item["index"] in failed_indices, force=True)
+            else:
+                tasks = plan_batch_tasks(
+                    lambda item: item["index"] not in completed_indices, force=args.batch_force_submit
+                )
+            submit_tasks(tasks)
             return
 
         if args.batch_action == "status":
@@ -663,19 +1004,23 @@ def main() -> None:
             if not jobs:
                 print(f"No jobs found at {jobs_path}")
                 return
-            collected_names = load_collected(collected_path)
+            state_cache = BatchStateCache(batch_state_path(jobs_path), ttl=args.batch_state_ttl)
+            states, fetch_errors = fetch_batch_states(
+                client,
+                (job["batch_name"] for job in jobs if job.get("batch_name")),
+                state_cache,
+                args.batch_status_workers,
+            )
             state_counts: Dict[str, int] = {}
             for job in jobs:
                 bname = job.get("batch_name")
                 if not bname:
                     print(f"[warn] job missing batch_name: {job}")
                     continue
-                try:
-                    batch_info = client.batches.get(name=bname)
-                except Exception as exc:  # noqa: BLE001
-                    print(f"[error] status fetch failed for {bname}: {exc}")
+                if bname in fetch_errors:
+                    print(f"[error] status fetch failed for {bname}: {fetch_errors[bname]}")
                     continue
-                state_name = get_state_name(batch_info)
+                state_name = states[bname]["state"]
                 state_counts[state_name] = state_counts.get(state_name, 0) + 1
                 collected_flag = "yes" if bname in collected_names else "no"
                 print(
@@ -688,17 +1033,159 @@ def main() -> None:
                 print(f"[collected] {len(collected_names)} job(s) marked as collected")
             return
 
+        def collect_batch_job(job: dict, output_name: str, run_id: str) -> Tuple[int, int] | None:
+            """Download one succeeded job's output and record every item; returns (success, failed) or None."""
+            bname = job["batch_name"]
+            out_path = batch_outputs_dir / f"{plan_name}__chunk{job.get('chunk_id', 0):04d}.jsonl"
+            out_path.parent.mkdir(parents=True, exist_ok=True)
+            ok = download_to_path(
+                client,
+                output_name,
+                out_path,
+                batch_name=bname,
+                chunk_id=int(job.get("chunk_id", 0)),
+            )
+            if not ok:
+                return None
+            success_new = 0
+            failed_new = 0
+
+            with open(out_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    if not line.strip():
+                        continue
+                    try:
+                        data = json.loads(line)
+                    except Exception:
+                        continue
+                    key = data.get("key", "")
+                    k_profile, k_plan, k_idx = parse_batch_key(key)
+                    if k_idx is None:
+                        print(f"[warn] invalid key in output: {key}")
+                        continue
+                    if k_profile and k_profile != profile:
+                        print(f"[warn] profile mismatch for key {key}, skipping")
+                        continue
+                    if k_plan and k_plan != plan_name:
+                        print(f"[warn] plan mismatch for key {key}, skipping")
+                        continue
+                    item = plan_by_index.get(k_idx)
+                    if not item:
+                        print(f"[warn] index {k_idx} not in plan, skipping")
+                        continue
+                    if k_idx in completed_indices:
+                        print(f"[skip] index {k_idx} already success, not overwriting.")
+                        continue
+                    prompt_meta: Dict[str, Any] = {
+                        "template_text": item.get("template_text"),
+                        "domain_injection": domain_injection,
+                    }
+                    metadata = build_metadata_base(
+                        run_id,
+                        item,
+                        item["final_prompt"],
+                        prompt_meta,
+                        image_size,
+                        model_name_meta,
+                        profile,
+                        plan_name,
+                    )
+                    base_name = f"batch_{plan_name}_{k_idx:04d}_{item['axis_id']}"
+                    metadata["batch_name"] = bname
+                    metadata["chunk_id"] = job.get("chunk_id")
+                    metadata["batch_key"] = key
+                    img_dir = images_root / item["axis_id"]
+                    meta_dir = meta_root / item["axis_id"]
+                    if data.get("error"):
+                        err = data.get("error")
+                        metadata = handle_error_metadata(
+                            metadata,
+                            {
+                                "error": err,
+                                "error_type": "BATCH_ERROR",
+                                "http_status": None,
+                                "retry_count": 0,
+                            },
+                        )
+                        save_metadata(meta_dir, base_name, metadata)
+                        append_to_manifest(manifest_path, metadata)
+                        manifest_cache[k_idx] = metadata
+                        manifest_cache_filtered[k_idx] = metadata
+                        failed_indices.add(k_idx)
+                        failed_new += 1
+                        continue
+                    try:
+                        img_bytes = decode_image_from_response(data.get("response") or {})
+                    except Exception as exc:  # noqa: BLE001
+                        metadata = handle_error_metadata(
+                            metadata,
+                            {
+                                "error": str(exc),
+                                "error_type": "NO_IMAGE_DATA",
+                                "http_status": None,
+                                "retry_count": 0,
+                            },
+                        )
+                        save_metadata(meta_dir, base_name, metadata)
+                        append_to_manifest(manifest_path, metadata)
+                        manifest_cache[k_idx] = metadata
+                        manifest_cache_filtered[k_idx] = metadata
+                        failed_indices.add(k_idx)
+                        failed_new += 1
+                        continue
+                    extracted = {"final_image": img_bytes, "thought_images": []}
+                    saved_paths = save_images(extracted, img_dir, base_name, save_thoughts=False)
+                    metadata |= {
+                        "status": "success",
+                        "image_part_index": 0,
+                        "total_image_parts": 1,
+                        "is_thought": False,
+                        "thought_images_saved": [],
+                        "final_image_filename": saved_paths.get("final"),
+                        "response_metadata": {"batch_name": bname, "key": key},
+                        "error": None,
+                        "error_type": None,
+                        "http_status": None,
+                        "retry_count": 0,
+                    }
+                    save_metadata(meta_dir, base_name, metadata)
+                    append_to_manifest(manifest_path, metadata)
+                    manifest_cache[k_idx] = metadata
+                    manifest_cache_filtered[k_idx] = metadata
+                    completed_indices.add(k_idx)
+                    failed_indices.discard(k_idx)
+                    success_new += 1
+            if args.batch_delete_output:
+                delete_output_file(client, output_name, bname)
+            collected_names.add(bname)
+            append_collected(
+                collected_path,
+                {
+                    "batch_name": bname,
+                    "chunk_id": job.get("chunk_id"),
+                    "collected_at": datetime.utcnow().isoformat(),
+                    "output_path": str(out_path),
+                },
+            )
+            return success_new, failed_new
+
         if args.batch_action == "collect":
             jobs = load_jobs(jobs_path)
             if not jobs:
                 print(f"No jobs found at {jobs_path}")
                 return
-            collected_names = load_collected(collected_path)
             run_id = f"batch_collect_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
             success_new = 0
             failed_new = 0
             collected_jobs = 0
             collect_limit = int(args.batch_collect_limit or 0)
+            state_cache = BatchStateCache(batch_state_path(jobs_path), ttl=args.batch_state_ttl)
+            states, fetch_errors = fetch_batch_states(
+                client,
+                (job["batch_name"] for job in jobs if job.get("batch_name") and job["batch_name"] not in collected_names),
+                state_cache,
+                args.batch_status_workers,
+            )
             for job in jobs:
                 if collect_limit and collected_jobs >= collect_limit:
                     print(f"[info] batch collect limit reached ({collect_limit}); stopping.")
@@ -710,253 +1197,325 @@ def main() -> None:
                 if bname in collected_names:
                     print(f"[skip] batch {bname} already collected; skipping.")
                     continue
-                try:
-                    batch_info = client.batches.get(name=bname)
-                except Exception as exc:  # noqa: BLE001
-                    print(f"[error] status fetch failed for {bname}: {exc}")
+                if bname in fetch_errors:
+                    print(f"[error] status fetch failed for {bname}: {fetch_errors[bname]}")
                     continue
-                state_name = get_state_name(batch_info)
+                state_name = states[bname]["state"]
                 if not is_success_state(state_name):
                     print(f"[info] batch {bname} not completed (state={state_name}), skipping collect.")
                     continue
-                output_name, output_source = resolve_output_file_name(batch_info)
+                output_name, output_source = states[bname]["output_file"], states[bname]["output_source"]
                 if output_name and output_source:
                     print(f"[info] batch {bname} output source={output_source}")
                 if not output_name:
                     print(f"[warn] batch {bname} has no output reference (dest/output).")
                     continue
-                out_path = batch_outputs_dir / f"{plan_name}__chunk{job.get('chunk_id', 0):04d}.jsonl"
-                out_path.parent.mkdir(parents=True, exist_ok=True)
-                ok = download_to_path(
-                    client,
-                    output_name,
-                    out_path,
-                    batch_name=bname,
-                    chunk_id=int(job.get("chunk_id", 0)),
-                )
-                if not ok:
+                result = collect_batch_job(job, output_name, run_id)
+                if result is None:
                     continue
                 collected_jobs += 1
-
-                with open(out_path, "r", encoding="utf-8") as f:
-                    for line in f:
-                        if not line.strip():
-                            continue
-                        try:
-                            data = json.loads(line)
-                        except Exception:
-                            continue
-                        key = data.get("key", "")
-                        k_profile, k_plan, k_idx = parse_batch_key(key)
-                        if k_idx is None:
-                            print(f"[warn] invalid key in output: {key}")
-                            continue
-                        if k_profile and k_profile != profile:
-                            print(f"[warn] profile mismatch for key {key}, skipping")
-                            continue
-                        if k_plan and k_plan != plan_name:
-                            print(f"[warn] plan mismatch for key {key}, skipping")
-                            continue
-                        item = plan_by_index.get(k_idx)
-                        if not item:
-                            print(f"[warn] index {k_idx} not in plan, skipping")
-                            continue
-                        if k_idx in completed_indices:
-                            print(f"[skip] index {k_idx} already success, not overwriting.")
-                            continue
-                        prompt_meta: Dict[str, Any] = {
-                            "template_text": item.get("template_text"),
-                            "domain_injection": domain_injection,
-                        }
-                        metadata = build_metadata_base(
-                            run_id,
-                            item,
-                            item["final_prompt"],
-                            prompt_meta,
-                            image_size,
-                            model_name_meta,
-                            profile,
-                            plan_name,
-                        )
-                        base_name = f"batch_{plan_name}_{k_idx:04d}_{item['axis_id']}"
-                        metadata["batch_name"] = bname
-                        metadata["chunk_id"] = job.get("chunk_id")
-                        metadata["batch_key"] = key
-                        img_dir = images_root / item["axis_id"]
-                        meta_dir = meta_root / item["axis_id"]
-                        if data.get("error"):
-                            err = data.get("error")
-                            metadata = handle_error_metadata(
-                                metadata,
-                                {
-                                    "error": err,
-                                    "error_type": "BATCH_ERROR",
-                                    "http_status": None,
-                                    "retry_count": 0,
-                                },
-                            )
-                            save_metadata(meta_dir, base_name, metadata)
-                            append_to_manifest(manifest_path, metadata)
-                            manifest_cache[k_idx] = metadata
-                            manifest_cache_filtered[k_idx] = metadata
-                            failed_new += 1
-                            continue
-                        try:
-                            img_bytes = decode_image_from_response(data.get("response") or {})
-                        except Exception as exc:  # noqa: BLE001
-                            metadata = handle_error_metadata(
-                                metadata,
-                                {
-                                    "error": str(exc),
-                                    "error_type": "NO_IMAGE_DATA",
-                                    "http_status": None,
-                                    "retry_count": 0,
-                                },
-                            )
-                            save_metadata(meta_dir, base_name, metadata)
-                            append_to_manifest(manifest_path, metadata)
-                            manifest_cache[k_idx] = metadata
-                            manifest_cache_filtered[k_idx] = metadata
-                            failed_new += 1
-                            continue
-                        extracted = {"final_image": img_bytes, "thought_images": []}
-                        saved_paths = save_images(extracted, img_dir, base_name, save_thoughts=False)
-                        metadata |= {
-                            "status": "success",
-                            "image_part_index": 0,
-                            "total_image_parts": 1,
-                            "is_thought": False,
-                            "thought_images_saved": [],
-                            "final_image_filename": saved_paths.get("final"),
-                            "response_metadata": {"batch_name": bname, "key": key},
-                            "error": None,
-                            "error_type": None,
-                            "http_status": None,
-                            "retry_count": 0,
-                        }
-                        save_metadata(meta_dir, base_name, metadata)
-                        append_to_manifest(manifest_path, metadata)
-                        manifest_cache[k_idx] = metadata
-                        manifest_cache_filtered[k_idx] = metadata
-                        completed_indices.add(k_idx)
-                        success_new += 1
-                if args.batch_delete_output:
-                    delete_output_file(client, output_name, bname)
-                collected_names.add(bname)
-                append_collected(
-                    collected_path,
-                    {
-                        "batch_name": bname,
-                        "chunk_id": job.get("chunk_id"),
-                        "collected_at": datetime.utcnow().isoformat(),
-                        "output_path": str(out_path),
-                    },
-                )
+                success_new += result[0]
+                failed_new += result[1]
             summarize_counts(plan, manifest_cache_filtered)
             print(f"[collect] new_success={success_new} new_failed={failed_new}")
             return
 
+        if args.batch_action == "watch":
+            target_indices = {plan[pos]["index"] for pos in target_positions}
+            # ttl=0: in-flight jobs are re-queried every round; terminal states still come from the cache.
+            state_cache = BatchStateCache(batch_state_path(jobs_path), ttl=0)
+            run_id = f"batch_watch_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+            base_interval = max(float(args.batch_watch_interval), 1.0)
+            max_interval = max(float(args.batch_watch_max_interval), base_interval)
+            max_resubmits = int(args.batch_watch_max_resubmits) if args.batch_resubmit_failed else 0
+            interval = base_interval
+            resubmits: Dict[int, int] = {}
+            dead_jobs: set[str] = set()
+            lost_indices: set[int] = set()
+            failures: Dict[str, int] = {}
+            max_failures = max(int(args.batch_watch_max_failures), 1)
+            success_new = 0
+            failed_new = 0
+            print(
+                f"[watch] {len(target_indices)} target items, poll every {base_interval:.0f}-{max_interval:.0f}s, "
+                f"resubmit failed up to {max_resubmits} time(s)"
+            )
+
+            def give_up(job: Dict[str, Any]) -> None:
+                """Stop polling a job; its target items count as failed (and can be resubmitted)."""
+                dead_jobs.add(job["batch_name"])
+                index_range = job.get("index_range") or []
+                if len(index_range) == 2:
+                    lost_indices.update(idx for idx in target_indices if index_range[0] <= idx <= index_range[1])
+
+            try:
+                while True:
+                    in_flight = [
+                        job
+                        for job in load_jobs(jobs_path)
+                        if job.get("batch_name")
+                        and job["batch_name"] not in collected_names
+                        and job["batch_name"] not in dead_jobs
+                    ]
+                    states, fetch_errors = fetch_batch_states(
+                        client, (job["batch_name"] for job in in_flight), state_cache, args.batch_status_workers
+                    )
+                    progressed = False
+                    state_counts: Dict[str, int] = {}
+                    for job in in_flight:
+                        bname = job["batch_name"]
+                        if bname in fetch_errors:
+                            problem = f"status fetch failed: {fetch_errors[bname]}"
+                        else:
+                            state_name = states[bname]["state"]
+                            output_name = states[bname]["output_file"]
+                            if is_success_state(state_name) and output_name:
+                                result = collect_batch_job(job, output_name, run_id)
+                                if result is not None:
+                                    failures.pop(bname, None)
+                                    success_new += result[0]
+                                    failed_new += result[1]
+                                    progressed = True
+                                    print(f"[watch] collected {bname}: success={result[0]} failed={result[1]}")
+                                    continue
+                                problem = f"output {output_name} could not be collected"
+                            elif is_terminal_state(state_name):
+                                if is_success_state(state_name):
+                                    print(f"[warn] batch {bname} has no output reference (dest/output); giving up on it.")
+                                else:
+                                    print(f"[warn] batch {bname} ended with state={state_name}; its items were not generated.")
+                                give_up(job)
+                                progressed = True
+                                continue
+                            else:
+                                failures.pop(bname, None)
+                                state_counts[state_name] = state_counts.get(state_name, 0) + 1
+                                continue
+                        # Consecutive fetch/collect failures: retry on the next poll, give up after max_failures.
+                        failures[bname] = failures.get(bname, 0) + 1
+                        if failures[bname] >= max_failures:
+                            print(f"[warn] batch {bname}: {problem} ({failures[bname]} polls in a row); giving up on it.")
+                            give_up(job)
+                            progressed = True
+                        else:
+                            print(f"[error] batch {bname}: {problem} ({failures[bname]}/{max_failures})")
+                            state_counts["RETRYING"] = state_counts.get("RETRYING", 0) + 1
+
+                    # Items of jobs still running are not resubmitted, even if an earlier attempt failed.
+                    running_ranges = [
+                        job.get("index_range")
+                        for job in in_flight
+                        if job["batch_name"] not in collected_names
+                        and job["batch_name"] not in dead_jobs
+                        and len(job.get("index_range") or []) == 2
+                    ]
+                    unresolved = (failed_indices | lost_indices) & target_indices
+                    unresolved -= completed_indices
+                    retry = {
+                        idx
+                        for idx in unresolved
+                        if resubmits.get(idx, 0) < max_resubmits
+                        and not any(lo <= idx <= hi for lo, hi in running_ranges)
+                    }
+                    if retry:
+                        tasks = plan_batch_tasks(lambda item: item["index"] in retry, force=True, verbose=False)
+                        print(f"[watch] resubmitting {len(retry)} failed item(s) in {len(tasks)} chunk(s)")
+                        submit_tasks(tasks)
+                        for idx in retry:
+                            resubmits[idx] = resubmits.get(idx, 0) + 1
+                        lost_indices -= retry
+                        progressed = True
+                    elif not running_ranges and not state_counts:
+                        break
+
+                    interval = base_interval if progressed else min(interval * 1.5, max_interval)
+                    delay = interval * random.uniform(0.8, 1.2)
+                    summary = ", ".join(f"{k}={v}" for k, v in sorted(state_counts.items())) or "-"
+                    print(
+                        f"[watch] done={len(completed_indices & target_indices)}/{len(target_indices)} "
+                        f"in_flight: {summary}; next poll in {delay:.0f}s"
+                    )
+                    time.sleep(delay)
+            except KeyboardInterrupt:
+                print("[watch] interrupted; rerun the same command to continue.")
+            summarize_counts(plan, manifest_cache_filtered)
+            done = completed_indices & target_indices
+            failed = ((failed_indices | lost_indices) & target_indices) - done
+            not_submitted = len(target_indices) - len(done) - len(failed)
+            print(
+                f"[watch] new_success={success_new} new_failed={failed_new} "
+                f"success={len(done)} failed={len(failed)} not_submitted={not_submitted}"
+            )
+            if not_submitted:
+                print("[info] some target items were never submitted; run --batch-action submit first.")
+            return
+
         raise ValueError(f"Unsupported batch action: {args.batch_action}")
 
     # sync mode
-    plan = filtered_plan
-
-    if not plan:
+    if not filtered_positions:
         print("No plan items to process. Check filters or plan file.")
         return
 
     run_id = f"run_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+    pending_plan = [plan[pos] for pos in filtered_positions if plan[pos]["index"] not in completed_indices]
 
-    for item in tqdm(plan, desc="Generating images"):
-        idx = item["index"]
-        if idx in completed_indices:
-            continue
-
-        prompt = item["final_prompt"]
-        prompt_meta: Dict[str, Any] = {
-            "template_text": item.get("template_text"),
-            "domain_injection": domain_injection,
-        }
+    if dry_run:
+        for item in pending_plan:
+            print(f"[DRY RUN] index={item['index']} axis={item['axis_id']}")
+            print(item["final_prompt"])
+        return
 
-        if dry_run:
-            print(f"[DRY RUN] index={idx} axis={item['axis_id']}")
-            print(prompt)
-            continue
+    concurrency = max(int(args.concurrency or cfg.get("concurrency", 1) or 1), 1)
+    sync_driver = args.sync_driver or str(cfg.get("sync_driver", "threads"))
+    runner = generate_many_async if sync_driver == "asyncio" else generate_many
+    limiter = create_rate_limiter(cfg.get("rate_limit"), concurrency=concurrency)
+    results = runner(
+        client,
+        ((item, item["final_prompt"]) for item in pending_plan),
+        concurrency=concurrency,
+        max_retries=int(cfg.get("retry", {}).get("max_retries", 3)),
+        base_delay=float(cfg.get("retry", {}).get("base_delay", 2.0)),
+        image_size=image_size,
+        limiter=limiter,
+    )
 
-        response, error_info = generate_with_retry(
-            client,
-            prompt,
-            max_retries=int(cfg.get("retry", {}).get("max_retries", 3)),
-            base_delay=float(cfg.get("retry", {}).get("base_delay", 2.0)),
-            image_size=image_size,
+    def save_run_stats(completed: bool) -> None:
+        """Print and save runs/<run_id>.json; interrupted or failed runs record their AIMD history too."""
+        if limiter is None:
+            return
+        stats = limiter.stats()
+        print(
+            f"[rate-limit] acquired={stats['acquired']} waited={stats['waited']} "
+            f"token_wait={stats['token_wait_seconds']}s max_wait={stats['max_token_wait_seconds']}s "
+            f"slot_wait={stats['slot_wait_seconds']}s adaptive_limit={stats['adaptive_limit']}"
         )
-
-        ts = datetime.now().strftime("%Y%m%d_%H%M%S")
-        base_name = f"{ts}_{idx:04d}_{item['axis_id']}"
-        img_dir = images_root / item["axis_id"]
-        meta_dir = meta_root / item["axis_id"]
-
-        metadata = build_metadata_base(
-            run_id,
-            item,
-            prompt,
-            prompt_meta,
-            image_size,
-            model_name_meta,
-            profile,
-            plan_name,
+        run_meta = {
+            "run_id": run_id,
+            "profile": profile,
+            "plan_name": plan_name,
+            "finished_at": datetime.now().isoformat(),
+            "completed": completed,
+            "concurrency": concurrency,
+            "sync_driver": sync_driver,
+            "rate_limit": stats,
+            "adaptive_concurrency": limiter.adaptive.snapshot() if limiter.adaptive is not None else None,
+        }
+        save_metadata(output_dir / "runs", run_id, run_meta)
+
+    def on_write_error(metadata: Dict[str, Any], exc: Exception) -> Dict[str, Any]:
+        return handle_error_metadata(
+            metadata,
+            {
+                "error": str(exc),
+                "error_type": "UNEXPECTED_ERROR",
+                "http_status": None,
+                "retry_count": metadata.get("retry_count"),
+            },
         )
 
-        if error_info and response is None:
-            metadata = handle_error_metadata(metadata, error_info)
-            save_metadata(meta_dir, base_name, metadata)
-            append_to_manifest(manifest_path, metadata)
-            manifest_cache[idx] = metadata
-            continue
-
-        try:
-            resp_meta = extract_response_metadata(response)
-            extracted = extract_images_from_response(response)
-            saved_paths = save_images(extracted, img_dir, base_name, save_thoughts=save_thoughts)
-            metadata |= {
-                "status": "success",
-                "image_part_index": extracted["final_image_index"],
-                "total_image_parts": extracted["total_parts"],
-                "is_thought": False,
-                "thought_images_saved": [Path(p).name for p in saved_paths.get("thoughts", [])],
-                "final_image_filename": saved_paths.get("final"),
-                "response_metadata": resp_meta,
-                "error": None,
-                "error_type": None,
-                "http_status": None,
-                "retry_count": error_info.get("retry_count") if error_info else 0,
+    writer_cfg = cfg.get("writer", {}) or {}
+    writer = WriterStage(
+        manifest_path,
+        queue_size=int(writer_cfg.get("queue_size", 32)),
+        flush_bytes=int(writer_cfg.get("flush_bytes", 64 * 1024)),
+        flush_interval=float(writer_cfg.get("flush_interval", 2.0)),
+        on_error=on_write_error,
+        on_written=lambda metadata: manifest_cache.__setitem__(metadata["index"], metadata),
+    )
+    try:
+        for item, response, error_info in tqdm(results, total=len(pending_plan), desc="Generating images"):
+            idx = item["index"]
+            prompt = item["final_prompt"]
+            prompt_meta: Dict[str, Any] = {
+                "template_text": item.get("template_text"),
+                "domain_injection": domain_injection,
             }
-        except ValueError as exc:
-            resp_meta = extract_response_metadata(response)
-            metadata = handle_error_metadata(
-                metadata,
-                {
-                    "error": str(exc),
-                    "error_type": "NO_IMAGE_DATA",
-                    "http_status": None,
-                    "retry_count": error_info.get("retry_count") if error_info else 0,
-                },
+
+            ts = datetime.now().strftime("%Y%m%d_%H%M%S")
+            base_name = f"{ts}_{idx:04d}_{item['axis_id']}"
+            img_dir = images_root / item["axis_id"]
+            meta_dir = meta_root / item["axis_id"]
+
+            metadata = build_metadata_base(
+                run_id,
+                item,
+                prompt,
+                prompt_meta,
+                image_size,
+                model_name_meta,
+                profile,
+                plan_name,
             )
-            metadata["response_metadata"] = resp_meta
-        except Exception as exc:  # noqa: BLE001
-            metadata = handle_error_metadata(
-                metadata,
-                {
-                    "error": str(exc),
-                    "error_type": "UNEXPECTED_ERROR",
+
+            if error_info and response is None:
+                metadata = handle_error_metadata(metadata, error_info)
+                writer.submit(meta_dir, base_name, metadata)
+                continue
+
+            extracted = None
+            try:
+                resp_meta = extract_response_metadata(response)
+                extracted = extract_images_from_response(response)
+                filenames = image_filenames(base_name, len(extracted["thought_images"]), save_thoughts)
+                metadata |= {
+                    "status": "success",
+                    "image_part_index": extracted["final_image_index"],
+                    "total_image_parts": extracted["total_parts"],
+                    "is_thought": False,
+                    "thought_images_saved": filenames["thoughts"],
+                    "final_image_filename": filenames["final"],
+                    "response_metadata": resp_meta,
+                    "error": None,
+                    "error_type": None,
                     "http_status": None,
                     "retry_count": error_info.get("retry_count") if error_info else 0,
-                },
-            )
+                }
+            except ValueError as exc:
+                extracted = None
+                resp_meta = extract_response_metadata(response)
+                metadata = handle_error_metadata(
+                    metadata,
+                    {
+                        "error": str(exc),
+                        "error_type": "NO_IMAGE_DATA",
+                        "http_status": None,
+                        "retry_count": error_info.get("retry_count") if error_info else 0,
+                    },
+                )
+                metadata["response_metadata"] = resp_meta
+            except Exception as exc:  # noqa: BLE001
+                extracted = None
+                metadata = handle_error_metadata(
+                    metadata,
+                    {
+                        "error": str(exc),
+                        "error_type": "UNEXPECTED_ERROR",
+                        "http_status": None,
+                        "retry_count": error_info.get("retry_count") if error_info else 0,
+                    },
+                )
 
-        save_metadata(meta_dir, base_name, metadata)
-        append_to_manifest(manifest_path, metadata)
-        manifest_cache[idx] = metadata
+            writer.submit(
+                meta_dir,
+                base_name,
+                metadata,
+                img_dir=img_dir if extracted is not None else None,
+                extracted=extracted,
+                save_thoughts=save_thoughts,
+            )
+    except BaseException:
+        # Keep the original error: a writer failure while draining is only reported.
+        try:
+            writer.close()
+        except Exception as close_exc:  # noqa: BLE001
+            print(f"[error] writer close failed: {close_exc}")
+        save_run_stats(completed=False)
+        raise
+    try:
+        writer.close()
+    finally:
+        save_run_stats(completed=True)
 
 
 if __name__ == "__main__":
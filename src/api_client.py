@@ -1,11 +1,17 @@
 from __future__ import annotations
 
+import asyncio
+import queue
+import threading
 import time
-from typing import Any, Dict, Tuple
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Dict, Iterable, Iterator, Tuple
 
 from google import genai
 from google.genai import types
 
+from src.rate_limiter import RateLimiter
+
 
 def init_client(api_key: str) -> genai.Client:
     return genai.Client(api_key=api_key)
@@ -28,6 +34,33 @@ def classify_error(exception: Exception) -> Tuple[str, int | None]:
     return ("UNKNOWN_ERROR", None)
 
 
+NON_RETRYABLE_ERRORS = ("SAFETY_BLOCKED", "AUTH_ERROR")
+
+
+def build_error_info(exception: Exception | None, retry_count: int) -> Dict[str, Any]:
+    err_type, status = classify_error(exception) if exception else ("UNKNOWN_ERROR", None)
+    return {
+        "error": str(exception) if exception else "Unknown error",
+        "error_type": err_type,
+        "http_status": status,
+        "retry_count": retry_count,
+    }
+
+
+def retry_decision(
+    exception: Exception, attempt: int, max_retries: int, base_delay: float
+) -> Tuple[Dict[str, Any] | None, float]:
+    """
+    Retry policy shared by the sync and asyncio paths: (error_info, 0) when the request must stop now
+    (non-retryable error), otherwise (None, seconds to back off; 0 after the last attempt).
+    """
+    if classify_error(exception)[0] in NON_RETRYABLE_ERRORS:
+        return build_error_info(exception, attempt), 0.0
+    if attempt < max_retries:
+        return None, base_delay * (2**attempt)
+    return None, 0.0
+
+
 def generate_image(client: genai.Client, prompt: str, image_size: str = "2K"):
     # gemini-3-pro-image-preview uses generate_content with IMAGE modality.
     # image_size is kept for metadata but not enforced (model rejects media resolution).
@@ -38,34 +71,209 @@ def generate_image(client: genai.Client, prompt: str, image_size: str = "2K"):
     )
 
 
+async def generate_image_async(client: genai.Client, prompt: str, image_size: str = "2K"):
+    # Same request as generate_image, issued through the SDK's async surface (client.aio).
+    return await client.aio.models.generate_content(
+        model="gemini-3-pro-image-preview",
+        contents=prompt,
+        config=types.GenerateContentConfig(responseModalities=["IMAGE"]),
+    )
+
+
 def generate_with_retry(
     client: genai.Client,
     prompt: str,
     max_retries: int = 3,
     base_delay: float = 2.0,
     image_size: str = "2K",
+    limiter: RateLimiter | None = None,
 ) -> Tuple[Any | None, Dict[str, Any] | None]:
     last_error: Exception | None = None
     for attempt in range(max_retries + 1):
         try:
-            response = generate_image(client, prompt, image_size=image_size)
+            if limiter is not None:
+                limiter.acquire()
+            started = time.monotonic()
+            outcome: str | None = "INTERRUPTED"
+            try:
+                response = generate_image(client, prompt, image_size=image_size)
+                outcome = None
+            except Exception as exc:
+                outcome = classify_error(exc)[0]
+                raise
+            finally:
+                # finally (not except Exception): KeyboardInterrupt must hand the slot back too.
+                if limiter is not None:
+                    limiter.release(outcome, time.monotonic() - started)
             return response, {"retry_count": attempt}
         except Exception as exc:  # noqa: BLE001
             last_error = exc
-            err_type, status = classify_error(exc)
-            if err_type in ("SAFETY_BLOCKED", "AUTH_ERROR"):
-                return None, {
-                    "error": str(exc),
-                    "error_type": err_type,
-                    "http_status": status,
-                    "retry_count": attempt,
-                }
-            if attempt < max_retries:
-                time.sleep(base_delay * (2**attempt))
-    err_type, status = classify_error(last_error) if last_error else ("UNKNOWN_ERROR", None)
-    return None, {
-        "error": str(last_error) if last_error else "Unknown error",
-        "error_type": err_type,
-        "http_status": status,
-        "retry_count": max_retries,
-    }
+            error_info, delay = retry_decision(exc, attempt, max_retries, base_delay)
+            if error_info is not None:
+                return None, error_info
+            time.sleep(delay)
+    return None, build_error_info(last_error, max_retries)
+
+
+async def generate_with_retry_async(
+    client: genai.Client,
+    prompt: str,
+    max_retries: int = 3,
+    base_delay: float = 2.0,
+    image_size: str = "2K",
+    limiter: RateLimiter | None = None,
+) -> Tuple[Any | None, Dict[str, Any] | None]:
+    """Async counterpart of generate_with_retry; backoff uses asyncio.sleep so other requests keep running."""
+    last_error: Exception | None = None
+    for attempt in range(max_retries + 1):
+        try:
+            if limiter is not None:
+                await limiter.acquire_async()
+            started = time.monotonic()
+            outcome: str | None = "INTERRUPTED"
+            try:
+                response = await generate_image_async(client, prompt, image_size=image_size)
+                outcome = None
+            except Exception as exc:
+                outcome = classify_error(exc)[0]
+                raise
+            finally:
+                if limiter is not None:
+                    limiter.release_async(outcome, time.monotonic() - started)
+            return response, {"retry_count": attempt}
+        except Exception as exc:  # noqa: BLE001
+            last_error = exc
+            error_info, delay = retry_decision(exc, attempt, max_retries, base_delay)
+            if error_info is not None:
+                return None, error_info
+            await asyncio.sleep(delay)
+    return None, build_error_info(last_error, max_retries)
+
+
+def generate_many(
+    client: genai.Client,
+    jobs: Iterable[Tuple[Any, str]],
+    concurrency: int = 1,
+    max_retries: int = 3,
+    base_delay: float = 2.0,
+    image_size: str = "2K",
+    limiter: RateLimiter | None = None,
+) -> Iterator[Tuple[Any, Any | None, Dict[str, Any] | None]]:
+    """
+    Yield (tag, response, error_info) for each (tag, prompt) job.
+    With concurrency > 1 requests run on a bounded thread pool (at most `concurrency` in flight)
+    and results are yielded in completion order on the caller's thread, so persistence stays serial.
+    """
+    if concurrency <= 1:
+        for tag, prompt in jobs:
+            response, error_info = generate_with_retry(
+                client,
+                prompt,
+                max_retries=max_retries,
+                base_delay=base_delay,
+                image_size=image_size,
+                limiter=limiter,
+            )
+            yield tag, response, error_info
+        return
+
+    job_iter = iter(jobs)
+    in_flight: Dict[Future, Any] = {}
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="generate") as pool:
+
+        def submit_next() -> bool:
+            for tag, prompt in job_iter:
+                future = pool.submit(
+                    generate_with_retry, client, prompt, max_retries, base_delay, image_size, limiter
+                )
+                in_flight[future] = tag
+                return True
+            return False
+
+        try:
+            while len(in_flight) < concurrency and submit_next():
+                pass
+            while in_flight:
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    tag = in_flight.pop(future)
+                    submit_next()
+                    response, error_info = future.result()
+                    yield tag, response, error_info
+        finally:
+            for future in in_flight:
+                future.cancel()
+
+
+_DONE = object()
+
+
+def generate_many_async(
+    client: genai.Client,
+    jobs: Iterable[Tuple[Any, str]],
+    concurrency: int = 1,
+    max_retries: int = 3,
+    base_delay: float = 2.0,
+    image_size: str = "2K",
+    limiter: RateLimiter | None = None,
+) -> Iterator[Tuple[Any, Any | None, Dict[str, Any] | None]]:
+    """
+    Same contract as generate_many, driven by one asyncio event loop in a background thread.
+    `concurrency` coroutines share the job iterator, so thousands of requests can be in flight
+    without a thread each. Results are handed back through a bounded queue in completion order.
+    """
+    concurrency = max(concurrency, 1)
+    results: queue.Queue = queue.Queue(maxsize=concurrency)
+    job_iter = iter(jobs)
+
+    async def worker() -> None:
+        for tag, prompt in job_iter:
+            response, error_info = await generate_with_retry_async(
+                client,
+                prompt,
+                max_retries=max_retries,
+                base_delay=base_delay,
+                image_size=image_size,
+                limiter=limiter,
+            )
+            # Blocking put off the loop thread: a slow consumer throttles new requests.
+            await asyncio.to_thread(results.put, (tag, response, error_info))
+
+    async def drive() -> None:
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+
+    loop = asyncio.new_event_loop()
+    task = loop.create_task(drive())
+
+    def run_loop() -> None:
+        asyncio.set_event_loop(loop)
+        try:
+            loop.run_until_complete(task)
+            results.put(_DONE)
+        except BaseException as exc:  # noqa: BLE001
+            results.put(exc)
+        finally:
+            loop.close()
+
+    thread = threading.Thread(target=run_loop, name="generate-async", daemon=True)
+    thread.start()
+    finished = False
+    try:
+        while True:
+            entry = results.get()
+            if entry is _DONE:
+                finished = True
+                return
+            if isinstance(entry, BaseException):
+                finished = True
+                raise entry
+            yield entry
+    finally:
+        if not finished:
+            loop.call_soon_threadsafe(task.cancel)
+            # Unblock any producer waiting on a full queue so the loop can wind down.
+            while thread.is_alive():
+                try:
+                    results.get(timeout=0.1)
+                except queue.Empty:
+                    continue
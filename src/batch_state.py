@@ -0,0 +1,178 @@
+from __future__ import annotations
+
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterable, Tuple
+
+DEFAULT_STATE_TTL = 60.0
+DEFAULT_STATUS_WORKERS = 8
+TERMINAL_STATE_SUFFIXES = ("SUCCEEDED", "COMPLETED", "FAILED", "CANCELLED", "EXPIRED")
+
+
+def _get_attr(obj: object, *names: str) -> Any | None:
+    for name in names:
+        if isinstance(obj, dict) and name in obj:
+            return obj[name]
+        if hasattr(obj, name):
+            return getattr(obj, name)
+    return None
+
+
+def get_state_name(batch_job: object) -> str:
+    state = _get_attr(batch_job, "state") or _get_attr(batch_job, "status")
+    if state is None:
+        return "UNKNOWN"
+    return getattr(state, "name", None) or str(state)
+
+
+def is_success_state(state_name: str) -> bool:
+    state_key = (state_name or "").upper()
+    success_states = {"JOB_STATE_SUCCEEDED", "SUCCEEDED", "JOB_STATE_COMPLETED", "COMPLETED"}
+    if state_key in success_states:
+        return True
+    if "JOB_STATE_SUCCEEDED" in state_key or state_key.endswith("SUCCEEDED"):
+        return True
+    if "JOB_STATE_COMPLETED" in state_key or state_key.endswith("COMPLETED"):
+        return True
+    return False
+
+
+def is_terminal_state(state_name: str) -> bool:
+    """Succeeded/failed/cancelled/expired jobs never change state again."""
+    return (state_name or "").upper().endswith(TERMINAL_STATE_SUFFIXES)
+
+
+def resolve_output_file_name(batch_info: object) -> Tuple[str | None, str | None]:
+    dest = _get_attr(batch_info, "dest")
+    if dest:
+        file_name = _get_attr(dest, "file_name")
+        if file_name:
+            return file_name, "dest.file_name"
+        file_name = _get_attr(dest, "fileName")
+        if file_name:
+            return file_name, "dest.fileName"
+    output_ref = _get_attr(batch_info, "output")
+    if output_ref:
+        file_name = _get_attr(output_ref, "name")
+        if file_name:
+            return file_name, "output.name"
+        file_name = _get_attr(output_ref, "file")
+        if file_name:
+            return file_name, "output.file"
+        file_name = _get_attr(output_ref, "file_name")
+        if file_name:
+            return file_name, "output.file_name"
+        file_name = _get_attr(output_ref, "fileName")
+        if file_name:
+            return file_name, "output.fileName"
+        if isinstance(output_ref, str):
+            return output_ref, "output(str)"
+    return None, None
+
+
+def batch_state_path(jobs_path: Path) -> Path:
+    """batches/<plan>.jobs.jsonl -> batches/<plan>.state.jsonl"""
+    name = jobs_path.name
+    stem = name[: -len(".jobs.jsonl")] if name.endswith(".jobs.jsonl") else jobs_path.stem
+    return jobs_path.with_name(f"{stem}.state.jsonl")
+
+
+class BatchStateCache:
+    """
+    Last known state of each batch job, one JSON line per job in batches/<plan>.state.jsonl:
+    {"batch_name", "state", "output_file", "output_source", "checked_at"}. Terminal states are trusted
+    forever; other states are reused while younger than the TTL (seconds). Shared by run.py's batch
+    actions and the cloud file tools, so a job in a terminal state costs no further batches.get call.
+    """
+
+    def __init__(self, path: Path, ttl: float = DEFAULT_STATE_TTL) -> None:
+        self.path = path
+        self.ttl = float(ttl)
+        self.records: Dict[str, dict] = {}
+        self.dirty = False
+        if path.exists():
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    if not line.strip():
+                        continue
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+                    if isinstance(record, dict) and record.get("batch_name"):
+                        self.records[record["batch_name"]] = record
+
+    def fresh(self, batch_name: str, now: datetime | None = None) -> dict | None:
+        record = self.records.get(batch_name)
+        if record is None:
+            return None
+        if is_terminal_state(record.get("state", "")):
+            return record
+        try:
+            checked_at = datetime.fromisoformat(record.get("checked_at", ""))
+        except (TypeError, ValueError):
+            return None
+        if ((now or datetime.now()) - checked_at).total_seconds() < self.ttl:
+            return record
+        return None
+
+    def update(self, batch_name: str, batch_info: object) -> dict:
+        output_file, output_source = resolve_output_file_name(batch_info)
+        record = {
+            "batch_name": batch_name,
+            "state": get_state_name(batch_info),
+            "output_file": output_file,
+            "output_source": output_source,
+            "checked_at": datetime.now().isoformat(),
+        }
+        self.records[batch_name] = record
+        self.dirty = True
+        return record
+
+    def save(self) -> None:
+        if not self.dirty:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_name(self.path.name + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for record in self.records.values():
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        os.replace(tmp_path, self.path)
+        self.dirty = False
+
+
+def fetch_batch_states(
+    client: object,
+    batch_names: Iterable[str],
+    cache: BatchStateCache,
+    workers: int = DEFAULT_STATUS_WORKERS,
+) -> Tuple[Dict[str, dict], Dict[str, str]]:
+    """
+    State records for batch_names: fresh cache entries as-is, the rest fetched with client.batches.get
+    on up to `workers` threads. Returns (records by batch name, error text by batch name) and saves the
+    cache once at the end.
+    """
+    now = datetime.now()
+    records: Dict[str, dict] = {}
+    to_fetch: list[str] = []
+    for name in dict.fromkeys(batch_names):
+        record = cache.fresh(name, now)
+        if record is not None:
+            records[name] = record
+        else:
+            to_fetch.append(name)
+    errors: Dict[str, str] = {}
+    if to_fetch:
+        with ThreadPoolExecutor(max_workers=max(1, min(int(workers), len(to_fetch)))) as pool:
+            futures = {pool.submit(client.batches.get, name=name): name for name in to_fetch}
+            for future in as_completed(futures):
+                name = futures[future]
+                try:
+                    records[name] = cache.update(name, future.result())
+                except Exception as exc:  # noqa: BLE001
+                    errors[name] = str(exc)
+        cache.save()
+    return records, errors
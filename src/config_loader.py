@@ -13,11 +13,36 @@ DEFAULT_CONFIG: Dict[str, Any] = {
     "output_dir": "./out",
     "save_thoughts": True,
     "dry_run": False,
+    "manifest_backend": "jsonl",  # jsonl | sqlite (out/{profile}/manifest.sqlite)
     "retry": {"max_retries": 3, "base_delay": 2.0},
+    "concurrency": 1,  # concurrent requests in sync mode (--concurrency overrides)
+    "sync_driver": "threads",  # threads | asyncio (--sync-driver overrides)
+    # client-side limits applied before each generate_content call (0 = disabled)
+    "rate_limit": {
+        "requests_per_minute": 0,
+        "max_concurrent": 0,
+        "burst": 1,
+        # AIMD in-flight limit (max defaults to --concurrency)
+        "adaptive": {
+            "enabled": False,
+            "initial": 0,
+            "min": 1,
+            "max": 0,
+            "increase_after": 0,
+            "latency_threshold": 0,
+            "cooldown": 5.0,
+        },
+    },
+    # sync mode writer thread: bounded queue + manifest flush thresholds
+    "writer": {"queue_size": 32, "flush_bytes": 65536, "flush_interval": 2.0},
     "image_config": {"image_size": "2K"},
     "global_prompt_suffix": "",
     "domain_injection": "context_and_hints",  # none | context | context_and_hints
     "standard_per_combo": 8,
+    "plan_engine": "python",  # python | numpy (optional dependency; vectorized batches for very large plans)
+    "plan_format": "jsonl",  # jsonl | compact (header + token-id rows; prompts rendered when read)
+    "plan_workers": 1,  # processes for plan generation (python engine; >1 = seeded shards, --plan-workers overrides)
+    "sampler": "v1",  # plan weighted sampling: v1 (cumulative+bisect, legacy sequence) | v2 (alias tables)
     "mix_count": 10,
     "rerun_count": 10,
     "axis_ids": [
@@ -1,12 +1,28 @@
 from __future__ import annotations
 
 import json
+import math
+import os
+from array import array
+from bisect import bisect_left
+from itertools import accumulate
 from pathlib import Path
-from typing import Dict, Iterable, List, Set
+from typing import Any, Callable, Container, Dict, Iterable, Iterator, List, Sequence, Set
 
 from random import Random
 from collections import deque
 
+from src.manifest_store import FAILED_STATUSES, ManifestIndex, is_sqlite_manifest, open_sqlite_manifest
+from src.plan_compact import (
+    PLAN_FORMATS,
+    CompactPlanDecoder,
+    CompactPlanEncoder,
+    encode_compact_plan,
+    render_final_prompt,
+    template_hash,
+)
+from src.plan_item import PlanItem, PlanItemFactory
+
 
 def weighted_choice(items: List[str], weights: List[float], rng: Random) -> str:
     assert len(items) == len(weights)
@@ -22,6 +38,64 @@ def weighted_choice(items: List[str], weights: List[float], rng: Random) -> str:
     return items[-1]
 
 
+SAMPLER_VERSIONS = ("v1", "v2")
+PLAN_STATE_VERSION = 1
+
+
+class WeightedSampler:
+    """
+    Weighted draws from a fixed item list with tables built once and reused for every draw.
+    - v1: cumulative array + bisect; consumes the RNG exactly like weighted_choice, so seeded plans
+      are unchanged.
+    - v2: Vose alias tables, O(1) per draw (different random sequence than v1).
+    """
+
+    def __init__(self, items: Sequence[str], weights: Sequence[float], version: str = "v1") -> None:
+        if version not in SAMPLER_VERSIONS:
+            raise ValueError(f"Unknown sampler: {version} (expected one of {', '.join(SAMPLER_VERSIONS)})")
+        assert len(items) == len(weights)
+        self.items = tuple(items)
+        self.version = version
+        self.total = sum(weights)
+        self.uniform = self.total <= 0
+        # Same left-to-right float additions as weighted_choice; negative weights make it non-monotonic.
+        self.cumulative = list(accumulate(weights, initial=0.0))[1:]
+        self.monotonic = all(w >= 0 for w in weights)
+        if version == "v2" and not self.uniform:
+            self._build_alias([max(float(w), 0.0) for w in weights])
+
+    def _build_alias(self, weights: List[float]) -> None:
+        n = len(weights)
+        total = sum(weights)
+        scaled = [w * n / total for w in weights]
+        self.prob = [1.0] * n
+        self.alias = list(range(n))
+        small = [i for i, p in enumerate(scaled) if p < 1.0]
+        large = [i for i, p in enumerate(scaled) if p >= 1.0]
+        while small and large:
+            s_idx = small.pop()
+            l_idx = large.pop()
+            self.prob[s_idx] = scaled[s_idx]
+            self.alias[s_idx] = l_idx
+            scaled[l_idx] = scaled[l_idx] + scaled[s_idx] - 1.0
+            (small if scaled[l_idx] < 1.0 else large).append(l_idx)
+
+    def draw(self, rng: Random) -> str:
+        if self.uniform:
+            return rng.choice(self.items)
+        if self.version == "v2":
+            i = int(rng.random() * len(self.items))
+            return self.items[i] if rng.random() < self.prob[i] else self.items[self.alias[i]]
+        r = rng.uniform(0, self.total)
+        if not self.monotonic:
+            for item, cum in zip(self.items, self.cumulative):
+                if r <= cum:
+                    return item
+            return self.items[-1]
+        pos = bisect_left(self.cumulative, r)
+        return self.items[pos] if pos < len(self.items) else self.items[-1]
+
+
 def dedupe_key(axis_id: str, slots: Dict[str, str]) -> str:
     parts = [axis_id] + [f"{k}={v}" for k, v in sorted(slots.items())]
     return "|".join(parts)
@@ -58,6 +132,271 @@ def flatten_words(tag_to_words: Dict[str, List[str]]) -> List[str]:
     return words
 
 
+class RepeatWindow:
+    """Last `size` tokens drawn, with a count per token so membership checks are O(1)."""
+
+    def __init__(self, size: int) -> None:
+        self.size = size
+        self.tokens: deque = deque()
+        self.counts: Dict[str, int] = {}
+
+    def __contains__(self, token: str) -> bool:
+        return token in self.counts
+
+    def __len__(self) -> int:
+        return len(self.tokens)
+
+    def append(self, token: str) -> None:
+        if len(self.tokens) >= self.size:
+            old = self.tokens.popleft()
+            remaining = self.counts[old] - 1
+            if remaining:
+                self.counts[old] = remaining
+            else:
+                del self.counts[old]
+        self.tokens.append(token)
+        self.counts[token] = self.counts.get(token, 0) + 1
+
+
+class VocabPool:
+    """One vocab category compiled for sampling: immutable word tuples, tag list and sampling mode."""
+
+    __slots__ = ("mode", "words", "tag_list", "tag_words", "tag_weights", "tag_sampler")
+
+    def __init__(self, cat: str, raw, tag_sampling: Dict[str, object], sampler: str = "v1") -> None:
+        tags, weights, is_tagged = normalize_vocab_category(cat, raw)
+        mode = (tag_sampling.get("per_category", {}) or {}).get(cat, tag_sampling.get("mode", "off"))
+        self.mode = mode if is_tagged and mode in ("uniform", "weighted") else "off"
+        self.words = tuple(flatten_words(tags))
+        self.tag_list = tuple(tags.keys())
+        self.tag_words = {tag: tuple(words) for tag, words in tags.items()}
+        self.tag_weights = {tag: float(weights.get(tag, 1.0)) for tag in self.tag_list}
+        self.tag_sampler = (
+            WeightedSampler(self.tag_list, [weights.get(t, 1.0) for t in self.tag_list], sampler)
+            if self.mode == "weighted"
+            else None
+        )
+
+    def word_weights(self) -> Dict[str, tuple[float, str | None]]:
+        """Marginal draw probability and tag of every reachable word (first contributing tag wins)."""
+        if self.mode == "off":
+            share = 1.0 / len(self.words) if self.words else 0.0
+            return _merge_word_weights((word, share, None) for word in self.words)
+        tag_probs = {tag: 1.0 / len(self.tag_list) for tag in self.tag_list}
+        if self.mode == "weighted":
+            total = sum(self.tag_weights.values())
+            if total > 0:
+                tag_probs = {tag: w / total for tag, w in self.tag_weights.items() if w > 0}
+        return _merge_word_weights(
+            (word, prob / len(self.tag_words[tag]), tag)
+            for tag, prob in tag_probs.items()
+            if self.tag_words[tag]
+            for word in self.tag_words[tag]
+        )
+
+
+def _merge_word_weights(entries: Iterable[tuple[str, float, str | None]]) -> Dict[str, tuple[float, str | None]]:
+    merged: Dict[str, tuple[float, str | None]] = {}
+    for word, prob, tag in entries:
+        if word in merged:
+            prev_prob, prev_tag = merged[word]
+            merged[word] = (prev_prob + prob, prev_tag)
+        else:
+            merged[word] = (prob, tag)
+    return merged
+
+
+def compile_vocab_pools(
+    vocab: Dict[str, List[str]], tag_sampling: Dict[str, object] | None = None, sampler: str = "v1"
+) -> Dict[str, VocabPool]:
+    tag_sampling = tag_sampling or {}
+    return {cat: VocabPool(cat, raw, tag_sampling, sampler) for cat, raw in vocab.items()}
+
+
+EXHAUSTIVE_MAX_REJECTS = 50
+EXHAUSTIVE_ENUMERATE_LIMIT = 1_000_000
+
+
+class PlanCapacityError(ValueError):
+    """The requested plan needs more distinct slot combinations than the vocab can produce."""
+
+
+class AxisCombinations:
+    """
+    Cartesian product of an axis' placeholder pools (reachable words only), addressed by a
+    mixed-radix index so distinct combinations can be counted and enumerated without drawing.
+    """
+
+    def __init__(self, axis_id: str, placeholders: List[str], pools: Dict[str, VocabPool]) -> None:
+        self.axis_id = axis_id
+        self.placeholders = list(dict.fromkeys(placeholders))
+        self.words: List[tuple] = []
+        self.weights: List[tuple] = []
+        self.tags: List[tuple] = []
+        self.word_sets: List[Set[str]] = []
+        self.capacity = 1
+        self._cycles: List[tuple] = []
+        for ph in self.placeholders:
+            pool = pools.get(ph)
+            if pool is None:
+                raise ValueError(f"Vocab category missing: {ph}")
+            table = pool.word_weights()
+            self.words.append(tuple(table))
+            self.weights.append(tuple(prob for prob, _ in table.values()))
+            self.tags.append(tuple(tag for _, tag in table.values()))
+            self.word_sets.append(set(table))
+            self.capacity *= len(table)
+        self.reachable = self.capacity
+
+    def lock_tag_cycles(self, pools: Dict[str, VocabPool], cursors: Dict[str, int], groups: List[List[str]]) -> None:
+        """
+        Limit `reachable` to what uniform tag cursors can produce. Categories in one group always advance
+        together, so from phases `cursors` they only pair the tags of one lcm-long cycle rather than every
+        tag combination (words within a tag stay free). Words shared between tags make this an upper bound.
+        `capacity`, decode and enumeration keep addressing the full product.
+        """
+        reachable = 1
+        locked: Set[str] = set()
+        for group in groups:
+            sizes = [len(pools[cat].tag_list) for cat in group]
+            cycle = math.lcm(*sizes)
+            if cycle == math.prod(sizes):
+                continue  # coprime tag counts still visit every tag combination
+            positions = [self.placeholders.index(cat) for cat in group]
+            steps = []
+            for step in range(cycle):
+                tags = [
+                    pools[cat].tag_list[(cursors.get(cat, 0) + step) % size] for cat, size in zip(group, sizes)
+                ]
+                steps.append(tuple(set(pools[cat].tag_words[tag]) for cat, tag in zip(group, tags)))
+            total = sum(math.prod(len(words) for words in step) for step in steps)
+            reachable *= min(total, math.prod(len(self.words[pos]) for pos in positions))
+            self._cycles.append((positions, steps))
+            locked.update(group)
+        for pos, ph in enumerate(self.placeholders):
+            if ph not in locked:
+                reachable *= len(self.words[pos])
+        self.reachable = min(reachable, self.capacity)
+
+    def decode(self, index: int) -> List[int]:
+        digits = []
+        for words in reversed(self.words):
+            index, digit = divmod(index, len(words))
+            digits.append(digit)
+        digits.reverse()
+        return digits
+
+    def slots(self, digits: List[int]) -> tuple[Dict[str, str], Dict[str, str | None]]:
+        slots: Dict[str, str] = {}
+        slot_tags: Dict[str, str | None] = {}
+        for pos, (ph, digit) in enumerate(zip(self.placeholders, digits)):
+            slots[ph] = self.words[pos][digit]
+            tag = self.tags[pos][digit]
+            if tag:
+                slot_tags[ph] = tag
+        return slots, slot_tags
+
+    def weight(self, digits: List[int]) -> float:
+        weight = 1.0
+        for pos, digit in enumerate(digits):
+            weight *= self.weights[pos][digit]
+        return weight
+
+    def contains_key(self, key: str) -> bool:
+        """True when a dedupe_key belongs to this axis and lies inside the reachable product."""
+        parts = key.split("|")
+        if parts[0] != self.axis_id or len(parts) != len(self.placeholders) + 1:
+            return False
+        values = dict(part.split("=", 1) for part in parts[1:] if "=" in part)
+        if len(values) != len(self.placeholders) or not all(
+            values.get(ph) in words for ph, words in zip(self.placeholders, self.word_sets)
+        ):
+            return False
+        for positions, steps in self._cycles:
+            chosen = [values[self.placeholders[pos]] for pos in positions]
+            if not any(all(word in words for word, words in zip(chosen, step)) for step in steps):
+                return False
+        return True
+
+
+def count_excluded(exclude_keys, space: AxisCombinations, existing_keys: Iterable[str] = ()) -> int:
+    """
+    Distinct excluded or existing keys inside an axis' reachable combination space. Hashed key indexes
+    only report their per-axis count, an upper bound that still includes keys whose words left the vocab.
+    """
+    extra = sum(1 for key in existing_keys if key not in exclude_keys and space.contains_key(key))
+    axis_count = getattr(exclude_keys, "axis_count", None)
+    if axis_count is not None:
+        return min(axis_count(space.axis_id) + extra, space.reachable)
+    return sum(1 for key in exclude_keys if space.contains_key(key)) + extra
+
+
+def check_plan_capacity(
+    combos: Dict[str, AxisCombinations], demand: Dict[str, int], used: Dict[str, int], total: int | None = None
+) -> None:
+    """
+    Raise PlanCapacityError when an axis quota (or the total, for weighted distribution) exceeds the
+    distinct reachable combinations left after excluded keys.
+    """
+    for axis_id, need in demand.items():
+        free = combos[axis_id].reachable - used.get(axis_id, 0)
+        if need > free:
+            raise PlanCapacityError(
+                f"axis {axis_id} needs {need} unique slot combinations but only {free} remain "
+                f"({combos[axis_id].reachable} reachable, {used.get(axis_id, 0)} excluded)"
+            )
+    if total is not None:
+        free = sum(combos[axis_id].reachable - used.get(axis_id, 0) for axis_id in combos)
+        if total > free:
+            raise PlanCapacityError(
+                f"plan needs {total} unique slot combinations but axes {', '.join(combos)} only have {free} left"
+            )
+
+
+def check_excluded_capacity(
+    combos: Dict[str, AxisCombinations],
+    demand: Dict[str, int],
+    exclude_keys,
+    existing_keys: Iterable[str] = (),
+    total: int | None = None,
+) -> None:
+    """
+    check_plan_capacity with the excluded and existing keys counted per axis. When the upper-bound
+    counts of a hashed key index make it fail, the index's source plans are re-read so only keys that
+    are still reachable are counted before giving up.
+    """
+    used = {axis_id: count_excluded(exclude_keys, space, existing_keys) for axis_id, space in combos.items()}
+    try:
+        check_plan_capacity(combos, demand, used, total)
+    except PlanCapacityError:
+        if not hasattr(exclude_keys, "iter_keys"):
+            raise
+        reachable: Set[str] = set()
+        for key in exclude_keys.iter_keys():
+            space = combos.get(key.split("|", 1)[0])
+            if space is not None and space.contains_key(key):
+                reachable.add(key)
+        used = {axis_id: count_excluded(reachable, space, existing_keys) for axis_id, space in combos.items()}
+        check_plan_capacity(combos, demand, used, total)
+
+
+def balanced_quotas(axis_ids: List[str], weights: List[float], target_count: int) -> List[int]:
+    """Per-axis item counts for axis_distribution: balanced (largest remainder, ties by axis id)."""
+    total_weight = sum(weights)
+    if total_weight <= 0:
+        weights = [1.0 for _ in axis_ids]
+        total_weight = sum(weights)
+    raw = [target_count * w / total_weight for w in weights]
+    base = [int(x) for x in raw]
+    remainder = target_count - sum(base)
+    if remainder > 0:
+        frac = [(raw[i] - base[i], i) for i in range(len(axis_ids))]
+        frac.sort(key=lambda x: (-x[0], axis_ids[x[1]]))
+        for _, i in frac[:remainder]:
+            base[i] += 1
+    return base
+
+
 def create_slot_plan(
     axis_templates: Dict[str, dict],
     vocab: Dict[str, List[str]],
@@ -69,59 +408,65 @@ def create_slot_plan(
     dedupe_mode: str,
     seed: int | None,
     profile: str,
-    exclude_keys: Set[str] | None = None,
+    exclude_keys: Container[str] | None = None,
     excluded_plans: List[str] | None = None,
     tag_sampling: Dict[str, object] | None = None,
     sampling_controls: Dict[str, int] | None = None,
+    sampler: str = "v1",
+    start_index: int = 0,
+    existing_keys: Container[str] | None = None,
+    state: Dict[str, Any] | None = None,
+    axis_quotas: Dict[str, int] | None = None,
 ) -> List[dict]:
+    """
+    Build `target_count` plan items numbered from `start_index`.
+    For --extend-plan: `existing_keys` are dedupe keys already in the plan, and `state` is an in/out
+    dict — a saved sampler state (RNG, repeat window, token counts, tag cursors) is restored from it
+    and the final state is written back so the next extension continues the same random stream.
+    `axis_quotas` fixes the item count per axis (shards and dedupe replacements of --plan-workers);
+    it replaces the weighted/balanced axis choice and `target_count`.
+    Existing keys are never repeated, in soft mode too; soft mode only allows repeats among new items.
+    """
+    if sampler not in SAMPLER_VERSIONS:
+        raise ValueError(f"Unknown sampler: {sampler} (expected one of {', '.join(SAMPLER_VERSIONS)})")
     rng = Random(seed) if seed is not None else Random()
     plan: List[dict] = []
     seen: Set[str] = set()
     axis_distribution = (axis_distribution or "weighted").lower()
     exclude_keys = exclude_keys or set()
+    existing_keys = existing_keys or set()
     excluded_plans = excluded_plans or []
     tag_sampling = tag_sampling or {}
     sampling_controls = sampling_controls or {}
     max_repeat_window = int(sampling_controls.get("max_repeat_window", 0))
     max_repeat_per_token = int(sampling_controls.get("max_repeat_per_token", 0))
-    recent_tokens = deque(maxlen=max_repeat_window) if max_repeat_window > 0 else None
+    recent_tokens = RepeatWindow(max_repeat_window) if max_repeat_window > 0 else None
     token_counts: Dict[str, int] = {}
 
-    # preprocess vocab categories
-    vocab_struct: Dict[str, dict] = {}
-    tag_cursors: Dict[str, int] = {}
-    for cat, raw in vocab.items():
-        tags, weights, is_tagged = normalize_vocab_category(cat, raw)
-        vocab_struct[cat] = {"tags": tags, "weights": weights, "is_tagged": is_tagged}
-        tag_cursors[cat] = 0
+    pools = compile_vocab_pools(vocab, tag_sampling, sampler)
+    tag_cursors: Dict[str, int] = {cat: 0 for cat in pools}
+    if state and state.get("rng_state"):
+        rng_version, internal, gauss = state["rng_state"]
+        rng.setstate((rng_version, tuple(internal), gauss))
+        token_counts.update(state.get("token_counts") or {})
+        tag_cursors.update({cat: int(c) for cat, c in (state.get("tag_cursors") or {}).items() if cat in pools})
+        if recent_tokens is not None:
+            for token in state.get("recent_tokens") or []:
+                recent_tokens.append(token)
 
     def choose_token(cat: str) -> tuple[str, str | None]:
-        cat_cfg = vocab_struct.get(cat)
-        if not cat_cfg:
+        pool = pools.get(cat)
+        if pool is None:
             raise ValueError(f"Vocab category missing: {cat}")
-        tags = cat_cfg["tags"]
-        weights = cat_cfg["weights"]
-        is_tagged = cat_cfg["is_tagged"]
-        mode = (tag_sampling.get("per_category", {}) or {}).get(cat, tag_sampling.get("mode", "off"))
-        if not is_tagged:
-            mode = "off"
-        if mode == "uniform":
-            tag_list = list(tags.keys())
-            cursor = tag_cursors.get(cat, 0)
-            chosen_tag = tag_list[cursor % len(tag_list)]
+        if pool.mode == "uniform":
+            cursor = tag_cursors[cat]
+            chosen_tag = pool.tag_list[cursor % len(pool.tag_list)]
             tag_cursors[cat] = cursor + 1
-            words = tags[chosen_tag]
-            word = rng.choice(words)
-            return word, chosen_tag
-        if mode == "weighted":
-            tag_list = list(tags.keys())
-            tag_weights = [weights.get(t, 1.0) for t in tag_list]
-            chosen_tag = weighted_choice(tag_list, tag_weights, rng)
-            word = rng.choice(tags[chosen_tag])
-            return word, chosen_tag
-        # off
-        word = rng.choice(flatten_words(tags))
-        return word, None
+            return rng.choice(pool.tag_words[chosen_tag]), chosen_tag
+        if pool.mode == "weighted":
+            chosen_tag = pool.tag_sampler.draw(rng)
+            return rng.choice(pool.tag_words[chosen_tag]), chosen_tag
+        return rng.choice(pool.words), None
 
     def should_avoid(token: str) -> bool:
         if recent_tokens is None:
@@ -154,17 +499,18 @@ def create_slot_plan(
             slots[ph] = chosen
             if chosen_tag:
                 slot_tags[ph] = chosen_tag
-            token_counts[chosen] = token_counts.get(chosen, 0) + 1
-            if recent_tokens is not None:
-                recent_tokens.append(chosen)
-            if max_repeat_per_token and token_counts[chosen] > max_repeat_per_token:
-                print(f"[warn] token '{chosen}' exceeded max_repeat_per_token={max_repeat_per_token}")
+            record_token(chosen)
         return slots, slot_tags
 
+    def record_token(token: str) -> None:
+        token_counts[token] = token_counts.get(token, 0) + 1
+        if recent_tokens is not None:
+            recent_tokens.append(token)
+        if max_repeat_per_token and token_counts[token] > max_repeat_per_token:
+            print(f"[warn] token '{token}' exceeded max_repeat_per_token={max_repeat_per_token}")
+
     def append_item(axis_id: str, slots: Dict[str, str], slot_tags: Dict[str, str | None], idx: int) -> None:
-        tmpl = axis_templates[axis_id]
-        prompt_body = tmpl["template"].format(context="", h1="", h2="", **slots)
-        final_prompt = f"{prompt_body} {global_suffix}".strip()
+        final_prompt = render_final_prompt(axis_templates[axis_id]["template"], slots, global_suffix)
         plan.append(
             {
                 "index": idx,
@@ -179,55 +525,336 @@ def create_slot_plan(
             }
         )
 
-    idx = 0
-    if axis_distribution == "balanced":
-        total_weight = sum(weights)
-        if total_weight <= 0:
-            weights = [1.0 for _ in axis_ids]
-            total_weight = sum(weights)
-        raw = [target_count * w / total_weight for w in weights]
-        base = [int(x) for x in raw]
-        remainder = target_count - sum(base)
-        if remainder > 0:
-            frac = [(raw[i] - base[i], i) for i in range(len(axis_ids))]
-            frac.sort(key=lambda x: (-x[0], axis_ids[x[1]]))
-            for _, i in frac[:remainder]:
-                base[i] += 1
+    strict = dedupe_mode in ("strict", "exhaustive")
+    exhaustive = dedupe_mode == "exhaustive"
+    # Soft-mode extensions still must not repeat the plan's keys, so they get a capacity check too.
+    guarded = strict or bool(existing_keys)
+    combos: Dict[str, AxisCombinations] = {}
+    rejects: Dict[str, int] = {}
+    remaining: Dict[str, array] = {}
+
+    def build_combos(drawn: List[str]) -> None:
+        """Combination spaces of the axes that can actually be drawn (strict/exhaustive or extending)."""
+        for axis_id in drawn:
+            placeholders = axis_templates[axis_id].get("placeholders") or []
+            combos[axis_id] = AxisCombinations(axis_id, placeholders, pools)
+        if not exhaustive and recent_tokens is None:
+            # Without repeat-window retries, uniform categories used by exactly the same drawn axes
+            # advance their tag cursors in lockstep. Exhaustive enumeration ignores cursors.
+            users: Dict[str, list] = {}
+            for axis_id in drawn:
+                placeholders = axis_templates[axis_id].get("placeholders") or []
+                for ph in dict.fromkeys(placeholders):
+                    if pools[ph].mode == "uniform":
+                        users.setdefault(ph, []).append(axis_id if placeholders.count(ph) == 1 else None)
+            for axis_id, space in combos.items():
+                groups: Dict[tuple, List[str]] = {}
+                for ph in space.placeholders:
+                    if ph in users and None not in users[ph]:
+                        groups.setdefault(tuple(users[ph]), []).append(ph)
+                locked = [group for group in groups.values() if len(group) > 1]
+                if locked:
+                    space.lock_tag_cycles(pools, tag_cursors, locked)
+
+    def enumerate_remaining(axis_id: str) -> array:
+        """
+        Indices of every unused combination of the axis in weighted random order (Efraimidis-Spirakis
+        keys), so popping from the end samples without replacement proportionally to the combination
+        weight. Only the index and its key are held per combination; slots are decoded on pop.
+        """
+        space = combos[axis_id]
+        scores = array("d")
+        indices = array("q")
+        for index in range(space.capacity):
+            digits = space.decode(index)
+            key = dedupe_key(axis_id, space.slots(digits)[0])
+            if key in seen or key in exclude_keys or key in existing_keys:
+                continue
+            scores.append(math.log(1.0 - rng.random()) / space.weight(digits))
+            indices.append(index)
+        order = sorted(range(len(indices)), key=scores.__getitem__)
+        return array("q", (indices[pos] for pos in order))
+
+    def next_candidate(axis_id: str) -> tuple[Dict[str, str], Dict[str, str | None], str] | None:
+        """Draw normally; in exhaustive mode switch an axis to enumeration after repeated rejections."""
+        if exhaustive and axis_id not in remaining and rejects.get(axis_id, 0) >= EXHAUSTIVE_MAX_REJECTS:
+            if axis_id in combos and combos[axis_id].capacity <= EXHAUSTIVE_ENUMERATE_LIMIT:
+                remaining[axis_id] = enumerate_remaining(axis_id)
+            else:
+                rejects[axis_id] = 0
+        if axis_id in remaining:
+            if not remaining[axis_id]:
+                return None
+            slots, slot_tags = combos[axis_id].slots(combos[axis_id].decode(remaining[axis_id].pop()))
+            for token in slots.values():
+                record_token(token)
+            return slots, slot_tags, dedupe_key(axis_id, slots)
+        slots, slot_tags = build_slots_for_axis(axis_id)
+        return slots, slot_tags, dedupe_key(axis_id, slots)
+
+    def try_accept(axis_id: str, candidate: tuple | None, idx: int) -> bool:
+        if candidate is None:
+            return False
+        slots, slot_tags, key = candidate
+        if key in exclude_keys or key in existing_keys or (strict and key in seen):
+            if exhaustive:
+                rejects[axis_id] = rejects.get(axis_id, 0) + 1
+            return False
+        seen.add(key)
+        if exhaustive:
+            rejects[axis_id] = 0
+        append_item(axis_id, slots, slot_tags, idx)
+        return True
+
+    idx = start_index
+    if axis_quotas is not None or axis_distribution == "balanced":
+        if axis_quotas is not None:
+            quota_items = list(axis_quotas.items())
+        else:
+            quota_items = list(zip(axis_ids, balanced_quotas(axis_ids, weights, target_count)))
         axis_queue: List[str] = []
-        for axis_id, count in zip(axis_ids, base):
+        demand: Dict[str, int] = {}
+        for axis_id, count in quota_items:
             axis_queue.extend([axis_id] * count)
+            demand[axis_id] = demand.get(axis_id, 0) + count
+        if guarded:
+            build_combos([axis_id for axis_id, count in demand.items() if count > 0])
+            # Soft mode may repeat new items, so one free combination per drawn axis is enough.
+            needed = {ax: n if strict else 1 for ax, n in demand.items() if n > 0}
+            check_excluded_capacity(combos, needed, exclude_keys, existing_keys)
         rng.shuffle(axis_queue)
         for axis_id in axis_queue:
-            while True:
-                slots, slot_tags = build_slots_for_axis(axis_id)
-                key = dedupe_key(axis_id, slots)
-                if key in exclude_keys:
-                    continue
-                if dedupe_mode == "strict" and key in seen:
-                    continue
-                seen.add(key)
-                append_item(axis_id, slots, slot_tags, idx)
-                idx += 1
-                break
+            while not try_accept(axis_id, next_candidate(axis_id), idx):
+                pass
+            idx += 1
     else:
+        if guarded:
+            eligible = [ax for ax, w in zip(axis_ids, weights) if w > 0] if sum(weights) > 0 else axis_ids
+            build_combos(list(dict.fromkeys(eligible)))
+            total = target_count if strict else min(target_count, 1)
+            check_excluded_capacity(combos, {}, exclude_keys, existing_keys, total=total)
+        axis_sampler = WeightedSampler(axis_ids, weights, sampler)
         while len(plan) < target_count:
-            axis_id = weighted_choice(axis_ids, weights, rng)
-            slots, slot_tags = build_slots_for_axis(axis_id)
-            key = dedupe_key(axis_id, slots)
-            if key in exclude_keys:
-                continue
-            if dedupe_mode == "strict" and key in seen:
-                continue
-            seen.add(key)
-            append_item(axis_id, slots, slot_tags, idx)
-            idx += 1
+            axis_id = axis_sampler.draw(rng)
+            if try_accept(axis_id, next_candidate(axis_id), idx):
+                idx += 1
+    if state is not None:
+        rng_version, internal, gauss = rng.getstate()
+        state.update(
+            {
+                "sampler": sampler,
+                "rng_state": [rng_version, list(internal), gauss],
+                "recent_tokens": list(recent_tokens.tokens) if recent_tokens is not None else [],
+                "token_counts": token_counts,
+                "tag_cursors": tag_cursors,
+            }
+        )
     return plan
 
 
-def save_plan(plan: List[dict], path: Path) -> None:
+def write_plan(
+    items: Iterable[dict],
+    path: Path,
+    plan_format: str = "jsonl",
+    axis_templates: Dict[str, dict] | None = None,
+    global_suffix: str = "",
+) -> int:
+    """
+    Stream items to `path` as they are produced (newline-separated, no trailing newline) and return the
+    count. Written to a temp file and swapped in, so readers never see a half-written plan.
+    plan_format "compact" writes the header + id rows of src.plan_compact instead of full JSON items.
+    """
+    if plan_format not in PLAN_FORMATS:
+        raise ValueError(f"Unknown plan_format: {plan_format} (expected one of {', '.join(PLAN_FORMATS)})")
     path.parent.mkdir(parents=True, exist_ok=True)
-    lines = [json.dumps(item, ensure_ascii=False) for item in plan]
-    path.write_text("\n".join(lines), encoding="utf-8")
+    tmp_path = path.with_name(path.name + ".tmp")
+    count = 0
+
+    def counted() -> Iterator[dict]:
+        nonlocal count
+        for item in items:
+            count += 1
+            yield item.to_dict() if isinstance(item, PlanItem) else item
+
+    if plan_format == "compact":
+        lines: Iterable[str] = encode_compact_plan(counted(), axis_templates or {}, global_suffix)
+    else:
+        lines = (json.dumps(item, ensure_ascii=False) for item in counted())
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        for line_no, line in enumerate(lines):
+            if line_no:
+                f.write("\n")
+            f.write(line)
+    os.replace(tmp_path, path)
+    return count
+
+
+def save_plan(
+    plan: List[dict],
+    path: Path,
+    plan_format: str = "jsonl",
+    axis_templates: Dict[str, dict] | None = None,
+    global_suffix: str = "",
+) -> None:
+    write_plan(plan, path, plan_format, axis_templates, global_suffix)
+
+
+def read_plan_header(path: Path) -> Dict[str, Any]:
+    """Header record of a compact plan ({} for plain JSONL plans)."""
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    return {}
+                return record if isinstance(record, dict) and "compact_plan" in record else {}
+    return {}
+
+
+def append_plan(items: List[dict], path: Path, axis_templates: Dict[str, dict] | None = None) -> None:
+    """Append items in the plan's existing layout (newline-separated, no trailing newline; compact or JSONL)."""
+    if not items:
+        return
+    needs_newline = False
+    if path.exists() and path.stat().st_size:
+        with open(path, "rb") as f:
+            f.seek(-1, 2)
+            needs_newline = f.read(1) != b"\n"
+    encoder = None
+    if path.exists() and read_plan_header(path):
+        decoder = CompactPlanDecoder()
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                if line.startswith("{"):
+                    decoder.feed(json.loads(line))
+        encoder = CompactPlanEncoder.resume(decoder, axis_templates or {})
+    with open(path, "a", encoding="utf-8") as f:
+        for item in items:
+            if isinstance(item, PlanItem):
+                item = item.to_dict()
+            lines = encoder.encode(item) if encoder is not None else [json.dumps(item, ensure_ascii=False)]
+            for line in lines:
+                if needs_newline:
+                    f.write("\n")
+                f.write(line)
+                needs_newline = True
+
+
+def iter_plan(
+    path: Path,
+    axis: str | None = None,
+    indices: Container[int] | None = None,
+    predicate: Callable[[dict], bool] | None = None,
+    skip_invalid: bool = False,
+    as_items: bool = False,
+) -> Iterator[dict]:
+    """
+    Yield plan items one line at a time, optionally only those on `axis`, with an index in `indices`,
+    or accepted by `predicate`. Invalid lines raise unless `skip_invalid`. Compact plans are decoded
+    transparently (prompts rendered from the stored templates). `as_items` yields PlanItem instead of dicts.
+    """
+    decoder = CompactPlanDecoder(as_items)
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            try:
+                item = decoder.feed(json.loads(line))
+            except ValueError:
+                if skip_invalid:
+                    continue
+                raise
+            if item is None:
+                continue
+            if axis is not None and item.get("axis_id") != axis:
+                continue
+            if indices is not None and item.get("index") not in indices:
+                continue
+            if predicate is not None and not predicate(item):
+                continue
+            yield item
+
+
+def read_plan(path: Path, as_items: bool = False) -> List[dict]:
+    return list(iter_plan(path, as_items=as_items))
+
+
+def to_plan_items(plan: Iterable[dict]) -> List[PlanItem]:
+    """PlanItems for `plan`; a list is converted in place, so each dict can be freed as it is replaced."""
+    factory = PlanItemFactory()
+    if isinstance(plan, list):
+        for pos, item in enumerate(plan):
+            if not isinstance(item, PlanItem):
+                plan[pos] = factory.from_dict(item)
+        return plan
+    return [item if isinstance(item, PlanItem) else factory.from_dict(item) for item in plan]
+
+
+def plan_excluded_names(path: Path) -> List[str]:
+    """
+    Plans excluded when this plan was generated: the merged list saved by the last --extend-plan,
+    else excluded_plans on the first item (what --exclude-plan was at generation time).
+    """
+    saved = read_plan_state(path).get("excluded_plans")
+    if saved is not None:
+        return list(saved)
+    for item in iter_plan(path):
+        return list(item.get("excluded_plans") or [])
+    return []
+
+
+def plan_state_path(plan_path: Path) -> Path:
+    return plan_path.with_name(f"{plan_path.stem}.state.json")
+
+
+def save_plan_state(plan_path: Path, state: Dict[str, Any]) -> None:
+    """Persist sampler state + segments next to the plan, stamped with the plan size it matches."""
+    payload = dict(state, version=PLAN_STATE_VERSION, plan_size=plan_path.stat().st_size)
+    state_path = plan_state_path(plan_path)
+    tmp_path = state_path.with_name(state_path.name + ".tmp")
+    tmp_path.write_text(json.dumps(payload, ensure_ascii=False), encoding="utf-8")
+    os.replace(tmp_path, state_path)
+
+
+def read_plan_state(plan_path: Path) -> Dict[str, Any]:
+    state_path = plan_state_path(plan_path)
+    if not state_path.exists():
+        return {}
+    try:
+        data = json.loads(state_path.read_text(encoding="utf-8"))
+    except Exception:
+        return {}
+    return data if data.get("version") == PLAN_STATE_VERSION else {}
+
+
+def plan_segment_starts(plan_path: Path) -> List[int]:
+    """First index of every --extend-plan segment (empty for plans that were never extended)."""
+    return [int(start) for start, _count in read_plan_state(plan_path).get("segments") or []]
+
+
+def rebuild_plan_state(plan: Iterable[dict], seed: int | None, start_index: int, max_repeat_window: int) -> Dict[str, Any]:
+    """
+    Best-effort sampler state for plans without a saved one (older plans, numpy engine): a fresh RNG
+    derived from the plan seed and the start index, token counts and repeat window from the items.
+    """
+    rng = Random(f"{seed}:extend:{start_index}") if seed is not None else Random()
+    token_counts: Dict[str, int] = {}
+    tag_cursors: Dict[str, int] = {}
+    tokens: List[str] = []
+    for item in plan:
+        for token in (item.get("slots") or {}).values():
+            token_counts[token] = token_counts.get(token, 0) + 1
+            tokens.append(token)
+        for cat in (item.get("slot_tags") or {}):
+            tag_cursors[cat] = tag_cursors.get(cat, 0) + 1
+    rng_version, internal, gauss = rng.getstate()
+    return {
+        "rng_state": [rng_version, list(internal), gauss],
+        "recent_tokens": tokens[-max_repeat_window:] if max_repeat_window > 0 else [],
+        "token_counts": token_counts,
+        "tag_cursors": tag_cursors,
+    }
 
 
 def load_plan(
@@ -243,19 +870,158 @@ def load_plan(
     seed: int | None,
     profile: str,
     regen_plan: bool,
-    exclude_keys: Set[str] | None = None,
+    exclude_keys: Container[str] | None = None,
     excluded_plans: List[str] | None = None,
     tag_sampling: Dict[str, object] | None = None,
     sampling_controls: Dict[str, int] | None = None,
+    sampler: str = "v1",
+    plan_engine: str = "python",
+    plan_workers: int = 1,
+    plan_format: str = "jsonl",
 ) -> List[dict]:
     if path.exists() and not regen_plan:
-        raw = path.read_text(encoding="utf-8").splitlines()
-        return [json.loads(line) for line in raw if line.strip()]
-    plan = create_slot_plan(
+        header = read_plan_header(path)
+        if header and header.get("template_hash") != template_hash(axis_templates, global_suffix):
+            print(f"[info] {path.name} was generated with different templates; prompts use the plan's stored templates")
+        return read_plan(path, as_items=True)
+    state: Dict[str, Any] | None = None
+    if plan_engine == "python" and plan_workers > 1:
+        from src.plan_shards import create_slot_plan_sharded
+
+        plan = create_slot_plan_sharded(
+            axis_templates,
+            vocab,
+            axis_ids,
+            target_count,
+            global_suffix,
+            axis_weights,
+            axis_distribution,
+            dedupe_mode,
+            seed,
+            profile,
+            exclude_keys,
+            excluded_plans,
+            tag_sampling,
+            sampling_controls,
+            sampler,
+            workers=plan_workers,
+        )
+    elif plan_engine == "numpy":
+        from src.plan_numpy import create_slot_plan_numpy  # optional numpy dependency
+
+        plan = create_slot_plan_numpy(
+            axis_templates,
+            vocab,
+            axis_ids,
+            target_count,
+            global_suffix,
+            axis_weights,
+            axis_distribution,
+            dedupe_mode,
+            seed,
+            profile,
+            exclude_keys,
+            excluded_plans,
+            tag_sampling,
+            sampling_controls,
+            sampler,
+        )
+    elif plan_engine == "python":
+        state = {}
+        plan = create_slot_plan(
+            axis_templates,
+            vocab,
+            axis_ids,
+            target_count,
+            global_suffix,
+            axis_weights,
+            axis_distribution,
+            dedupe_mode,
+            seed,
+            profile,
+            exclude_keys,
+            excluded_plans,
+            tag_sampling,
+            sampling_controls,
+            sampler,
+            state=state,
+        )
+    else:
+        raise ValueError(f"Unknown plan_engine: {plan_engine} (expected python or numpy)")
+    save_plan(plan, path, plan_format, axis_templates, global_suffix)
+    if state is not None:
+        state.update({"seed": seed, "next_index": len(plan), "segments": [[0, len(plan)]]})
+        save_plan_state(path, state)
+    else:
+        plan_state_path(path).unlink(missing_ok=True)
+    return to_plan_items(plan)
+
+
+def extend_plan(
+    path: Path,
+    extra_count: int,
+    axis_templates: Dict[str, dict],
+    vocab: Dict[str, List[str]],
+    axis_ids: List[str],
+    global_suffix: str,
+    axis_weights: Dict[str, float] | None,
+    axis_distribution: str | None,
+    dedupe_mode: str,
+    profile: str,
+    exclude_keys: Container[str] | None = None,
+    tag_sampling: Dict[str, object] | None = None,
+    sampling_controls: Dict[str, int] | None = None,
+    sampler: str = "v1",
+    excluded_plans: List[str] | None = None,
+    existing: Sequence[dict] | None = None,
+) -> List[PlanItem]:
+    """
+    Append `extra_count` new unique items to an existing plan (--extend-plan) and return only the new
+    items. `existing` is the plan already in memory (e.g. read_plan(path, as_items=True)); without it
+    the file is streamed, and read twice only when the sampler state has to be rebuilt. Indices
+    continue after the current maximum and existing lines are left untouched. The saved
+    <plan>.state.json sampler state is resumed when it still matches the plan file; otherwise it is
+    rebuilt with rebuild_plan_state. Each extension is recorded as a segment for batch chunking.
+    `excluded_plans` (default: plan_excluded_names) is recorded on the new items and in the state.
+    Only weighted distribution in strict mode draws the same items as generating the whole plan in one
+    pass: balanced quotas are dealt per extension, exhaustive enumeration state is not saved, and soft
+    mode never repeats keys that are already in the plan.
+    """
+    size = 0
+    start_index = 0
+    first: dict = {}
+    existing_keys: Set[str] = set()
+    for item in existing if existing is not None else iter_plan(path):
+        if not size:
+            first = item
+        size += 1
+        start_index = max(start_index, int(item["index"]) + 1)
+        existing_keys.add(dedupe_key(item.get("axis_id", ""), item.get("slots") or {}))
+    saved = read_plan_state(path)
+    segments = [seg for seg in saved.get("segments") or [] if int(seg[0]) < start_index] or [[0, size]]
+    seed = first.get("seed_used")
+    if excluded_plans is None:
+        excluded_plans = plan_excluded_names(path)
+    state_matches = saved.get("plan_size") == path.stat().st_size and saved.get("next_index") == start_index
+    if saved.get("rng_state") and state_matches:
+        state = saved
+        if saved.get("sampler", sampler) != sampler:
+            print(
+                f"[warn] {path.name} was generated with sampler {saved['sampler']}; sampler {sampler} is "
+                "ignored so the extension continues the same random stream"
+            )
+        sampler = saved.get("sampler", sampler)
+    else:
+        print(f"[info] no matching sampler state for {path.name}; extending with a reseeded RNG")
+        max_repeat_window = int((sampling_controls or {}).get("max_repeat_window", 0))
+        state = rebuild_plan_state(
+            existing if existing is not None else iter_plan(path), seed, start_index, max_repeat_window
+        )
+    new_items = create_slot_plan(
         axis_templates,
         vocab,
         axis_ids,
-        target_count,
+        extra_count,
         global_suffix,
         axis_weights,
         axis_distribution,
@@ -266,59 +1032,131 @@ def load_plan(
         excluded_plans,
         tag_sampling,
         sampling_controls,
+        sampler,
+        start_index=start_index,
+        existing_keys=existing_keys,
+        state=state,
     )
-    save_plan(plan, path)
-    return plan
+    append_plan(new_items, path, axis_templates)
+    state.update(
+        {
+            "seed": seed,
+            "next_index": start_index + len(new_items),
+            "segments": segments + [[start_index, len(new_items)]],
+            "excluded_plans": excluded_plans,
+        }
+    )
+    save_plan_state(path, state)
+    return to_plan_items(new_items)
 
 
 def load_manifest_indices(path: Path) -> Set[int]:
     if not path.exists():
         return set()
-    indices: Set[int] = set()
-    with open(path, "r", encoding="utf-8") as f:
-        for line in f:
-            if not line.strip():
-                continue
-            try:
-                data = json.loads(line)
-                indices.add(int(data["index"]))
-            except Exception:
-                continue
-    return indices
+    if is_sqlite_manifest(path):
+        return open_sqlite_manifest(path).indices()
+    return ManifestIndex.open(path).indices()
 
 
-def load_manifest_by_index(path: Path) -> Dict[int, dict]:
+def load_manifest_by_index(
+    path: Path,
+    plan_name: str | None = None,
+    profile: str | None = None,
+    success_only: bool = False,
+) -> Dict[int, dict]:
+    """
+    Latest manifest record per index (latest success when success_only), optionally restricted to one
+    plan/profile. JSONL manifests are served from the on-disk manifest index, so only new lines and the
+    selected records are parsed; SQLite manifests answer with one indexed query.
+    """
     if not path.exists():
         return {}
-    mapping: Dict[int, dict] = {}
-    with open(path, "r", encoding="utf-8") as f:
-        for line in f:
-            if not line.strip():
-                continue
-            try:
-                data = json.loads(line)
-                mapping[int(data["index"])] = data
-            except Exception:
-                continue
-    return mapping
+    if is_sqlite_manifest(path):
+        return open_sqlite_manifest(path).latest_by_index(plan_name, profile, success_only=success_only)
+    index = ManifestIndex.open(path)
+    return index.read_records(index.select(plan_name=plan_name, profile=profile, success_only=success_only))
 
 
-def filter_plan(
-    plan: List[dict],
+def load_failed_indices(
+    path: Path,
+    plan_name: str | None = None,
+    profile: str | None = None,
+    latest: Dict[int, dict] | None = None,
+) -> Set[int]:
+    """
+    Indices whose latest record failed (status error/failed/failure, or an error set). SQLite manifests
+    are filtered in SQL; for JSONL the records from load_manifest_by_index are checked (pass them as
+    `latest` to avoid reading them again).
+    """
+    if not path.exists():
+        return set()
+    if is_sqlite_manifest(path):
+        return open_sqlite_manifest(path).failed_indices(plan_name, profile)
+    if latest is None:
+        latest = load_manifest_by_index(path, plan_name=plan_name, profile=profile)
+    return {idx for idx, meta in latest.items() if meta.get("status") in FAILED_STATUSES or meta.get("error")}
+
+
+def filter_plan_positions(
+    plan: Sequence[dict],
     axis: str | None = None,
     bundle: str | None = None,
     count: int | None = None,
-) -> List[dict]:
-    filtered = []
-    for item in plan:
+) -> array:
+    """Positions in `plan` of the items passing the filters, as a compact array (no list of items)."""
+    positions = array("q")
+    for pos, item in enumerate(plan):
         if axis and item["axis_id"] != axis:
             continue
         if bundle and item.get("bundle") != bundle:
             continue
-        filtered.append(item)
-        if count is not None and len(filtered) >= count:
+        positions.append(pos)
+        if count is not None and len(positions) >= count:
             break
-    return filtered
+    return positions
+
+
+def filter_plan(
+    plan: List[dict],
+    axis: str | None = None,
+    bundle: str | None = None,
+    count: int | None = None,
+) -> List[dict]:
+    return [plan[pos] for pos in filter_plan_positions(plan, axis, bundle, count)]
+
+
+class PlanIndex:
+    """
+    Plan item lookup by its "index" field through a sorted array('q') + bisect instead of a dict with
+    one entry per item. Plans written in index order (the usual case) need no position array at all.
+    """
+
+    def __init__(self, plan: Sequence[dict]) -> None:
+        self.plan = plan
+        keys = array("q", (item["index"] for item in plan))
+        if all(keys[i] < keys[i + 1] for i in range(len(keys) - 1)):
+            self.keys = keys
+            self.positions: array | None = None
+        else:
+            order = sorted(range(len(keys)), key=keys.__getitem__)
+            self.keys = array("q", (keys[pos] for pos in order))
+            self.positions = array("q", order)
+
+    def position(self, index: int) -> int | None:
+        pos = bisect_left(self.keys, index)
+        if pos < len(self.keys) and self.keys[pos] == index:
+            return self.positions[pos] if self.positions is not None else pos
+        return None
+
+    def get(self, index: int, default: Any = None) -> Any:
+        pos = self.position(index)
+        return self.plan[pos] if pos is not None else default
+
+    def __contains__(self, index: int) -> bool:
+        return self.position(index) is not None
+
+    def __len__(self) -> int:
+        return len(self.keys)
 
 
 def find_domain(domains_by_bundle: Dict[str, List[dict]], bundle: str, domain_id: str) -> dict | None:
@@ -0,0 +1,463 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Set, Tuple
+
+INDEX_VERSION = 2
+INDEX_COMPACT_DELTAS = 32
+TAIL_HASH_BYTES = 64
+SQLITE_SUFFIXES = (".sqlite", ".sqlite3", ".db")
+FAILED_STATUSES = ("error", "failed", "failure")
+
+
+def is_sqlite_manifest(path: Path) -> bool:
+    return path.suffix.lower() in SQLITE_SUFFIXES
+
+
+def default_manifest_path(output_dir: Path, backend: str | None = None) -> Path:
+    """manifest.jsonl (default) or manifest.sqlite for `manifest_backend: sqlite`."""
+    if (backend or "jsonl").lower() == "sqlite":
+        return output_dir / "manifest.sqlite"
+    return output_dir / "manifest.jsonl"
+
+
+def iter_jsonl_records(path: Path, offset: int = 0) -> Iterator[Tuple[int, int, dict | None]]:
+    """
+    Yield (line_offset, next_offset, record) for each complete line from byte `offset`.
+    record is None for blank/unparsable lines; a trailing line without newline is not consumed.
+    """
+    with open(path, "rb") as f:
+        f.seek(offset)
+        pos = offset
+        for raw in f:
+            if not raw.endswith(b"\n"):
+                break
+            next_pos = pos + len(raw)
+            record = None
+            if raw.strip():
+                try:
+                    record = json.loads(raw)
+                except Exception:
+                    record = None
+            yield pos, next_pos, record
+            pos = next_pos
+
+
+class JsonlTail:
+    """
+    Incremental reader for an append-only JSONL file: remembers the byte offset it consumed and
+    returns only records appended since. A shrunk or rewritten file (tail hash mismatch) restarts from 0.
+    allow_unterminated also consumes a last line without newline once it parses (plans are saved that way).
+    """
+
+    def __init__(self, path: Path, allow_unterminated: bool = False) -> None:
+        self.path = path
+        self.offset = 0
+        self.allow_unterminated = allow_unterminated
+        self._tail_hash: str | None = None
+
+    def read_new(self) -> Tuple[bool, List[dict]]:
+        """Returns (reset, records); reset=True means earlier records are stale and were re-read from the start."""
+        reset = False
+        if not self.path.exists():
+            reset = self.offset > 0
+            self.offset, self._tail_hash = 0, None
+            return reset, []
+        if self.offset and (
+            self.offset > self.path.stat().st_size or _tail_hash(self.path, self.offset) != self._tail_hash
+        ):
+            reset = True
+            self.offset = 0
+        records: List[dict] = []
+        start = self.offset
+        for _, next_offset, record in iter_jsonl_records(self.path, self.offset):
+            self.offset = next_offset
+            if record is not None:
+                records.append(record)
+        if self.allow_unterminated:
+            with open(self.path, "rb") as f:
+                f.seek(self.offset)
+                rest = f.read()
+            if rest.strip():
+                try:
+                    records.append(json.loads(rest))
+                    self.offset += len(rest)
+                except Exception:
+                    pass
+        if self.offset != start or self._tail_hash is None:
+            self._tail_hash = _tail_hash(self.path, self.offset)
+        return reset, records
+
+
+def manifest_index_path(manifest_path: Path) -> Path:
+    return manifest_path.with_name(manifest_path.name + ".idx")
+
+
+def _tail_hash(path: Path, offset: int) -> str:
+    start = max(offset - TAIL_HASH_BYTES, 0)
+    with open(path, "rb") as f:
+        f.seek(start)
+        return hashlib.blake2b(f.read(offset - start), digest_size=16).hexdigest()
+
+
+def _entry_key(profile: str, plan_name: str, index: int) -> str:
+    return f"{profile}:{plan_name}:{index}"
+
+
+def _split_key(key: str) -> Tuple[str, str, int]:
+    # The plan name may contain ":" (profiles are directory names and do not).
+    profile, rest = key.split(":", 1)
+    plan_name, idx = rest.rsplit(":", 1)
+    return profile, plan_name, int(idx)
+
+
+def _merge_entry(entries: Dict[str, List], key: str, entry: List) -> None:
+    """Keep the newest record of key and the newest success offset across index deltas."""
+    current = entries.get(key)
+    if current is None:
+        entries[key] = list(entry)
+        return
+    latest = entry if entry[0] >= current[0] else current
+    successes = [off for off in (current[2], entry[2]) if off is not None]
+    entries[key] = [latest[0], latest[1], max(successes) if successes else None]
+
+
+class ManifestIndex:
+    """
+    On-disk index of manifest.jsonl keyed by profile:plan_name:index.
+    Each entry holds [latest_offset, latest_status, latest_success_offset]. The index file is JSONL: a
+    version header, then one delta per save with the entries changed since the last one plus a checkpoint
+    (bytes consumed, hash of the bytes just before that point). Opening replays the deltas and parses only
+    manifest lines appended after the newest checkpoint; saving appends one delta line, and the file is
+    compacted to a single delta every INDEX_COMPACT_DELTAS saves. A rewritten or truncated manifest
+    (checkpoint hash mismatch) triggers a full rebuild.
+    """
+
+    def __init__(self, manifest_path: Path) -> None:
+        self.manifest_path = manifest_path
+        self.index_path = manifest_index_path(manifest_path)
+        self.offset = 0
+        self.entries: Dict[str, List] = {}
+        self._changed: Dict[str, List] = {}
+        self._deltas = 0
+        self._file_valid = False
+
+    @classmethod
+    def open(cls, manifest_path: Path) -> "ManifestIndex":
+        index = cls(manifest_path)
+        index._load()
+        if index.refresh():
+            index.save()
+        return index
+
+    def _load(self) -> None:
+        if not self.index_path.exists() or not self.manifest_path.exists():
+            return
+        entries: Dict[str, List] = {}
+        checkpoint: Tuple[int, str | None] | None = None
+        deltas = 0
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                header = json.loads(f.readline() or "{}")
+                if not isinstance(header, dict) or header.get("version") != INDEX_VERSION:
+                    return
+                for line in f:
+                    try:
+                        delta = json.loads(line)
+                        offset = int(delta["offset"])
+                    except Exception:
+                        # A delta cut short by a crash; the manifest lines it covered are simply re-read.
+                        continue
+                    deltas += 1
+                    for key, entry in (delta.get("entries") or {}).items():
+                        _merge_entry(entries, key, entry)
+                    # Concurrent writers may append deltas out of order; the furthest checkpoint wins.
+                    if checkpoint is None or offset > checkpoint[0]:
+                        checkpoint = (offset, delta.get("tail_hash"))
+        except (OSError, ValueError):
+            return
+        if checkpoint is None:
+            return
+        offset, tail_hash = checkpoint
+        if offset > self.manifest_path.stat().st_size or _tail_hash(self.manifest_path, offset) != tail_hash:
+            return
+        self.offset = offset
+        self.entries = entries
+        self._deltas = deltas
+        self._file_valid = True
+
+    def refresh(self) -> bool:
+        """Apply lines appended since the last refresh; returns True when anything was consumed."""
+        if not self.manifest_path.exists():
+            return False
+        start = self.offset
+        for line_offset, next_offset, record in iter_jsonl_records(self.manifest_path, self.offset):
+            self.offset = next_offset
+            if record is not None:
+                self.apply(line_offset, record)
+        return self.offset != start
+
+    def apply(self, line_offset: int, record: dict) -> None:
+        try:
+            idx = int(record["index"])
+        except Exception:
+            return
+        key = _entry_key(record.get("profile") or "", record.get("plan_name") or "", idx)
+        status = record.get("status")
+        entry = self.entries.get(key)
+        success_offset = entry[2] if entry else None
+        if status == "success":
+            success_offset = line_offset
+        self.entries[key] = self._changed[key] = [line_offset, status, success_offset]
+
+    def _delta_line(self, entries: Dict[str, List]) -> str:
+        delta = {
+            "offset": self.offset,
+            "tail_hash": _tail_hash(self.manifest_path, self.offset),
+            "entries": entries,
+        }
+        return json.dumps(delta, ensure_ascii=False, separators=(",", ":")) + "\n"
+
+    def save(self) -> None:
+        if self._file_valid and self._deltas < INDEX_COMPACT_DELTAS:
+            # One O_APPEND write per delta, so concurrent savers never interleave inside a line.
+            fd = os.open(self.index_path, os.O_WRONLY | os.O_APPEND)
+            try:
+                os.write(fd, self._delta_line(self._changed).encode("utf-8"))
+            finally:
+                os.close(fd)
+            self._deltas += 1
+        else:
+            header = json.dumps({"version": INDEX_VERSION}) + "\n"
+            with tempfile.NamedTemporaryFile(
+                "w",
+                encoding="utf-8",
+                dir=self.index_path.parent,
+                prefix=self.index_path.name + ".",
+                suffix=".tmp",
+                delete=False,
+            ) as tmp:
+                tmp.write(header + self._delta_line(self.entries))
+            os.replace(tmp.name, self.index_path)
+            self._file_valid = True
+            self._deltas = 1
+        self._changed = {}
+
+    def select(
+        self,
+        plan_name: str | None = None,
+        profile: str | None = None,
+        success_only: bool = False,
+    ) -> Dict[int, int]:
+        """
+        index -> byte offset of the latest matching record (latest success when success_only).
+        A profile filter also accepts legacy records without a profile.
+        """
+        chosen: Dict[int, int] = {}
+        for key, (latest_offset, _status, success_offset) in self.entries.items():
+            rec_profile, rec_plan, idx = _split_key(key)
+            if plan_name is not None and rec_plan != plan_name:
+                continue
+            if profile is not None and rec_profile not in (profile, ""):
+                continue
+            offset = success_offset if success_only else latest_offset
+            if offset is None:
+                continue
+            if offset > chosen.get(idx, -1):
+                chosen[idx] = offset
+        return chosen
+
+    def read_records(self, offsets: Dict[int, int]) -> Dict[int, dict]:
+        records: Dict[int, dict] = {}
+        with open(self.manifest_path, "rb") as f:
+            for idx, offset in sorted(offsets.items(), key=lambda kv: kv[1]):
+                f.seek(offset)
+                try:
+                    records[idx] = json.loads(f.readline())
+                except Exception:
+                    continue
+        return records
+
+    def indices(self) -> Set[int]:
+        return {_split_key(key)[2] for key in self.entries}
+
+
+class SqliteManifest:
+    """
+    Manifest records in a WAL-mode SQLite database (one row per appended record, newest = highest id).
+    plan_name, status and axis_id are indexed so resume checks and filters are queries, not scans.
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self.closed = False
+        self._conn = sqlite3.connect(str(path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS manifest (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                profile TEXT,
+                plan_name TEXT,
+                idx INTEGER,
+                axis_id TEXT,
+                status TEXT,
+                record TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS manifest_plan_idx ON manifest(plan_name, idx);
+            CREATE INDEX IF NOT EXISTS manifest_status ON manifest(status);
+            CREATE INDEX IF NOT EXISTS manifest_axis ON manifest(axis_id);
+            """
+        )
+        self._conn.commit()
+
+    @staticmethod
+    def _row(metadata: dict) -> Tuple:
+        try:
+            idx = int(metadata["index"])
+        except Exception:
+            idx = None
+        return (
+            metadata.get("profile"),
+            metadata.get("plan_name"),
+            idx,
+            metadata.get("axis_id"),
+            metadata.get("status"),
+            json.dumps(metadata, ensure_ascii=False),
+        )
+
+    def append(self, metadata: dict, commit: bool = True) -> None:
+        self.append_many([metadata], commit=commit)
+
+    def append_many(self, records: Iterable[dict], commit: bool = True) -> None:
+        with self._lock:
+            self._conn.executemany(
+                "INSERT INTO manifest (profile, plan_name, idx, axis_id, status, record) VALUES (?, ?, ?, ?, ?, ?)",
+                (self._row(rec) for rec in records),
+            )
+            if commit:
+                self._conn.commit()
+
+    def commit(self) -> None:
+        with self._lock:
+            self._conn.commit()
+
+    @staticmethod
+    def _latest_ids(plan_name: str | None, profile: str | None, success_only: bool = False) -> Tuple[str, List]:
+        """Subquery selecting the newest row id per index for the given filters."""
+        where = ["idx IS NOT NULL"]
+        params: List = []
+        if plan_name is not None:
+            where.append("plan_name = ?")
+            params.append(plan_name)
+        if profile is not None:
+            where.append("(profile = ? OR profile IS NULL OR profile = '')")
+            params.append(profile)
+        if success_only:
+            where.append("status = 'success'")
+        return f"SELECT MAX(id) FROM manifest WHERE {' AND '.join(where)} GROUP BY idx", params
+
+    def latest_by_index(
+        self,
+        plan_name: str | None = None,
+        profile: str | None = None,
+        success_only: bool = False,
+    ) -> Dict[int, dict]:
+        latest, params = self._latest_ids(plan_name, profile, success_only)
+        with self._lock:
+            rows = self._conn.execute(f"SELECT idx, record FROM manifest WHERE id IN ({latest})", params).fetchall()
+        return {int(idx): json.loads(record) for idx, record in rows}
+
+    def failed_indices(self, plan_name: str | None = None, profile: str | None = None) -> Set[int]:
+        """Indices whose latest record failed (failed status or a non-empty error), decided in SQL."""
+        latest, params = self._latest_ids(plan_name, profile)
+        statuses = ",".join("?" for _ in FAILED_STATUSES)
+        sql = (
+            f"SELECT idx FROM manifest WHERE id IN ({latest}) AND (status IN ({statuses}) "
+            "OR COALESCE(json_extract(record, '$.error'), '') NOT IN ('', 0, '{}', '[]'))"
+        )
+        with self._lock:
+            rows = self._conn.execute(sql, [*params, *FAILED_STATUSES]).fetchall()
+        return {int(row[0]) for row in rows}
+
+    def indices(self) -> Set[int]:
+        with self._lock:
+            rows = self._conn.execute("SELECT DISTINCT idx FROM manifest WHERE idx IS NOT NULL").fetchall()
+        return {int(row[0]) for row in rows}
+
+    def iter_records(
+        self,
+        plan_names: Iterable[str] | None = None,
+        status: str | None = None,
+        after_id: int = 0,
+    ) -> Iterator[Tuple[int, dict]]:
+        """Yield (row id, record) in append order, optionally filtered by plan names / status."""
+        where = ["id > ?"]
+        params: List = [after_id]
+        if plan_names is not None:
+            names = list(plan_names)
+            where.append(f"plan_name IN ({','.join('?' for _ in names)})")
+            params.extend(names)
+        if status is not None:
+            where.append("status = ?")
+            params.append(status)
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT id, record FROM manifest WHERE {' AND '.join(where)} ORDER BY id", params
+            ).fetchall()
+        for row_id, record in rows:
+            yield row_id, json.loads(record)
+
+    def export_jsonl(self, out_path: Path) -> int:
+        count = 0
+        out_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(out_path, "w", encoding="utf-8") as f:
+            for _, record in self.iter_records():
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+                count += 1
+        return count
+
+    def import_jsonl(self, jsonl_path: Path) -> int:
+        records = [record for _, _, record in iter_jsonl_records(jsonl_path) if record is not None]
+        self.append_many(records)
+        return len(records)
+
+    def close(self) -> None:
+        with self._lock:
+            if self.closed:
+                return
+            self._conn.commit()
+            self._conn.close()
+            self.closed = True
+
+
+_SQLITE_MANIFESTS: Dict[str, SqliteManifest] = {}
+_SQLITE_LOCK = threading.Lock()
+
+
+def open_sqlite_manifest(path: Path) -> SqliteManifest:
+    """Shared connection per database path for the lifetime of the process."""
+    key = str(path.resolve())
+    with _SQLITE_LOCK:
+        db = _SQLITE_MANIFESTS.get(key)
+        if db is None:
+            db = SqliteManifest(path)
+            _SQLITE_MANIFESTS[key] = db
+        return db
+
+
+def close_sqlite_manifest(path: Path) -> None:
+    """Commit and close the shared connection for `path`; the next open_sqlite_manifest reconnects."""
+    with _SQLITE_LOCK:
+        db = _SQLITE_MANIFESTS.pop(str(path.resolve()), None)
+    if db is not None:
+        db.close()
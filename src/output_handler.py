@@ -1,33 +1,37 @@
 from __future__ import annotations
 
 import json
+import os
+import queue
+import threading
+import time
 from pathlib import Path
-from typing import Dict, List
+from typing import Any, Callable, Dict, List
+
+from src.manifest_store import ManifestIndex, close_sqlite_manifest, is_sqlite_manifest, open_sqlite_manifest
 
 
 def ensure_directory(path: Path) -> None:
     path.mkdir(parents=True, exist_ok=True)
 
 
+def image_filenames(base_name: str, thought_count: int, save_thoughts: bool = True) -> Dict[str, List[str]]:
+    """File names save_images will use, so metadata can be built before the bytes hit disk."""
+    thoughts = [f"{base_name}_thought_{idx:02d}.png" for idx in range(1, thought_count + 1)] if save_thoughts else []
+    return {"final": f"{base_name}.png", "thoughts": thoughts}
+
+
 def save_images(
     extracted: Dict[str, object], img_dir: Path, base_name: str, save_thoughts: bool = True
 ) -> Dict[str, List[str]]:
     ensure_directory(img_dir)
-    final_filename = f"{base_name}.png"
-    final_path = img_dir / final_filename
-    with open(final_path, "wb") as f:
+    names = image_filenames(base_name, len(extracted["thought_images"]), save_thoughts)
+    with open(img_dir / names["final"], "wb") as f:
         f.write(extracted["final_image"])
-
-    thought_filenames: List[str] = []
-    if save_thoughts:
-        for idx, img in enumerate(extracted["thought_images"], start=1):
-            thought_filename = f"{base_name}_thought_{idx:02d}.png"
-            thought_path = img_dir / thought_filename
-            with open(thought_path, "wb") as f:
-                f.write(img)
-            thought_filenames.append(thought_filename)
-
-    return {"final": final_filename, "thoughts": thought_filenames}
+    for thought_filename, img in zip(names["thoughts"], extracted["thought_images"]):
+        with open(img_dir / thought_filename, "wb") as f:
+            f.write(img)
+    return names
 
 
 def save_metadata(img_dir: Path, base_name: str, metadata: Dict[str, object]) -> Path:
@@ -39,6 +43,9 @@ def save_metadata(img_dir: Path, base_name: str, metadata: Dict[str, object]) ->
 
 
 def append_to_manifest(manifest_path: Path, metadata: Dict[str, object]) -> None:
+    if is_sqlite_manifest(manifest_path):
+        open_sqlite_manifest(manifest_path).append(metadata)
+        return
     manifest_path.parent.mkdir(parents=True, exist_ok=True)
     with open(manifest_path, "a", encoding="utf-8") as f:
         f.write(json.dumps(metadata, ensure_ascii=False) + "\n")
@@ -50,7 +57,240 @@ def load_manifest_indices(path: Path) -> set[int]:
     return _load(path)
 
 
-def load_manifest_by_index(path: Path) -> dict:
+def load_manifest_by_index(
+    path: Path, plan_name: str | None = None, profile: str | None = None, success_only: bool = False
+) -> dict:
     from src.data_manager import load_manifest_by_index as _load  # lazy import to avoid cycle
 
-    return _load(path)
+    return _load(path, plan_name=plan_name, profile=profile, success_only=success_only)
+
+
+LISTING_CACHE_VERSION = 1
+LISTING_RACY_SECONDS = 2.0
+
+
+class ImageListing:
+    """
+    Answers "does images/<axis_id>/<file> exist" from one os.scandir per axis directory instead of a
+    stat() per file. With `cache_path`, listings are persisted and reused while the directory mtime is
+    unchanged; listings taken within LISTING_RACY_SECONDS of the directory's mtime are not persisted,
+    since a same-tick change would not move the mtime.
+    """
+
+    def __init__(self, images_root: Path, cache_path: Path | None = None) -> None:
+        self.images_root = images_root
+        self.cache_path = cache_path
+        self._names: Dict[str, set | None] = {}
+        self._cached: Dict[str, dict] = {}
+        self._dirty = False
+        if cache_path is not None and cache_path.exists():
+            try:
+                data = json.loads(cache_path.read_text(encoding="utf-8"))
+            except Exception:
+                data = {}
+            if data.get("version") == LISTING_CACHE_VERSION:
+                self._cached = data.get("dirs") or {}
+
+    def _listing(self, axis_id: str) -> set | None:
+        if axis_id in self._names:
+            return self._names[axis_id]
+        dir_path = self.images_root / axis_id
+        try:
+            mtime_ns = dir_path.stat().st_mtime_ns
+        except OSError:
+            self._names[axis_id] = None
+            return None
+        cached = self._cached.get(axis_id)
+        if cached and cached.get("mtime_ns") == mtime_ns:
+            names = set(cached.get("names") or [])
+        else:
+            names = set()
+            with os.scandir(dir_path) as entries:
+                for entry in entries:
+                    # Path.exists follows symlinks, so a dangling link does not count.
+                    if entry.is_symlink() and not os.path.exists(entry.path):
+                        continue
+                    names.add(entry.name)
+            self._cached.pop(axis_id, None)
+            if time.time() - mtime_ns / 1e9 > LISTING_RACY_SECONDS:
+                self._cached[axis_id] = {"mtime_ns": mtime_ns, "names": sorted(names)}
+            self._dirty = True
+        self._names[axis_id] = names
+        return names
+
+    def exists(self, axis_id: str, filename: str) -> bool:
+        if os.sep in filename or (os.altsep and os.altsep in filename) or filename in (".", ".."):
+            return (self.images_root / axis_id / filename).exists()
+        names = self._listing(axis_id)
+        return names is not None and filename in names
+
+    def save(self) -> None:
+        if self.cache_path is None or not self._dirty:
+            return
+        payload = {"version": LISTING_CACHE_VERSION, "dirs": self._cached}
+        tmp_path = self.cache_path.with_name(self.cache_path.name + ".tmp")
+        tmp_path.write_text(json.dumps(payload, ensure_ascii=False, separators=(",", ":")), encoding="utf-8")
+        os.replace(tmp_path, self.cache_path)
+        self._dirty = False
+
+
+class ManifestWriter:
+    """
+    Append-only manifest handle kept open for a whole run.
+    Lines are flushed once `flush_bytes` are buffered or `flush_interval` seconds have passed, and on close.
+    A partial last line left by a crash is terminated first so new records never merge into it.
+    For a SQLite manifest, flushing is a commit of the rows inserted since the last one,
+    and closing also closes the shared connection so the next open_sqlite_manifest reconnects.
+    """
+
+    def __init__(self, manifest_path: Path, flush_bytes: int = 64 * 1024, flush_interval: float = 2.0) -> None:
+        self.manifest_path = manifest_path
+        self.flush_bytes = flush_bytes
+        self.flush_interval = flush_interval
+        self._pending = 0
+        self._last_flush = time.monotonic()
+        self._db = open_sqlite_manifest(manifest_path) if is_sqlite_manifest(manifest_path) else None
+        if self._db is not None:
+            return
+        manifest_path.parent.mkdir(parents=True, exist_ok=True)
+        needs_newline = False
+        if manifest_path.exists() and manifest_path.stat().st_size > 0:
+            with open(manifest_path, "rb") as f:
+                f.seek(-1, os.SEEK_END)
+                needs_newline = f.read(1) != b"\n"
+        self._file = open(manifest_path, "a", encoding="utf-8")
+        if needs_newline:
+            self._file.write("\n")
+
+    def append(self, metadata: Dict[str, object]) -> None:
+        line = json.dumps(metadata, ensure_ascii=False) + "\n"
+        if self._db is not None:
+            self._db.append(metadata, commit=False)
+        else:
+            self._file.write(line)
+        self._pending += len(line)
+        if self._pending >= self.flush_bytes or time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self) -> None:
+        if self._pending:
+            if self._db is not None:
+                self._db.commit()
+            else:
+                self._file.flush()
+            self._pending = 0
+        self._last_flush = time.monotonic()
+
+    def close(self) -> None:
+        if self._db is not None:
+            if not self._db.closed:
+                self.flush()
+                close_sqlite_manifest(self.manifest_path)
+            return
+        if self._file.closed:
+            return
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+        # Fold this run's lines into the on-disk index while they are still in the page cache.
+        ManifestIndex.open(self.manifest_path)
+
+    def __enter__(self) -> "ManifestWriter":
+        return self
+
+    def __exit__(self, *exc: object) -> None:
+        self.close()
+
+
+_STOP = object()
+MIN_IDLE_WAIT = 0.05
+
+
+class WriterStage:
+    """
+    Background thread that persists images, meta JSON and manifest lines in that order, fed by a bounded queue.
+    A manifest line is only written after its files are on disk, so a crash loses at most unflushed
+    lines (those items are simply regenerated on resume) and never records an image that does not exist.
+    on_error(metadata, exc) may return replacement metadata (e.g. an error record) when saving images fails;
+    on_written(metadata) is called from the writer thread with the record actually appended to the manifest.
+    """
+
+    def __init__(
+        self,
+        manifest_path: Path,
+        queue_size: int = 32,
+        flush_bytes: int = 64 * 1024,
+        flush_interval: float = 2.0,
+        on_error: Callable[[Dict[str, Any], Exception], Dict[str, Any]] | None = None,
+        on_written: Callable[[Dict[str, Any]], None] | None = None,
+    ) -> None:
+        self.manifest = ManifestWriter(manifest_path, flush_bytes=flush_bytes, flush_interval=flush_interval)
+        self.on_error = on_error
+        self.on_written = on_written
+        # flush_interval 0 still flushes every line; the idle wait just must not spin.
+        self._idle_wait = max(float(flush_interval), MIN_IDLE_WAIT)
+        self._queue: queue.Queue = queue.Queue(maxsize=max(queue_size, 1))
+        self._error: BaseException | None = None
+        self._thread = threading.Thread(target=self._run, name="writer", daemon=True)
+        self._thread.start()
+
+    def submit(
+        self,
+        meta_dir: Path,
+        base_name: str,
+        metadata: Dict[str, Any],
+        img_dir: Path | None = None,
+        extracted: Dict[str, object] | None = None,
+        save_thoughts: bool = True,
+    ) -> None:
+        self._raise_if_failed()
+        self._queue.put((meta_dir, base_name, metadata, img_dir, extracted, save_thoughts))
+
+    def _run(self) -> None:
+        while True:
+            try:
+                job = self._queue.get(timeout=self._idle_wait)
+            except queue.Empty:
+                self.manifest.flush()
+                continue
+            if job is _STOP:
+                return
+            if self._error is not None:
+                continue
+            try:
+                self._write(*job)
+            except BaseException as exc:  # noqa: BLE001
+                self._error = exc
+
+    def _write(
+        self,
+        meta_dir: Path,
+        base_name: str,
+        metadata: Dict[str, Any],
+        img_dir: Path | None,
+        extracted: Dict[str, object] | None,
+        save_thoughts: bool,
+    ) -> None:
+        if img_dir is not None and extracted is not None:
+            try:
+                save_images(extracted, img_dir, base_name, save_thoughts=save_thoughts)
+            except Exception as exc:  # noqa: BLE001
+                if self.on_error is None:
+                    raise
+                metadata = self.on_error(metadata, exc)
+        save_metadata(meta_dir, base_name, metadata)
+        self.manifest.append(metadata)
+        if self.on_written is not None:
+            self.on_written(metadata)
+
+    def _raise_if_failed(self) -> None:
+        if self._error is not None:
+            raise RuntimeError(f"writer stage failed: {self._error}") from self._error
+
+    def close(self) -> None:
+        """Drain queued writes, flush and close the manifest; re-raise a writer failure if one happened."""
+        if self._thread.is_alive():
+            self._queue.put(_STOP)
+            self._thread.join()
+        self.manifest.close()
+        self._raise_if_failed()
@@ -0,0 +1,239 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import sys
+from typing import Any, Dict, Iterable, Iterator, List
+
+from src.plan_item import ITEM_FIELDS, PlanItem, PlanItemFactory, render_final_prompt
+
+COMPACT_PLAN_VERSION = 1
+PLAN_FORMATS = ("jsonl", "compact")
+SHARED_FIELDS = ("profile", "seed_used", "generation_type", "excluded_plans")
+NO_TAG = -1
+
+
+def template_hash(axis_templates: Dict[str, dict], global_suffix: str) -> str:
+    """Hash of every axis template + the global suffix (what final_prompt is rendered from)."""
+    payload = json.dumps(
+        [global_suffix, sorted((ax, tmpl.get("template", "")) for ax, tmpl in axis_templates.items())],
+        ensure_ascii=False,
+    )
+    return hashlib.blake2b(payload.encode("utf-8"), digest_size=8).hexdigest()
+
+
+def _dumps(value: Any) -> str:
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"))
+
+
+class CompactPlanEncoder:
+    """
+    Writes plan items in the compact format. Line 1 is the header (shared fields, global suffix, template
+    hash); axes, words and tags are defined by {"a": [...]}, {"w": ...}, {"t": ...} lines right before
+    their first use, so a plan can be written and appended as a stream. Item rows are
+    [index, axis_no, [word ids], [tag ids]] with an optional 5th element holding fields that differ
+    from what the header/template would produce, which keeps the conversion lossless.
+    """
+
+    def __init__(self, axis_templates: Dict[str, dict], global_suffix: str) -> None:
+        self.axis_templates = axis_templates
+        self.global_suffix = global_suffix
+        self.header: Dict[str, Any] | None = None
+        self.axis_ids: Dict[str, int] = {}
+        self.axis_defs: List[tuple] = []
+        self.word_ids: Dict[str, int] = {}
+        self.tag_ids: Dict[str, int] = {}
+
+    @classmethod
+    def resume(cls, decoder: "CompactPlanDecoder", axis_templates: Dict[str, dict]) -> "CompactPlanEncoder":
+        """Continue the id tables of an existing compact plan (for append)."""
+        header = decoder.header or {}
+        encoder = cls(axis_templates, header.get("global_suffix", ""))
+        encoder.header = header
+        for axis_id, template, placeholders in decoder.axes:
+            encoder.axis_ids[axis_id] = len(encoder.axis_defs)
+            encoder.axis_defs.append((axis_id, template, placeholders))
+        encoder.word_ids = {word: i for i, word in enumerate(decoder.words)}
+        encoder.tag_ids = {tag: i for i, tag in enumerate(decoder.tags)}
+        return encoder
+
+    def header_line(self, first_item: Dict[str, Any]) -> str:
+        self.header = {"compact_plan": COMPACT_PLAN_VERSION}
+        for field in SHARED_FIELDS:
+            self.header[field] = first_item.get(field)
+        self.header["global_suffix"] = self.global_suffix
+        self.header["template_hash"] = template_hash(self.axis_templates, self.global_suffix)
+        return _dumps(self.header)
+
+    def _axis(self, axis_id: str, lines: List[str]) -> int:
+        axis_no = self.axis_ids.get(axis_id)
+        if axis_no is None:
+            tmpl = self.axis_templates.get(axis_id) or {}
+            definition = (axis_id, tmpl.get("template"), list(dict.fromkeys(tmpl.get("placeholders") or [])))
+            axis_no = self.axis_ids[axis_id] = len(self.axis_defs)
+            self.axis_defs.append(definition)
+            lines.append(_dumps({"a": list(definition)}))
+        return axis_no
+
+    def _id(self, table: Dict[str, int], value: str, kind: str, lines: List[str]) -> int:
+        value_id = table.get(value)
+        if value_id is None:
+            value_id = table[value] = len(table)
+            lines.append(_dumps({kind: value}))
+        return value_id
+
+    def encode(self, item: Dict[str, Any]) -> List[str]:
+        """Definition lines (if any) followed by the item row."""
+        lines: List[str] = []
+        axis_id = item.get("axis_id", "")
+        axis_no = self._axis(axis_id, lines)
+        _, template, placeholders = self.axis_defs[axis_no]
+        slots = item.get("slots") or {}
+        slot_tags = item.get("slot_tags") or {}
+        extra: Dict[str, Any] = {}
+        plain = all(isinstance(v, str) for v in slots.values()) and all(isinstance(v, str) for v in slot_tags.values())
+        if plain and list(slots) == placeholders and set(slot_tags) <= set(slots):
+            word_ids = [self._id(self.word_ids, slots[ph], "w", lines) for ph in placeholders]
+            tag_ids = [self._id(self.tag_ids, slot_tags[ph], "t", lines) if ph in slot_tags else NO_TAG for ph in placeholders]
+            if list(slot_tags) != [ph for ph in placeholders if ph in slot_tags]:
+                extra["slot_tags"] = item.get("slot_tags")
+        else:
+            word_ids, tag_ids = [], []
+            extra["slots"] = slots
+            extra["slot_tags"] = item.get("slot_tags")
+        try:
+            rendered = render_final_prompt(template, slots, self.global_suffix) if template is not None else None
+        except (KeyError, IndexError, ValueError):
+            rendered = None
+        if rendered is None or item.get("final_prompt") != rendered:
+            extra["final_prompt"] = item.get("final_prompt")
+        if item.get("slot_tags") is not None and not item.get("slot_tags"):
+            extra["slot_tags"] = item.get("slot_tags")
+        for field in SHARED_FIELDS:
+            if item.get(field) != self.header.get(field) or field not in item:
+                extra[field] = item.get(field)
+        for key, value in item.items():
+            if key not in ITEM_FIELDS:
+                extra[key] = value
+        missing = [field for field in ITEM_FIELDS if field not in item]
+        if missing:
+            extra["_missing"] = missing
+        row: List[Any] = [item.get("index"), axis_no, word_ids]
+        if any(tag_id != NO_TAG for tag_id in tag_ids) or extra:
+            row.append(tag_ids)
+        if extra:
+            row.append(extra)
+        lines.append(_dumps(row))
+        return lines
+
+
+class CompactPlanDecoder:
+    """
+    Turns parsed plan lines back into plan items. Plain JSONL items (no compact header on line 1) pass
+    through unchanged, so every reader can feed records here without checking the format first.
+    With as_items, items come out as PlanItem (compact rows keep final_prompt unrendered until read).
+    """
+
+    def __init__(self, as_items: bool = False) -> None:
+        self.header: Dict[str, Any] | None = None
+        self.axes: List[tuple] = []
+        self.words: List[str] = []
+        self.tags: List[str] = []
+        self.factory = PlanItemFactory() if as_items else None
+
+    @property
+    def compact(self) -> bool:
+        return self.header is not None
+
+    def feed(self, record: Any) -> Dict[str, Any] | None:
+        if isinstance(record, list):
+            return self.decode_row(record) if self.header is not None else None
+        if not isinstance(record, dict):
+            return None
+        if "compact_plan" in record:
+            if record["compact_plan"] != COMPACT_PLAN_VERSION:
+                raise ValueError(f"Unsupported compact plan version: {record['compact_plan']}")
+            self.header = record
+            return None
+        if self.header is None:
+            return self.factory.from_dict(record) if self.factory is not None else record
+        if "w" in record:
+            self.words.append(sys.intern(record["w"]))
+        elif "t" in record:
+            self.tags.append(sys.intern(record["t"]))
+        elif "a" in record:
+            axis_id, template, placeholders = record["a"]
+            if self.factory is not None:
+                axis_id, placeholders = sys.intern(axis_id), self.factory.keys_tuple(tuple(placeholders))
+            self.axes.append((axis_id, template, placeholders))
+        return None
+
+    def decode_row(self, row: List[Any]) -> Dict[str, Any] | PlanItem:
+        header = self.header
+        if self.factory is not None and len(row) < 5:
+            axis_id, template, placeholders = self.axes[row[1]]
+            words, tags = self.words, self.tags
+            tag_values = None
+            if len(row) > 3:
+                tag_values = tuple(tags[tag_id] if tag_id != NO_TAG else None for tag_id in row[3])
+                if all(tag is None for tag in tag_values):
+                    tag_values = None
+            return PlanItem(
+                row[0],
+                header.get("profile"),
+                axis_id,
+                placeholders,
+                tuple(words[word_id] for word_id in row[2]),
+                tag_values,
+                header.get("seed_used"),
+                header.get("generation_type"),
+                header.get("excluded_plans"),
+                template=template,
+                suffix=header.get("global_suffix", ""),
+            )
+        axis_id, template, placeholders = self.axes[row[1]]
+        extra: Dict[str, Any] = row[4] if len(row) > 4 else {}
+        words = self.words
+        if "slots" in extra:
+            slots = extra["slots"]
+        else:
+            slots = {ph: words[word_id] for ph, word_id in zip(placeholders, row[2])}
+        if "slot_tags" in extra:
+            slot_tags = extra["slot_tags"]
+        elif len(row) > 3:
+            slot_tags = {ph: self.tags[tag_id] for ph, tag_id in zip(placeholders, row[3]) if tag_id != NO_TAG} or None
+        else:
+            slot_tags = None
+        if "final_prompt" in extra:
+            final_prompt = extra["final_prompt"]
+        else:
+            final_prompt = render_final_prompt(template, slots, header.get("global_suffix", ""))
+        item = {
+            "index": row[0],
+            "profile": extra.get("profile", header.get("profile")),
+            "axis_id": axis_id,
+            "slots": slots,
+            "final_prompt": final_prompt,
+            "seed_used": extra.get("seed_used", header.get("seed_used")),
+            "generation_type": extra.get("generation_type", header.get("generation_type")),
+            "excluded_plans": extra.get("excluded_plans", header.get("excluded_plans")),
+            "slot_tags": slot_tags,
+        }
+        if extra:
+            for key, value in extra.items():
+                if key not in ITEM_FIELDS and key != "_missing":
+                    item[key] = value
+            for field in extra.get("_missing", ()):
+                item.pop(field, None)
+        return self.factory.from_dict(item) if self.factory is not None else item
+
+
+def encode_compact_plan(
+    items: Iterable[Dict[str, Any]], axis_templates: Dict[str, dict], global_suffix: str
+) -> Iterator[str]:
+    """Lines of a new compact plan (header first)."""
+    encoder = CompactPlanEncoder(axis_templates, global_suffix)
+    for item in items:
+        if encoder.header is None:
+            yield encoder.header_line(item)
+        yield from encoder.encode(item)
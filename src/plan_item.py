@@ -0,0 +1,216 @@
+from __future__ import annotations
+
+import sys
+from typing import Any, Dict, Iterator, List, Tuple
+
+ITEM_FIELDS = (
+    "index",
+    "profile",
+    "axis_id",
+    "slots",
+    "final_prompt",
+    "seed_used",
+    "generation_type",
+    "excluded_plans",
+    "slot_tags",
+)
+_ABSENT = object()
+
+
+def render_final_prompt(template: str, slots: Dict[str, str], global_suffix: str) -> str:
+    prompt_body = template.format(context="", h1="", h2="", **slots)
+    return f"{prompt_body} {global_suffix}".strip()
+
+
+class PlanItem:
+    """
+    One plan entry without a per-item dict: slot names and values are tuples of interned strings (the
+    name tuple is shared by every item of an axis), and a compact plan's final_prompt is rendered from
+    the stored template on access. Reads like the dict it replaces (item["index"], get, setdefault, in);
+    to_dict() gives the JSON form back for writing.
+    """
+
+    __slots__ = (
+        "index",
+        "profile",
+        "axis_id",
+        "slot_keys",
+        "slot_values",
+        "tag_values",
+        "seed_used",
+        "generation_type",
+        "excluded_plans",
+        "prompt",
+        "template",
+        "suffix",
+        "extra",
+    )
+
+    def __init__(
+        self,
+        index: int,
+        profile: Any,
+        axis_id: Any,
+        slot_keys: Tuple[str, ...],
+        slot_values: Tuple[str, ...],
+        tag_values: Tuple[str | None, ...] | None,
+        seed_used: Any,
+        generation_type: Any,
+        excluded_plans: Any,
+        prompt: str | None = None,
+        template: str | None = None,
+        suffix: str = "",
+        extra: Dict[str, Any] | None = None,
+    ) -> None:
+        self.index = index
+        self.profile = profile
+        self.axis_id = axis_id
+        self.slot_keys = slot_keys
+        self.slot_values = slot_values
+        self.tag_values = tag_values
+        self.seed_used = seed_used
+        self.generation_type = generation_type
+        self.excluded_plans = excluded_plans
+        self.prompt = prompt
+        self.template = template
+        self.suffix = suffix
+        self.extra = extra
+
+    @property
+    def slots(self) -> Dict[str, str]:
+        return dict(zip(self.slot_keys, self.slot_values))
+
+    @property
+    def slot_tags(self) -> Dict[str, str] | None:
+        if self.tag_values is None:
+            return None
+        return {key: tag for key, tag in zip(self.slot_keys, self.tag_values) if tag is not None}
+
+    @property
+    def final_prompt(self) -> str | None:
+        if self.prompt is None and self.template is not None:
+            return render_final_prompt(self.template, self.slots, self.suffix)
+        return self.prompt
+
+    def _field(self, key: str) -> Any:
+        if self.extra is not None and key in self.extra:
+            return self.extra[key]
+        if key in ITEM_FIELDS:
+            return getattr(self, key)
+        return _ABSENT
+
+    def __getitem__(self, key: str) -> Any:
+        value = self._field(key)
+        if value is _ABSENT:
+            raise KeyError(key)
+        return value
+
+    def __contains__(self, key: str) -> bool:
+        return self._field(key) is not _ABSENT
+
+    def get(self, key: str, default: Any = None) -> Any:
+        value = self._field(key)
+        return default if value is _ABSENT else value
+
+    def setdefault(self, key: str, default: Any = None) -> Any:
+        value = self._field(key)
+        if value is not _ABSENT:
+            return value
+        if key in ("profile", "seed_used", "generation_type", "excluded_plans", "index", "axis_id"):
+            setattr(self, key, default)
+            if self.extra is not None:
+                self.extra.pop(key, None)
+        else:
+            if self.extra is None:
+                self.extra = {}
+            self.extra[key] = default
+        return default
+
+    def keys(self) -> Iterator[str]:
+        return iter(self.to_dict())
+
+    def to_dict(self) -> Dict[str, Any]:
+        data: Dict[str, Any] = {}
+        for key in ITEM_FIELDS:
+            value = self._field(key)
+            if value is not _ABSENT:
+                data[key] = value
+        if self.extra is not None:
+            for key, value in self.extra.items():
+                if key not in ITEM_FIELDS and value is not _ABSENT:
+                    data[key] = value
+        return data
+
+    def __repr__(self) -> str:
+        return f"PlanItem({self.to_dict()!r})"
+
+
+class PlanItemFactory:
+    """
+    Builds PlanItems while sharing repeated values: axis ids, slot names, words and tags go through
+    sys.intern, each axis' slot-name tuple is one shared object, and equal excluded_plans lists are reused.
+    """
+
+    def __init__(self) -> None:
+        self.key_tuples: Dict[Tuple[str, ...], Tuple[str, ...]] = {}
+        self.excluded: List[Any] = []
+
+    def keys_tuple(self, keys: Tuple[str, ...]) -> Tuple[str, ...]:
+        shared = self.key_tuples.get(keys)
+        if shared is None:
+            shared = self.key_tuples[keys] = tuple(sys.intern(key) for key in keys)
+        return shared
+
+    def shared_list(self, value: Any) -> Any:
+        if not isinstance(value, list):
+            return value
+        for known in self.excluded:
+            if known == value:
+                return known
+        if len(self.excluded) < 8:
+            self.excluded.append(value)
+        return value
+
+    def from_dict(self, data: Dict[str, Any]) -> PlanItem:
+        extra: Dict[str, Any] = {}
+        for key in ITEM_FIELDS:
+            if key not in data:
+                extra[key] = _ABSENT
+        slots = data.get("slots")
+        slot_tags = data.get("slot_tags")
+        keys: Tuple[str, ...] = ()
+        values: Tuple[str, ...] = ()
+        tags: Tuple[str | None, ...] | None = None
+        if isinstance(slots, dict) and all(isinstance(v, str) for v in slots.values()):
+            keys = self.keys_tuple(tuple(slots))
+            values = tuple(sys.intern(v) for v in slots.values())
+            if isinstance(slot_tags, dict):
+                in_order = list(slot_tags) == [key for key in keys if key in slot_tags]
+                if in_order and all(isinstance(t, str) for t in slot_tags.values()):
+                    tags = tuple(sys.intern(slot_tags[key]) if key in slot_tags else None for key in keys)
+                else:
+                    extra["slot_tags"] = slot_tags
+            elif slot_tags is not None:
+                extra["slot_tags"] = slot_tags
+        elif "slots" in data:
+            extra["slots"] = slots
+            extra["slot_tags"] = slot_tags
+        for key, value in data.items():
+            if key not in ITEM_FIELDS:
+                extra[key] = value
+        axis_id = data.get("axis_id")
+        profile = data.get("profile")
+        generation_type = data.get("generation_type")
+        return PlanItem(
+            data.get("index"),
+            sys.intern(profile) if isinstance(profile, str) else profile,
+            sys.intern(axis_id) if isinstance(axis_id, str) else axis_id,
+            keys,
+            values,
+            tags,
+            data.get("seed_used"),
+            sys.intern(generation_type) if isinstance(generation_type, str) else generation_type,
+            self.shared_list(data.get("excluded_plans")),
+            prompt=data.get("final_prompt"),
+            extra=extra or None,
+        )
@@ -0,0 +1,149 @@
+from __future__ import annotations
+
+import hashlib
+import heapq
+import json
+import os
+from array import array
+from bisect import bisect_left
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List
+
+from src.data_manager import dedupe_key, iter_plan
+
+KEY_INDEX_VERSION = 1
+
+
+def dedupe_key_hash(key: str) -> int:
+    """64-bit blake2b of a dedupe_key string."""
+    return int.from_bytes(hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+def plan_key_index_path(plan_path: Path) -> Path:
+    return plan_path.with_name(plan_path.name + ".keys")
+
+
+def _sorted_unique(values: Iterable[int]) -> array:
+    out = array("Q")
+    last = None
+    for value in values:
+        if value != last:
+            out.append(value)
+            last = value
+    return out
+
+
+class KeyIndex:
+    """
+    Hashed dedupe keys, one sorted array('Q') per axis (8 bytes per key). Membership accepts the
+    dedupe_key string or its hash, so it can stand in for the exclude_keys set in create_slot_plan.
+    Per-axis counts are only an upper bound for the plan capacity check (keys whose words left the
+    vocab are still counted). `sources` lists the plan files the hashes came from, for iter_keys.
+    """
+
+    def __init__(self, axes: Dict[str, array] | None = None, sources: List[Path] | None = None) -> None:
+        self.axes: Dict[str, array] = axes or {}
+        self.sources: List[Path] = list(sources or [])
+
+    @classmethod
+    def from_plan(cls, plan_path: Path) -> "KeyIndex":
+        hashes: Dict[str, List[int]] = {}
+        for data in iter_plan(plan_path):
+            axis_id = data.get("axis_id", "")
+            hashes.setdefault(axis_id, []).append(dedupe_key_hash(dedupe_key(axis_id, data.get("slots") or {})))
+        return cls({axis_id: _sorted_unique(sorted(values)) for axis_id, values in hashes.items()}, [plan_path])
+
+    @classmethod
+    def for_plan(cls, plan_path: Path) -> "KeyIndex":
+        """Load <plan>.keys when it matches the plan's size/mtime, otherwise rebuild it and save."""
+        stat = plan_path.stat()
+        index_path = plan_key_index_path(plan_path)
+        loaded = cls.load(index_path, stat.st_size, stat.st_mtime_ns)
+        if loaded is not None:
+            loaded.sources = [plan_path]
+            return loaded
+        index = cls.from_plan(plan_path)
+        try:
+            index.save(index_path, stat.st_size, stat.st_mtime_ns)
+        except OSError as exc:
+            print(f"[warn] could not write key index {index_path}: {exc}")
+        return index
+
+    @classmethod
+    def load(cls, index_path: Path, size: int, mtime_ns: int) -> "KeyIndex" | None:
+        if not index_path.exists():
+            return None
+        try:
+            with open(index_path, "rb") as f:
+                header = json.loads(f.readline())
+                if (
+                    header.get("version") != KEY_INDEX_VERSION
+                    or header.get("size") != size
+                    or header.get("mtime_ns") != mtime_ns
+                ):
+                    return None
+                axes: Dict[str, array] = {}
+                for axis_id, count in header.get("axes", {}).items():
+                    values = array("Q")
+                    values.fromfile(f, count)
+                    axes[axis_id] = values
+        except Exception:
+            return None
+        return cls(axes)
+
+    def save(self, index_path: Path, size: int, mtime_ns: int) -> None:
+        header = {
+            "version": KEY_INDEX_VERSION,
+            "size": size,
+            "mtime_ns": mtime_ns,
+            "axes": {axis_id: len(values) for axis_id, values in self.axes.items()},
+        }
+        tmp_path = index_path.with_name(index_path.name + ".tmp")
+        with open(tmp_path, "wb") as f:
+            f.write((json.dumps(header, ensure_ascii=False) + "\n").encode("utf-8"))
+            for values in self.axes.values():
+                values.tofile(f)
+        os.replace(tmp_path, index_path)
+
+    @classmethod
+    def union(cls, indexes: Iterable["KeyIndex"]) -> "KeyIndex":
+        by_axis: Dict[str, List[array]] = {}
+        sources: List[Path] = []
+        for index in indexes:
+            sources.extend(index.sources)
+            for axis_id, values in index.axes.items():
+                by_axis.setdefault(axis_id, []).append(values)
+        return cls({axis_id: _sorted_unique(heapq.merge(*arrays)) for axis_id, arrays in by_axis.items()}, sources)
+
+    @staticmethod
+    def _has(values: array, hashed: int) -> bool:
+        pos = bisect_left(values, hashed)
+        return pos < len(values) and values[pos] == hashed
+
+    def __contains__(self, key) -> bool:
+        if isinstance(key, str):
+            values = self.axes.get(key.split("|", 1)[0])
+            return values is not None and self._has(values, dedupe_key_hash(key))
+        return any(self._has(values, key) for values in self.axes.values())
+
+    def __len__(self) -> int:
+        return sum(len(values) for values in self.axes.values())
+
+    def axis_count(self, axis_id: str) -> int:
+        return len(self.axes.get(axis_id, ()))
+
+    def hashes(self) -> Iterator[int]:
+        for values in self.axes.values():
+            yield from values
+
+    def iter_keys(self) -> Iterator[str]:
+        """The dedupe_key strings behind the hashes, re-read from the source plans (may repeat)."""
+        for path in self.sources:
+            for data in iter_plan(path):
+                axis_id = data.get("axis_id", "")
+                yield dedupe_key(axis_id, data.get("slots") or {})
+
+
+def load_exclusion_index(plan_paths: Iterable[Path]) -> KeyIndex:
+    """Union of the per-plan key indexes; only plans changed since their .keys file was written are parsed."""
+    return KeyIndex.union(KeyIndex.for_plan(path) for path in plan_paths)
@@ -0,0 +1,382 @@
+from __future__ import annotations
+
+from typing import Container, Dict, Iterable, List, Tuple
+
+from src.data_manager import (
+    EXHAUSTIVE_ENUMERATE_LIMIT,
+    AxisCombinations,
+    VocabPool,
+    balanced_quotas,
+    check_plan_capacity,
+    compile_vocab_pools,
+    count_excluded,
+)
+from src.plan_compact import render_final_prompt
+
+HASH_MULTIPLIER = 0x9E3779B97F4A7C15
+MAX_STALLED_ROUNDS = 50
+ENUMERATE_AFTER_STALLED = 3
+MIN_BATCH = 1024
+MAX_BATCH = 1 << 20
+
+
+def require_numpy():
+    try:
+        import numpy as np
+    except ImportError as exc:
+        raise RuntimeError("plan_engine 'numpy' requires numpy (pip install numpy)") from exc
+    return np
+
+
+class CategoryTable:
+    """
+    One vocab category as numpy arrays: every (tag, word) entry maps to a word id, so draws are
+    entry indices and dedupe works on word ids (the same word under two tags is the same slot value).
+    """
+
+    def __init__(self, np, cat: str, pool: VocabPool) -> None:
+        self.np = np
+        self.mode = pool.mode
+        self.words: List[str] = []
+        word_ids: Dict[str, int] = {}
+        tag_names = [None] if self.mode == "off" else list(pool.tag_list)
+        tag_lists = [pool.words] if self.mode == "off" else [pool.tag_words[t] for t in pool.tag_list]
+        entries: List[int] = []
+        offsets: List[int] = []
+        for tag, words in zip(tag_names, tag_lists):
+            if not words:
+                raise ValueError(f"Vocab tag {tag} in category {cat} has no words")
+            offsets.append(len(entries))
+            for word in words:
+                if word not in word_ids:
+                    word_ids[word] = len(self.words)
+                    self.words.append(word)
+                entries.append(word_ids[word])
+        self.word_ids = word_ids
+        self.tag_names = tag_names
+        self.entry_word = np.asarray(entries, dtype=np.int64)
+        self.tag_offsets = np.asarray(offsets, dtype=np.int64)
+        self.tag_sizes = np.asarray([len(words) for words in tag_lists], dtype=np.int64)
+        self.tag_probs = None
+        if self.mode == "weighted":
+            raw = np.asarray([max(pool.tag_weights[t], 0.0) for t in pool.tag_list], dtype=np.float64)
+            self.tag_probs = raw / raw.sum() if raw.sum() > 0 else None
+        self.cursor = 0
+        reachable = pool.word_weights()
+        tag_index = {tag: pos for pos, tag in enumerate(tag_names)}
+        self.reachable_ids = np.asarray([word_ids[w] for w in reachable], dtype=np.int64)
+        self.reachable_probs = np.asarray([prob for prob, _ in reachable.values()], dtype=np.float64)
+        self.reachable_tags = np.asarray([tag_index[tag] for _, tag in reachable.values()], dtype=np.int64)
+
+    def draw(self, rng, n: int):
+        """Returns (word_ids, tag_indices) for n draws; uniform mode continues its round-robin cursor."""
+        np = self.np
+        if self.mode == "uniform":
+            tags = (self.cursor + np.arange(n, dtype=np.int64)) % len(self.tag_names)
+            self.cursor += n
+        elif len(self.tag_names) == 1:
+            tags = np.zeros(n, dtype=np.int64)
+        else:
+            tags = rng.choice(len(self.tag_names), size=n, p=self.tag_probs)
+        within = np.floor(rng.random(n) * self.tag_sizes[tags]).astype(np.int64)
+        return self.entry_word[self.tag_offsets[tags] + within], tags
+
+
+class AxisDraws:
+    """Accepted rows for one axis: word-id columns, tag columns and the hashes already used."""
+
+    def __init__(self, np, axis_no: int, axis_id: str, placeholders: List[str], tables: Dict[str, CategoryTable]):
+        self.np = np
+        self.axis_no = axis_no
+        self.axis_id = axis_id
+        self.placeholders = placeholders
+        self.tables = [tables[ph] for ph in placeholders]
+        self.word_cols: List[list] = [[] for _ in placeholders]
+        self.tag_cols: List[list] = [[] for _ in placeholders]
+        self.seen = np.empty(0, dtype=np.uint64)
+        self.count = 0
+
+    def hash_rows(self, cols) -> "object":
+        np = self.np
+        h = np.full(len(cols[0]) if cols else 0, (self.axis_no + 1) * HASH_MULTIPLIER % (1 << 64), dtype=np.uint64)
+        mult = np.uint64(HASH_MULTIPLIER)
+        for col in cols:
+            h ^= col.astype(np.uint64)
+            h *= mult
+            h ^= h >> np.uint64(31)
+        return h
+
+    def exclude(self, keys: Iterable[str]) -> None:
+        """
+        Mark dedupe_key strings of this axis as used by hashing them into word-id space once, so draws
+        filter them with the same np.isin as `seen`; keys with unknown words cannot be drawn anyway.
+        """
+        np = self.np
+        rows: List[List[int]] = []
+        for key in keys:
+            parts = key.split("|")
+            if parts[0] != self.axis_id or len(parts) != len(self.placeholders) + 1:
+                continue
+            values = dict(part.split("=", 1) for part in parts[1:] if "=" in part)
+            ids = [table.word_ids.get(values.get(ph, "")) for ph, table in zip(self.placeholders, self.tables)]
+            if None not in ids:
+                rows.append(ids)
+        if rows:
+            cols = [np.asarray(col, dtype=np.int64) for col in zip(*rows)]
+            self.seen = np.union1d(self.seen, self.hash_rows(cols))
+
+    def draw(self, rng, n: int, dedupe: bool):
+        """Draw n candidate rows; returns (word cols, tag cols, hashes, keep mask) with in-batch first-wins dedupe."""
+        np = self.np
+        word_cols, tag_cols = [], []
+        for table in self.tables:
+            words, tags = table.draw(rng, n)
+            word_cols.append(words)
+            tag_cols.append(tags)
+        hashes = self.hash_rows(word_cols)
+        keep = ~np.isin(hashes, self.seen)
+        if dedupe:
+            _, first = np.unique(hashes, return_index=True)
+            unique_mask = np.zeros(n, dtype=bool)
+            unique_mask[first] = True
+            keep &= unique_mask
+        return word_cols, tag_cols, hashes, keep
+
+    def enumerate_remaining(self, rng):
+        """
+        Every unused combination in Efraimidis-Spirakis weighted random order, as (word cols, tag cols,
+        hashes); None when the product is too large to materialize.
+        """
+        np = self.np
+        shape = tuple(len(table.reachable_ids) for table in self.tables)
+        if int(np.prod(shape, dtype=np.float64)) > EXHAUSTIVE_ENUMERATE_LIMIT:
+            return None
+        digits = np.indices(shape).reshape(len(shape), -1)
+        word_cols = [table.reachable_ids[d] for table, d in zip(self.tables, digits)]
+        tag_cols = [table.reachable_tags[d] for table, d in zip(self.tables, digits)]
+        weight = np.ones(digits.shape[1], dtype=np.float64)
+        for table, d in zip(self.tables, digits):
+            weight *= table.reachable_probs[d]
+        hashes = self.hash_rows(word_cols)
+        rows = np.flatnonzero(~np.isin(hashes, self.seen))
+        score = np.log1p(-rng.random(len(rows))) / weight[rows]
+        rows = rows[np.argsort(-score, kind="stable")]
+        return [col[rows] for col in word_cols], [col[rows] for col in tag_cols], hashes[rows]
+
+    def accept(self, word_cols, tag_cols, hashes, rows, dedupe: bool) -> None:
+        if dedupe:
+            self.seen = self.np.union1d(self.seen, hashes[rows])
+        for pos in range(len(self.placeholders)):
+            self.word_cols[pos].append(word_cols[pos][rows])
+            self.tag_cols[pos].append(tag_cols[pos][rows])
+        self.count += len(rows)
+
+    def columns(self) -> Tuple[list, list]:
+        np = self.np
+        words = [np.concatenate(chunks) if chunks else np.empty(0, dtype=np.int64) for chunks in self.word_cols]
+        tags = [np.concatenate(chunks) if chunks else np.empty(0, dtype=np.int64) for chunks in self.tag_cols]
+        return words, tags
+
+
+def create_slot_plan_numpy(
+    axis_templates: Dict[str, dict],
+    vocab: Dict[str, List[str]],
+    axis_ids: List[str],
+    target_count: int,
+    global_suffix: str,
+    axis_weights: Dict[str, float] | None,
+    axis_distribution: str | None,
+    dedupe_mode: str,
+    seed: int | None,
+    profile: str,
+    exclude_keys: Container[str] | None = None,
+    excluded_plans: List[str] | None = None,
+    tag_sampling: Dict[str, object] | None = None,
+    sampling_controls: Dict[str, int] | None = None,
+    sampler: str = "v1",
+) -> List[dict]:
+    """
+    Vectorized counterpart of create_slot_plan (plan_engine: numpy) for very large plans.
+    Axis assignments and slot indices are drawn per batch with numpy.random.Generator, dedupe hashes
+    word-id tuples to uint64, and final_prompt is rendered only for kept rows. Same plan schema, but a
+    different random stream than the python engine. strict and exhaustive both switch to enumerating the
+    remaining combinations once batches stop yielding new keys; sampling_controls.max_repeat_window is
+    not applied (it is inherently sequential).
+    """
+    np = require_numpy()
+    rng = np.random.default_rng(seed)
+    axis_distribution = (axis_distribution or "weighted").lower()
+    exclude_keys = exclude_keys or set()
+    excluded_plans = excluded_plans or []
+    sampling_controls = sampling_controls or {}
+    dedupe = dedupe_mode in ("strict", "exhaustive")
+    if int(sampling_controls.get("max_repeat_window", 0)) > 0:
+        print("[warn] plan_engine numpy ignores sampling_controls.max_repeat_window")
+
+    pools = compile_vocab_pools(vocab, tag_sampling, sampler)
+    tables: Dict[str, CategoryTable] = {}
+    axes = list(dict.fromkeys(axis_ids))
+    draws: Dict[str, AxisDraws] = {}
+    for axis_no, axis_id in enumerate(axes):
+        placeholders = list(dict.fromkeys(axis_templates[axis_id].get("placeholders") or []))
+        for ph in placeholders:
+            if ph not in pools:
+                raise ValueError(f"Vocab category missing: {ph}")
+            if ph not in tables:
+                tables[ph] = CategoryTable(np, ph, pools[ph])
+        draws[axis_id] = AxisDraws(np, axis_no, axis_id, placeholders, tables)
+    # Hashed key indexes cannot be mapped to word ids, so their source plans' keys are read once instead.
+    keys_by_axis: Dict[str, List[str]] = {}
+    for key in exclude_keys.iter_keys() if hasattr(exclude_keys, "iter_keys") else exclude_keys:
+        axis_id = key.split("|", 1)[0]
+        if axis_id in draws:
+            keys_by_axis.setdefault(axis_id, []).append(key)
+    for axis_id, keys in keys_by_axis.items():
+        draws[axis_id].exclude(keys)
+
+    weights = [float(axis_weights.get(ax, 1.0) if axis_weights else 1.0) for ax in axis_ids]
+
+    def combination_spaces(drawn: List[str]) -> Tuple[Dict[str, AxisCombinations], Dict[str, int]]:
+        """Combination spaces and excluded counts of the axes that can actually be drawn."""
+        combos = {ax: AxisCombinations(ax, axis_templates[ax].get("placeholders") or [], pools) for ax in drawn}
+        return combos, {ax: count_excluded(set(keys_by_axis.get(ax, ())), combos[ax]) for ax in drawn}
+
+    def batch_size(need: int) -> int:
+        return int(min(max(need * 1.25 + 64, MIN_BATCH), MAX_BATCH))
+
+    def take_enumerated(remaining: Dict[str, tuple], need: int) -> List[Tuple[str, int]]:
+        """Assign `need` rows to axes by weight, each axis serving its enumerated combinations in order."""
+        taken = {ax: 0 for ax in remaining}
+        base = {ax: draws[ax].count for ax in remaining}
+        picked: List[Tuple[str, int]] = []
+        while len(picked) < need:
+            left = np.asarray([len(remaining[ax][2]) - taken[ax] if ax in remaining else 0 for ax in axes])
+            weights_left = probs * (left > 0)
+            if weights_left.sum() <= 0:
+                raise RuntimeError("numpy plan engine ran out of unique combinations")
+            for axis_no in rng.choice(len(axes), size=need - len(picked), p=weights_left / weights_left.sum()):
+                ax = axes[int(axis_no)]
+                if taken[ax] < len(remaining[ax][2]):
+                    picked.append((ax, base[ax] + taken[ax]))
+                    taken[ax] += 1
+        for ax, rem in remaining.items():
+            draws[ax].accept(*rem, np.arange(taken[ax]), dedupe)
+        return picked
+
+    order: List[Tuple[str, int]] = []  # (axis_id, row within that axis) in plan order
+    stalled = 0
+    if axis_distribution == "balanced":
+        quotas: Dict[str, int] = {}
+        for axis_id, count in zip(axis_ids, balanced_quotas(axis_ids, weights, target_count)):
+            quotas[axis_id] = quotas.get(axis_id, 0) + count
+        if dedupe:
+            drawn = [ax for ax in axes if quotas.get(ax, 0) > 0]
+            combos, used = combination_spaces(drawn)
+            check_plan_capacity(combos, {ax: quotas[ax] for ax in drawn}, used)
+        for axis_id in axes:
+            state = draws[axis_id]
+            while state.count < quotas[axis_id]:
+                need = quotas[axis_id] - state.count
+                word_cols, tag_cols, hashes, keep = state.draw(rng, batch_size(need), dedupe)
+                rows = np.flatnonzero(keep)[:need]
+                stalled = 0 if len(rows) else stalled + 1
+                state.accept(word_cols, tag_cols, hashes, rows, dedupe)
+                if dedupe and stalled >= ENUMERATE_AFTER_STALLED and state.count < quotas[axis_id]:
+                    remaining = state.enumerate_remaining(rng)
+                    if remaining is not None:
+                        need = quotas[axis_id] - state.count
+                        state.accept(*remaining, np.arange(min(need, len(remaining[2]))), dedupe)
+                        continue
+                if stalled > MAX_STALLED_ROUNDS:
+                    raise RuntimeError(f"numpy plan engine stalled on axis {axis_id}")
+        axis_seq = np.repeat(np.arange(len(axes)), [quotas[ax] for ax in axes])
+        axis_seq = axis_seq[rng.permutation(len(axis_seq))]
+        cursors = {ax: 0 for ax in axes}
+        for axis_no in axis_seq.tolist():
+            axis_id = axes[axis_no]
+            order.append((axis_id, cursors[axis_id]))
+            cursors[axis_id] += 1
+    else:
+        probs = np.zeros(len(axes), dtype=np.float64)
+        for axis_id, weight in zip(axis_ids, weights):
+            probs[axes.index(axis_id)] += weight
+        if probs.sum() > 0:
+            probs = np.clip(probs, 0, None)
+            eligible = [ax for ax, p in zip(axes, probs) if p > 0]
+            probs = probs / probs.sum()
+        else:
+            eligible = axes
+            probs = np.full(len(axes), 1.0 / len(axes))
+        if dedupe:
+            combos, used = combination_spaces(eligible)
+            check_plan_capacity(combos, {}, used, total=target_count)
+        while len(order) < target_count:
+            need = target_count - len(order)
+            n = batch_size(need)
+            assigned = rng.choice(len(axes), size=n, p=probs)
+            accepted: List[Tuple[int, str, int]] = []
+            pending = []
+            for axis_no, axis_id in enumerate(axes):
+                positions = np.flatnonzero(assigned == axis_no)
+                if not len(positions):
+                    continue
+                word_cols, tag_cols, hashes, keep = draws[axis_id].draw(rng, len(positions), dedupe)
+                pending.append((axis_id, positions, word_cols, tag_cols, hashes, keep))
+            candidates = np.sort(
+                np.concatenate([positions[keep] for _, positions, _, _, _, keep in pending])
+                if pending
+                else np.empty(0, dtype=np.int64)
+            )[:need]
+            cutoff = candidates[-1] if len(candidates) else -1
+            for axis_id, positions, word_cols, tag_cols, hashes, keep in pending:
+                rows = np.flatnonzero(keep & (positions <= cutoff))
+                base = draws[axis_id].count
+                draws[axis_id].accept(word_cols, tag_cols, hashes, rows, dedupe)
+                accepted.extend(
+                    (int(pos), axis_id, base + offset) for offset, pos in enumerate(positions[rows].tolist())
+                )
+            accepted.sort()
+            order.extend((axis_id, row) for _, axis_id, row in accepted)
+            stalled = 0 if accepted else stalled + 1
+            if dedupe and stalled >= ENUMERATE_AFTER_STALLED and len(order) < target_count:
+                remaining = {ax: draws[ax].enumerate_remaining(rng) for ax in eligible}
+                if all(rem is not None for rem in remaining.values()):
+                    order.extend(take_enumerated(remaining, target_count - len(order)))
+                    break
+            if stalled > MAX_STALLED_ROUNDS:
+                raise RuntimeError("numpy plan engine stalled; the remaining combinations are too many to enumerate")
+
+    columns = {axis_id: state.columns() for axis_id, state in draws.items()}
+    max_repeat_per_token = int(sampling_controls.get("max_repeat_per_token", 0))
+    token_counts: Dict[str, int] = {}
+    plan: List[dict] = []
+    for idx, (axis_id, row) in enumerate(order):
+        state = draws[axis_id]
+        word_cols, tag_cols = columns[axis_id]
+        slots: Dict[str, str] = {}
+        slot_tags: Dict[str, str | None] = {}
+        for pos, (ph, table) in enumerate(zip(state.placeholders, state.tables)):
+            word = table.words[int(word_cols[pos][row])]
+            slots[ph] = word
+            tag = table.tag_names[int(tag_cols[pos][row])]
+            if tag:
+                slot_tags[ph] = tag
+            token_counts[word] = token_counts.get(word, 0) + 1
+        plan.append(
+            {
+                "index": idx,
+                "profile": profile,
+                "axis_id": axis_id,
+                "slots": slots,
+                "final_prompt": render_final_prompt(axis_templates[axis_id]["template"], slots, global_suffix),
+                "seed_used": seed,
+                "generation_type": "standard",
+                "excluded_plans": excluded_plans,
+                "slot_tags": slot_tags or None,
+            }
+        )
+    if max_repeat_per_token:
+        for token, count in token_counts.items():
+            if count > max_repeat_per_token:
+                print(f"[warn] token '{token}' used {count} times (max_repeat_per_token={max_repeat_per_token})")
+    return plan
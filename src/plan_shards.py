@@ -0,0 +1,161 @@
+from __future__ import annotations
+
+from concurrent.futures import ProcessPoolExecutor
+from random import Random
+from typing import Any, Container, Dict, List
+
+from src.data_manager import (
+    AxisCombinations,
+    balanced_quotas,
+    check_excluded_capacity,
+    compile_vocab_pools,
+    create_slot_plan,
+    dedupe_key,
+)
+
+
+def shard_seed(seed: int, shard: int | str) -> int:
+    """Deterministic 63-bit seed of one shard (or "replace" for the dedupe pass) derived from --seed."""
+    return Random(f"{seed}:shard:{shard}").getrandbits(63)
+
+
+def shard_quotas(
+    axis_ids: List[str], weights: List[float], target_count: int, workers: int
+) -> List[Dict[str, int]]:
+    """
+    Split balanced_quotas across `workers` shards by dealing the axis-ordered item list round-robin:
+    shard sizes differ by at most one and the per-axis totals stay exactly those of balanced_quotas.
+    """
+    shards: List[Dict[str, int]] = [{} for _ in range(workers)]
+    position = 0
+    for axis_id, count in zip(axis_ids, balanced_quotas(axis_ids, weights, target_count)):
+        for _ in range(count):
+            quotas = shards[position % workers]
+            quotas[axis_id] = quotas.get(axis_id, 0) + 1
+            position += 1
+    return shards
+
+
+def _build_shard(kwargs: Dict[str, Any]) -> List[dict]:
+    return create_slot_plan(**kwargs)
+
+
+def create_slot_plan_sharded(
+    axis_templates: Dict[str, dict],
+    vocab: Dict[str, List[str]],
+    axis_ids: List[str],
+    target_count: int,
+    global_suffix: str,
+    axis_weights: Dict[str, float] | None,
+    axis_distribution: str | None,
+    dedupe_mode: str,
+    seed: int | None,
+    profile: str,
+    exclude_keys: Container[str] | None = None,
+    excluded_plans: List[str] | None = None,
+    tag_sampling: Dict[str, object] | None = None,
+    sampling_controls: Dict[str, int] | None = None,
+    sampler: str = "v1",
+    workers: int = 2,
+) -> List[dict]:
+    """
+    create_slot_plan split over `workers` processes (--plan-workers). Shard k draws its share of
+    target_count with shard_seed(seed, k); balanced quotas are dealt per shard so they still hold exactly.
+    Shards are concatenated in shard order, then (strict/exhaustive) keys repeated across shards are
+    replaced in place by a seeded dedupe pass (on the same axis for balanced quotas, on a freshly
+    drawn axis with free combinations for weighted ones), and indices are renumbered 0..n-1.
+    The same seed and worker count reproduce the same plan; it differs from the single-process plan.
+    sampling_controls apply per shard (each shard has its own repeat window and token counts).
+    """
+    workers = max(1, min(int(workers), target_count or 1))
+    axis_distribution = (axis_distribution or "weighted").lower()
+    exclude_keys = exclude_keys or set()
+    strict = dedupe_mode in ("strict", "exhaustive")
+    base_seed = seed if seed is not None else Random().getrandbits(63)
+    weights = [float(axis_weights.get(ax, 1.0) if axis_weights else 1.0) for ax in axis_ids]
+
+    if strict:
+        pools = compile_vocab_pools(vocab, tag_sampling or {}, sampler)
+        demand: Dict[str, int] = {}
+        if axis_distribution == "balanced":
+            for axis_id, count in zip(axis_ids, balanced_quotas(axis_ids, weights, target_count)):
+                if count > 0:
+                    demand[axis_id] = demand.get(axis_id, 0) + count
+            drawn = list(demand)
+        else:
+            eligible = [ax for ax, w in zip(axis_ids, weights) if w > 0] if sum(weights) > 0 else axis_ids
+            drawn = list(dict.fromkeys(eligible))
+        combos = {ax: AxisCombinations(ax, axis_templates[ax].get("placeholders") or [], pools) for ax in drawn}
+        if axis_distribution == "balanced":
+            check_excluded_capacity(combos, demand, exclude_keys)
+        else:
+            check_excluded_capacity(combos, {}, exclude_keys, total=target_count)
+
+    common = {
+        "axis_templates": axis_templates,
+        "vocab": vocab,
+        "axis_ids": axis_ids,
+        "global_suffix": global_suffix,
+        "axis_weights": axis_weights,
+        "axis_distribution": axis_distribution,
+        "dedupe_mode": dedupe_mode,
+        "profile": profile,
+        "exclude_keys": exclude_keys,
+        "excluded_plans": excluded_plans,
+        "tag_sampling": tag_sampling,
+        "sampling_controls": sampling_controls,
+        "sampler": sampler,
+    }
+    if axis_distribution == "balanced":
+        quotas = shard_quotas(axis_ids, weights, target_count, workers)
+        counts = [sum(q.values()) for q in quotas]
+    else:
+        quotas = [None] * workers
+        counts = [target_count // workers + (1 if k < target_count % workers else 0) for k in range(workers)]
+    jobs = [
+        dict(common, target_count=counts[k], seed=shard_seed(base_seed, k), axis_quotas=quotas[k])
+        for k in range(workers)
+    ]
+    print(f"[info] generating plan in {workers} shards: {', '.join(str(c) for c in counts)} items")
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        shards = list(pool.map(_build_shard, jobs))
+
+    plan = [item for shard in shards for item in shard]
+    if strict:
+        kept: set[str] = set()
+        dropped: List[int] = []
+        replace_quotas: Dict[str, int] = {}
+        for pos, item in enumerate(plan):
+            key = dedupe_key(item["axis_id"], item["slots"])
+            if key in kept:
+                dropped.append(pos)
+                replace_quotas[item["axis_id"]] = replace_quotas.get(item["axis_id"], 0) + 1
+            else:
+                kept.add(key)
+        if dropped:
+            print(f"[info] replacing {len(dropped)} items duplicated across shards")
+            replace = dict(common, target_count=len(dropped), seed=shard_seed(base_seed, "replace"), existing_keys=kept)
+            if axis_distribution == "balanced":
+                replace["axis_quotas"] = replace_quotas
+            else:
+                # Weighted replacements redraw their axis; axes the kept items already fill are left out.
+                kept_per_axis: Dict[str, int] = {}
+                for key in kept:
+                    axis_id = key.split("|", 1)[0]
+                    kept_per_axis[axis_id] = kept_per_axis.get(axis_id, 0) + 1
+                replace["axis_weights"] = {
+                    ax: 0.0 if ax in combos and kept_per_axis.get(ax, 0) >= combos[ax].reachable else w
+                    for ax, w in zip(axis_ids, weights if sum(weights) > 0 else [1.0] * len(axis_ids))
+                }
+            replacements = create_slot_plan(**replace)
+            if axis_distribution == "balanced":
+                by_axis: Dict[str, List[dict]] = {}
+                for item in replacements:
+                    by_axis.setdefault(item["axis_id"], []).append(item)
+                replacements = [by_axis[plan[pos]["axis_id"]].pop(0) for pos in dropped]
+            for pos, item in zip(dropped, replacements):
+                plan[pos] = item
+    for idx, item in enumerate(plan):
+        item["index"] = idx
+        item["seed_used"] = seed
+    return plan
@@ -0,0 +1,270 @@
+from __future__ import annotations
+
+import asyncio
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from typing import Any, Deque, Dict, List
+
+BACKOFF_ERRORS = ("RATE_LIMITED", "CONNECTION_ERROR")
+
+
+class AdaptiveConcurrency:
+    """
+    AIMD limit on requests in flight.
+    +1 after `increase_after` consecutive healthy completions (no error, latency under
+    `latency_threshold` when set); halved on RATE_LIMITED / CONNECTION_ERROR, at most once per `cooldown` seconds.
+    """
+
+    def __init__(
+        self,
+        initial: int,
+        min_limit: int = 1,
+        max_limit: int = 64,
+        increase_after: int = 0,
+        latency_threshold: float = 0.0,
+        cooldown: float = 5.0,
+        history_size: int = 1000,
+    ) -> None:
+        self.min_limit = max(int(min_limit), 1)
+        self.max_limit = max(int(max_limit), self.min_limit)
+        self.limit = min(max(int(initial), self.min_limit), self.max_limit)
+        self.increase_after = max(int(increase_after or 0), 0)
+        self.latency_threshold = float(latency_threshold or 0)
+        self.cooldown = float(cooldown)
+        self.history: Deque[Dict[str, Any]] = deque(maxlen=history_size)
+        self.in_flight = 0
+        self._healthy = 0
+        self._last_decrease = float("-inf")
+        self._cond = threading.Condition()
+        self._async_waiters: Deque[asyncio.Future] = deque()
+
+    def acquire(self) -> None:
+        with self._cond:
+            while self.in_flight >= self.limit:
+                self._cond.wait()
+            self.in_flight += 1
+
+    async def acquire_async(self) -> None:
+        # Only the event loop thread touches the async path, so the handoff needs no lock.
+        if self.in_flight < self.limit and not self._async_waiters:
+            self.in_flight += 1
+            return
+        waiter = asyncio.get_running_loop().create_future()
+        self._async_waiters.append(waiter)
+        try:
+            await waiter
+        except BaseException:
+            # Cancelled after release_async already handed us the slot: pass it on.
+            if waiter.done() and not waiter.cancelled():
+                self.abandon_async()
+            raise
+
+    def release(self, error_type: str | None, latency: float) -> None:
+        with self._cond:
+            self.in_flight -= 1
+            self._observe(error_type, latency)
+            self._cond.notify_all()
+
+    def abandon(self) -> None:
+        """Give back a slot whose request never ran (interrupted while waiting); no feedback is recorded."""
+        with self._cond:
+            self.in_flight -= 1
+            self._cond.notify_all()
+
+    def release_async(self, error_type: str | None, latency: float) -> None:
+        self._observe(error_type, latency)
+        self.abandon_async()
+
+    def abandon_async(self) -> None:
+        self.in_flight -= 1
+        while self._async_waiters and self.in_flight < self.limit:
+            waiter = self._async_waiters.popleft()
+            if waiter.done():
+                continue
+            self.in_flight += 1
+            waiter.set_result(None)
+
+    def _observe(self, error_type: str | None, latency: float) -> None:
+        if error_type in BACKOFF_ERRORS:
+            self._healthy = 0
+            now = time.monotonic()
+            if now - self._last_decrease < self.cooldown:
+                return
+            self._last_decrease = now
+            self._set_limit(max(self.limit // 2, self.min_limit), "decrease", error_type)
+            return
+        if error_type is not None or (self.latency_threshold and latency > self.latency_threshold):
+            self._healthy = 0
+            return
+        self._healthy += 1
+        if self._healthy >= (self.increase_after or self.limit) and self.limit < self.max_limit:
+            self._healthy = 0
+            self._set_limit(self.limit + 1, "increase", f"healthy latency={latency:.2f}s")
+
+    def _set_limit(self, new_limit: int, action: str, reason: str) -> None:
+        if new_limit == self.limit:
+            return
+        self.limit = new_limit
+        self.history.append(
+            {"at": datetime.now().isoformat(), "action": action, "limit": new_limit, "reason": reason}
+        )
+
+    def snapshot(self) -> Dict[str, Any]:
+        history: List[Dict[str, Any]] = list(self.history)
+        return {
+            "limit": self.limit,
+            "min_limit": self.min_limit,
+            "max_limit": self.max_limit,
+            "decisions": len(history),
+            "history": history,
+        }
+
+
+class RateLimiter:
+    """
+    Client-side limiter applied before every generate_content call.
+    - requests_per_minute: token bucket refilled continuously (0 = unlimited), `burst` tokens max.
+    - max_concurrent: cap on requests in flight (0 = unlimited).
+    - adaptive: optional AdaptiveConcurrency gate fed with each call's outcome and latency.
+    Works from plain threads (acquire/release) and from the asyncio driver (acquire_async/release_async).
+    """
+
+    def __init__(
+        self,
+        requests_per_minute: float = 0.0,
+        max_concurrent: int = 0,
+        burst: int = 1,
+        adaptive: AdaptiveConcurrency | None = None,
+    ) -> None:
+        self.requests_per_minute = max(float(requests_per_minute or 0), 0.0)
+        self.max_concurrent = max(int(max_concurrent or 0), 0)
+        self.burst = max(int(burst or 1), 1)
+        self._rate = self.requests_per_minute / 60.0
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(self.max_concurrent) if self.max_concurrent else None
+        self._async_slots: asyncio.Semaphore | None = None
+        self.adaptive = adaptive
+        self.acquired = 0
+        self.waited = 0
+        self.token_wait_seconds = 0.0
+        self.max_token_wait_seconds = 0.0
+        self.slot_wait_seconds = 0.0
+
+    def _reserve_token(self) -> float:
+        """Take one token (possibly going into debt) and return how long the caller must wait for it."""
+        if self._rate <= 0:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(float(self.burst), self._tokens + (now - self._updated) * self._rate)
+            self._updated = now
+            self._tokens -= 1.0
+            wait = 0.0 if self._tokens >= 0 else -self._tokens / self._rate
+        return wait
+
+    def _record(self, token_wait: float, slot_wait: float) -> None:
+        with self._lock:
+            self.acquired += 1
+            self.slot_wait_seconds += slot_wait
+            if token_wait > 0:
+                self.waited += 1
+                self.token_wait_seconds += token_wait
+                self.max_token_wait_seconds = max(self.max_token_wait_seconds, token_wait)
+
+    def acquire(self) -> None:
+        started = time.monotonic()
+        if self.adaptive is not None:
+            self.adaptive.acquire()
+        slot_held = False
+        try:
+            if self._slots is not None:
+                self._slots.acquire()
+                slot_held = True
+            slot_wait = time.monotonic() - started
+            token_wait = self._reserve_token()
+            if token_wait > 0:
+                time.sleep(token_wait)
+        except BaseException:
+            if slot_held:
+                self._slots.release()
+            if self.adaptive is not None:
+                self.adaptive.abandon()
+            raise
+        self._record(token_wait, slot_wait)
+
+    def release(self, error_type: str | None = None, latency: float = 0.0) -> None:
+        if self._slots is not None:
+            self._slots.release()
+        if self.adaptive is not None:
+            self.adaptive.release(error_type, latency)
+
+    async def acquire_async(self) -> None:
+        started = time.monotonic()
+        if self.adaptive is not None:
+            await self.adaptive.acquire_async()
+        slot_held = False
+        try:
+            if self.max_concurrent:
+                if self._async_slots is None:
+                    self._async_slots = asyncio.Semaphore(self.max_concurrent)
+                await self._async_slots.acquire()
+                slot_held = True
+            slot_wait = time.monotonic() - started
+            token_wait = self._reserve_token()
+            if token_wait > 0:
+                await asyncio.sleep(token_wait)
+        except BaseException:
+            if slot_held:
+                self._async_slots.release()
+            if self.adaptive is not None:
+                self.adaptive.abandon_async()
+            raise
+        self._record(token_wait, slot_wait)
+
+    def release_async(self, error_type: str | None = None, latency: float = 0.0) -> None:
+        if self._async_slots is not None:
+            self._async_slots.release()
+        if self.adaptive is not None:
+            self.adaptive.release_async(error_type, latency)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "requests_per_minute": self.requests_per_minute,
+                "max_concurrent": self.max_concurrent,
+                "acquired": self.acquired,
+                "waited": self.waited,
+                "token_wait_seconds": round(self.token_wait_seconds, 3),
+                "max_token_wait_seconds": round(self.max_token_wait_seconds, 3),
+                "slot_wait_seconds": round(self.slot_wait_seconds, 3),
+                "adaptive_limit": self.adaptive.limit if self.adaptive is not None else None,
+            }
+
+
+def create_rate_limiter(rate_cfg: Dict[str, Any] | None, concurrency: int = 1) -> RateLimiter | None:
+    """
+    Build a limiter from the `rate_limit:` config block; None when every limit is disabled.
+    The adaptive controller never exceeds `concurrency` (the worker count) unless `adaptive.max` is set.
+    """
+    rate_cfg = rate_cfg or {}
+    rpm = float(rate_cfg.get("requests_per_minute", 0) or 0)
+    max_concurrent = int(rate_cfg.get("max_concurrent", 0) or 0)
+    adaptive_cfg = rate_cfg.get("adaptive") or {}
+    adaptive = None
+    if adaptive_cfg.get("enabled"):
+        max_limit = int(adaptive_cfg.get("max", 0) or concurrency)
+        adaptive = AdaptiveConcurrency(
+            initial=int(adaptive_cfg.get("initial", 0) or max(max_limit // 2, 1)),
+            min_limit=int(adaptive_cfg.get("min", 1) or 1),
+            max_limit=max_limit,
+            increase_after=int(adaptive_cfg.get("increase_after", 0) or 0),
+            latency_threshold=float(adaptive_cfg.get("latency_threshold", 0) or 0),
+            cooldown=float(adaptive_cfg.get("cooldown", 5.0)),
+        )
+    if rpm <= 0 and max_concurrent <= 0 and adaptive is None:
+        return None
+    return RateLimiter(rpm, max_concurrent, burst=int(rate_cfg.get("burst", 1) or 1), adaptive=adaptive)
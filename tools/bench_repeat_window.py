@@ -0,0 +1,58 @@
+#!/usr/bin/env python
+"""
+Microbenchmark: sampling_controls.max_repeat_window membership checks, deque scan vs RepeatWindow.
+Usage:
+  python tools/bench_repeat_window.py
+  python tools/bench_repeat_window.py --windows 200,1000,10000 --draws 50000 --vocab 20000
+"""
+
+from __future__ import annotations
+
+import argparse
+import sys
+import time
+from collections import deque
+from pathlib import Path
+from random import Random
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+if str(REPO_ROOT) not in sys.path:
+    sys.path.insert(0, str(REPO_ROOT))
+
+from src.data_manager import RepeatWindow
+
+
+def run(window, tokens, checks_per_draw: int) -> tuple[float, int]:
+    """Mimic build_slots_for_axis: a few avoid-checks per draw, then append the chosen token."""
+    hits = 0
+    started = time.perf_counter()
+    for token in tokens:
+        for _ in range(checks_per_draw):
+            if token in window:
+                hits += 1
+        window.append(token)
+    return time.perf_counter() - started, hits
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark repeat-window membership checks.")
+    parser.add_argument("--windows", type=str, default="200,1000,5000,10000")
+    parser.add_argument("--draws", type=int, default=20000)
+    parser.add_argument("--vocab", type=int, default=50000, help="Distinct tokens to draw from")
+    parser.add_argument("--checks", type=int, default=5, help="Membership checks per draw (slot retries)")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    rng = Random(args.seed)
+    tokens = [f"tok{rng.randrange(args.vocab)}" for _ in range(args.draws)]
+    print(f"{'window':>8} {'deque_s':>10} {'counted_s':>10} {'speedup':>8}")
+    for size in [int(w) for w in args.windows.split(",") if w.strip()]:
+        deque_s, deque_hits = run(deque(maxlen=size), tokens, args.checks)
+        counted_s, counted_hits = run(RepeatWindow(size), tokens, args.checks)
+        if deque_hits != counted_hits:
+            raise RuntimeError(f"membership mismatch for window={size}: {deque_hits} != {counted_hits}")
+        print(f"{size:>8} {deque_s:>10.3f} {counted_s:>10.3f} {deque_s / counted_s:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,16 +1,19 @@
 import argparse
 import collections
-import json
 import pathlib
+import sys
+
+REPO_ROOT = pathlib.Path(__file__).resolve().parents[1]
+if str(REPO_ROOT) not in sys.path:
+    sys.path.insert(0, str(REPO_ROOT))
+
+from src.data_manager import iter_plan
 
 
 def load_items(plan_path: pathlib.Path):
     if not plan_path.exists():
         raise FileNotFoundError(f"Plan not found: {plan_path}")
-    for line in plan_path.read_text().splitlines():
-        if not line.strip():
-            continue
-        yield json.loads(line)
+    yield from iter_plan(plan_path)
 
 
 def summarize(plan_path: pathlib.Path, top_n: int):
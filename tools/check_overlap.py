@@ -4,25 +4,38 @@ Plan overlap checker.
 Usage:
     python tools/check_overlap.py path/to/plan_a.jsonl path/to/plan_b.jsonl [path/to/plan_c.jsonl ...]
 Reports whether any axis_id+slots combination overlaps across 2+ plans.
+Keys are compared as 64-bit hashes from each plan's cached <plan>.jsonl.keys index.
 """
 
 from __future__ import annotations
 
-import json
 import sys
 from pathlib import Path
 
+REPO_ROOT = Path(__file__).resolve().parents[1]
+if str(REPO_ROOT) not in sys.path:
+    sys.path.insert(0, str(REPO_ROOT))
 
-def load_keys(path: Path) -> set[str]:
-    keys: set[str] = set()
-    for line in path.read_text(encoding="utf-8").splitlines():
-        if not line.strip():
-            continue
-        data = json.loads(line)
-        slots = data.get("slots") or {}
-        key = "|".join([data.get("axis_id", "")] + [f"{k}={v}" for k, v in sorted(slots.items())])
-        keys.add(key)
-    return keys
+from src.data_manager import dedupe_key, iter_plan
+from src.plan_keys import KeyIndex, dedupe_key_hash
+
+
+def load_keys(path: Path) -> set[int]:
+    return set(KeyIndex.for_plan(path).hashes())
+
+
+def describe_keys(paths: list[Path], hashes: set[int], limit: int) -> dict[int, str]:
+    """Readable dedupe_key strings for a few hashes (only parses plans when there is something to show)."""
+    found: dict[int, str] = {}
+    for path in paths:
+        for data in iter_plan(path):
+            key = dedupe_key(data.get("axis_id", ""), data.get("slots") or {})
+            hashed = dedupe_key_hash(key)
+            if hashed in hashes and hashed not in found:
+                found[hashed] = key
+                if len(found) >= limit:
+                    return found
+    return found
 
 
 def main() -> None:
@@ -37,8 +50,8 @@ def main() -> None:
             print(f"  {p}")
         sys.exit(1)
 
-    key_sets: list[set[str]] = []
-    key_to_sources: dict[str, list[int]] = {}
+    key_sets: list[set[int]] = []
+    key_to_sources: dict[int, list[int]] = {}
 
     for idx, path in enumerate(paths):
         keys = load_keys(path)
@@ -64,9 +77,11 @@ def main() -> None:
 
     if overlap_any:
         print("Overlapping keys (first 20):")
-        for k in list(overlap_any.keys())[:20]:
+        first = list(overlap_any.keys())[:20]
+        names = describe_keys(paths, set(first), len(first))
+        for k in first:
             sources = ",".join(str(i) for i in overlap_any[k])
-            print(f"{k}  [files:{sources}]")
+            print(f"{names.get(k, f'{k:016x}')}  [files:{sources}]")
 
 
 if __name__ == "__main__":
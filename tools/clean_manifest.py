@@ -12,25 +12,28 @@ from __future__ import annotations
 
 import argparse
 import json
+import sys
 from datetime import datetime
 from pathlib import Path
 from typing import Any, Dict, Tuple
 
+REPO_ROOT = Path(__file__).resolve().parents[1]
+if str(REPO_ROOT) not in sys.path:
+    sys.path.insert(0, str(REPO_ROOT))
 
-def load_plan_map(plan_path: Path) -> Dict[int, dict]:
-    mapping: Dict[int, dict] = {}
+from src.data_manager import iter_plan
+from src.manifest_store import manifest_index_path
+
+
+def load_plan_map(plan_path: Path) -> Dict[int, str]:
+    """index -> axis_id of a plan (streamed; only what the axis check needs is kept)."""
+    mapping: Dict[int, str] = {}
     if not plan_path.exists():
         return mapping
-    for line in plan_path.read_text(encoding="utf-8").splitlines():
-        if not line.strip():
-            continue
-        try:
-            data = json.loads(line)
-            idx = data.get("index")
-            if isinstance(idx, int):
-                mapping[idx] = data
-        except Exception:
-            continue
+    for data in iter_plan(plan_path, skip_invalid=True):
+        idx = data.get("index")
+        if isinstance(idx, int):
+            mapping[idx] = data.get("axis_id")
     return mapping
 
 
@@ -63,7 +66,7 @@ def main() -> None:
             continue
 
     plan_names = set(args.plan_name) if args.plan_name else {r.get("plan_name") for r in records if r.get("plan_name")}
-    plan_maps: Dict[str, Dict[int, dict]] = {}
+    plan_maps: Dict[str, Dict[int, str]] = {}
     for plan_name in plan_names:
         plan_path = output_dir / f"{plan_name}.jsonl"
         plan_maps[plan_name] = load_plan_map(plan_path)
@@ -79,7 +82,7 @@ def main() -> None:
             continue
         axis_id = rec.get("axis_id") or ""
         plan_map = plan_maps.get(plan_name, {})
-        axis_match = bool(plan_map and idx in plan_map and plan_map[idx].get("axis_id") == axis_id)
+        axis_match = bool(plan_map and idx in plan_map and plan_map[idx] == axis_id)
         status = rec.get("status") or ""
 
         if status == "success":
@@ -116,6 +119,7 @@ def main() -> None:
     backup_path = manifest_path.with_suffix(f".jsonl.bak_{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}")
     manifest_path.rename(backup_path)
     manifest_path.write_text("\n".join(json.dumps(r, ensure_ascii=False) for r in cleaned) + "\n", encoding="utf-8")
+    manifest_index_path(manifest_path).unlink(missing_ok=True)
     print(f"[done] backup={backup_path.name} written={manifest_path}")
 
 
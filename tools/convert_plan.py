@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+"""
+Convert a plan between plain JSONL and the compact format (plan_format: compact).
+Usage:
+  python tools/convert_plan.py out/4cats/explore.jsonl --to compact
+  python tools/convert_plan.py out/4cats/explore.jsonl --to jsonl --output out/4cats/explore_full.jsonl
+Without --output the plan is rewritten in place. Compact conversion uses the axis templates and
+global_prompt_suffix of --profile (default: the plan's own profile); items whose final_prompt does
+not match the current templates keep their prompt verbatim, so conversion is lossless either way.
+"""
+
+from __future__ import annotations
+
+import argparse
+import sys
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+if str(REPO_ROOT) not in sys.path:
+    sys.path.insert(0, str(REPO_ROOT))
+
+from src.config_loader import load_profile_config, load_yaml
+from src.data_manager import iter_plan, plan_state_path, read_plan_header, read_plan_state, save_plan_state, write_plan
+
+
+def load_axis_templates(profile: str) -> dict:
+    prof_path = REPO_ROOT / "profiles" / profile / "axis_templates.yaml"
+    if prof_path.exists():
+        return load_yaml(prof_path).get("axis_templates", {})
+    return load_yaml(REPO_ROOT / "data" / "axis_templates.yaml").get("axis_templates", {})
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Convert plan.jsonl <-> compact plan format.")
+    parser.add_argument("plan", type=Path)
+    parser.add_argument("--to", choices=["jsonl", "compact"], required=True)
+    parser.add_argument("--output", type=Path, help="Output path (default: rewrite the plan in place)")
+    parser.add_argument("--profile", help="Profile whose axis templates are used for --to compact")
+    args = parser.parse_args()
+
+    if not args.plan.exists():
+        print(f"[error] plan not found: {args.plan}")
+        return
+    current = "compact" if read_plan_header(args.plan) else "jsonl"
+    out_path = args.output or args.plan
+    if current == args.to and out_path == args.plan:
+        print(f"[skip] {args.plan} is already {args.to}")
+        return
+
+    axis_templates: dict = {}
+    global_suffix = ""
+    if args.to == "compact":
+        profile = args.profile or next(iter_plan(args.plan), {}).get("profile")
+        if not profile:
+            print("[error] --profile is required (plan items have no profile)")
+            return
+        axis_templates = load_axis_templates(profile)
+        global_suffix = str(load_profile_config(profile).get("global_prompt_suffix", "")).strip()
+
+    # Keep <plan>.state.json usable for --extend-plan when converting in place.
+    state = read_plan_state(args.plan) if out_path == args.plan else {}
+    state_valid = bool(state) and state.get("plan_size") == args.plan.stat().st_size
+    size_before = args.plan.stat().st_size
+    count = write_plan(iter_plan(args.plan), out_path, args.to, axis_templates, global_suffix)
+    if state_valid:
+        save_plan_state(out_path, state)
+    elif out_path == args.plan and plan_state_path(args.plan).exists():
+        print(f"[warn] {plan_state_path(args.plan).name} did not match the plan; --extend-plan will rebuild it")
+    print(f"[done] {current} -> {args.to}: items={count} bytes={size_before} -> {out_path.stat().st_size} ({out_path})")
+
+
+if __name__ == "__main__":
+    main()
@@ -21,6 +21,7 @@ if str(REPO_ROOT) not in sys.path:
     sys.path.insert(0, str(REPO_ROOT))
 
 from src.api_client import init_client
+from src.batch_state import BatchStateCache, batch_state_path, fetch_batch_states
 from src.config_loader import load_env, require_api_key
 
 
@@ -79,34 +80,6 @@ def file_name(file_obj: object) -> str | None:
     return _get_attr(file_obj, "name", "file", "file_name", "fileName")
 
 
-def resolve_output_file_name(batch_info: object) -> tuple[str | None, str | None]:
-    dest = _get_attr(batch_info, "dest")
-    if dest:
-        file_name = _get_attr(dest, "file_name")
-        if file_name:
-            return file_name, "dest.file_name"
-        file_name = _get_attr(dest, "fileName")
-        if file_name:
-            return file_name, "dest.fileName"
-    output_ref = _get_attr(batch_info, "output")
-    if output_ref:
-        file_name = _get_attr(output_ref, "name")
-        if file_name:
-            return file_name, "output.name"
-        file_name = _get_attr(output_ref, "file")
-        if file_name:
-            return file_name, "output.file"
-        file_name = _get_attr(output_ref, "file_name")
-        if file_name:
-            return file_name, "output.file_name"
-        file_name = _get_attr(output_ref, "fileName")
-        if file_name:
-            return file_name, "output.fileName"
-        if isinstance(output_ref, str):
-            return output_ref, "output(str)"
-    return None, None
-
-
 def get_file_info(client: object, file_id: str) -> tuple[object | None, str | None]:
     last_err: Exception | None = None
     candidates = []
@@ -247,13 +220,12 @@ def main() -> None:
         print("[BATCH_OUTPUTS]")
         total = 0
         output_ids: list[str] = []
+        states, errors = fetch_batch_states(client, batch_names, BatchStateCache(batch_state_path(jobs_path)))
         for name in batch_names:
-            try:
-                batch_info = client.batches.get(name=name)
-            except Exception as exc:  # noqa: BLE001
-                print(f"[warn] batch get failed {name}: {exc}")
+            if name in errors:
+                print(f"[warn] batch get failed {name}: {errors[name]}")
                 continue
-            output_name, source = resolve_output_file_name(batch_info)
+            output_name, source = states[name]["output_file"], states[name]["output_source"]
             if not output_name:
                 print(f"- {name} | output=NONE")
                 continue
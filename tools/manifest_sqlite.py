@@ -0,0 +1,63 @@
+#!/usr/bin/env python
+"""
+Convert a profile manifest between JSONL and the SQLite backend (manifest_backend: sqlite).
+Usage:
+  python tools/manifest_sqlite.py --profile 4cats_pairmix --import-jsonl
+  python tools/manifest_sqlite.py --profile 4cats_pairmix --export-jsonl out/4cats_pairmix/manifest_export.jsonl
+"""
+
+from __future__ import annotations
+
+import argparse
+import sys
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+if str(REPO_ROOT) not in sys.path:
+    sys.path.insert(0, str(REPO_ROOT))
+
+from src.manifest_store import SqliteManifest
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Import/export manifest.jsonl <-> manifest.sqlite.")
+    parser.add_argument("--profile", required=True)
+    parser.add_argument("--output", default="./out")
+    parser.add_argument("--import-jsonl", action="store_true", help="Append manifest.jsonl records into manifest.sqlite.")
+    parser.add_argument("--export-jsonl", type=str, help="Write every manifest.sqlite record to this JSONL path.")
+    args = parser.parse_args()
+
+    output_root = Path(args.output)
+    output_dir = output_root if output_root.name == args.profile else output_root / args.profile
+    jsonl_path = output_dir / "manifest.jsonl"
+    sqlite_path = output_dir / "manifest.sqlite"
+
+    if not args.import_jsonl and not args.export_jsonl:
+        print(__doc__)
+        return
+
+    if args.import_jsonl:
+        if not jsonl_path.exists():
+            print(f"[error] manifest not found: {jsonl_path}")
+            return
+        if sqlite_path.exists():
+            print(f"[error] {sqlite_path} already exists; remove it first to avoid duplicate records.")
+            return
+        db = SqliteManifest(sqlite_path)
+        count = db.import_jsonl(jsonl_path)
+        db.close()
+        print(f"[done] imported={count} -> {sqlite_path}")
+
+    if args.export_jsonl:
+        if not sqlite_path.exists():
+            print(f"[error] sqlite manifest not found: {sqlite_path}")
+            return
+        out_path = Path(args.export_jsonl)
+        db = SqliteManifest(sqlite_path)
+        count = db.export_jsonl(out_path)
+        db.close()
+        print(f"[done] exported={count} -> {out_path}")
+
+
+if __name__ == "__main__":
+    main()
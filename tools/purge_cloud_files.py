@@ -19,6 +19,7 @@ if str(REPO_ROOT) not in sys.path:
     sys.path.insert(0, str(REPO_ROOT))
 
 from src.api_client import init_client
+from src.batch_state import BatchStateCache, batch_state_path, fetch_batch_states
 from src.config_loader import load_env, require_api_key
 
 
@@ -50,23 +51,6 @@ def file_name(file_obj: object) -> str | None:
     return _get_attr(file_obj, "name", "file", "file_name", "fileName")
 
 
-def resolve_output_file_name(batch_info: object) -> str | None:
-    dest = _get_attr(batch_info, "dest")
-    if dest:
-        name = _get_attr(dest, "file_name") or _get_attr(dest, "fileName")
-        if name:
-            return name
-    output_ref = _get_attr(batch_info, "output")
-    if output_ref:
-        name = _get_attr(output_ref, "name") or _get_attr(output_ref, "file")
-        name = name or _get_attr(output_ref, "file_name") or _get_attr(output_ref, "fileName")
-        if name:
-            return name
-        if isinstance(output_ref, str):
-            return output_ref
-    return None
-
-
 def delete_file(client: object, file_id: str) -> tuple[bool, str | None]:
     candidates = [file_id]
     if file_id.startswith("files/"):
@@ -94,6 +78,7 @@ def gather_batch_outputs(client: object, output_dir: Path) -> list[tuple[str, st
     if not batches_dir.exists():
         return outputs
     for jobs_path in batches_dir.glob("*.jobs.jsonl"):
+        batch_names: list[str] = []
         for line in jobs_path.read_text(encoding="utf-8").splitlines():
             if not line.strip():
                 continue
@@ -102,14 +87,12 @@ def gather_batch_outputs(client: object, output_dir: Path) -> list[tuple[str, st
             except Exception:
                 continue
             bname = data.get("batch_name")
-            if not bname:
-                continue
-            try:
-                info = client.batches.get(name=bname)
-            except Exception:
-                continue
-            out_name = resolve_output_file_name(info)
-            outputs.append((bname, out_name))
+            if bname:
+                batch_names.append(bname)
+        states, _ = fetch_batch_states(client, batch_names, BatchStateCache(batch_state_path(jobs_path)))
+        for bname in dict.fromkeys(batch_names):
+            if bname in states:
+                outputs.append((bname, states[bname]["output_file"]))
     return outputs
 
 
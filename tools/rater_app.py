@@ -3,7 +3,9 @@ from __future__ import annotations
 import argparse
 import json
 import random
+import sys
 import threading
+import time
 from datetime import datetime
 from pathlib import Path
 from typing import Dict, List, Optional, Tuple
@@ -13,6 +15,14 @@ from fastapi.responses import HTMLResponse, JSONResponse
 from fastapi.staticfiles import StaticFiles
 from pydantic import BaseModel
 
+REPO_ROOT = Path(__file__).resolve().parents[1]
+if str(REPO_ROOT) not in sys.path:
+    sys.path.insert(0, str(REPO_ROOT))
+
+from src.config_loader import load_profile_config
+from src.manifest_store import JsonlTail, default_manifest_path, is_sqlite_manifest, open_sqlite_manifest
+from src.plan_compact import CompactPlanDecoder
+
 
 AXIS_WORDS = {
     "mat_object": ("MATERIAL", "OBJECT"),
@@ -30,12 +40,14 @@ class RateRequest(BaseModel):
 
 
 class RaterState:
-    def __init__(self, profile: str, plan_names: List[str], output_dir: Path) -> None:
+    def __init__(
+        self, profile: str, plan_names: List[str], output_dir: Path, manifest_path: Optional[Path] = None
+    ) -> None:
         self.profile = profile
         self.plan_names = plan_names
         self.primary_plan = plan_names[0] if plan_names else "explore"
         self.output_dir = output_dir
-        self.manifest_path = output_dir / "manifest.jsonl"
+        self.manifest_path = manifest_path or output_dir / "manifest.jsonl"
         self.images_root = output_dir / "images"
         self.ratings_paths = {
             name: output_dir / "ratings" / f"{name}.jsonl" for name in plan_names
@@ -48,56 +60,98 @@ class RaterState:
         self.items_by_key: Dict[str, dict] = {}
         self.ratings: Dict[str, int] = {}
         self.tag_options: Dict[str, List[str]] = {}
+        self.plan_tails: Dict[str, JsonlTail] = {}
+        self.plan_decoders: Dict[str, CompactPlanDecoder] = {}
+        self.ratings_tails: Dict[str, JsonlTail] = {}
+        self.manifest_tail = JsonlTail(self.manifest_path)
+        self.manifest_last_id = 0
         self.load_all()
 
     def load_all(self) -> None:
+        """Full reload: forget every tail offset and rebuild from the files."""
         with self.lock:
-            self.plan_by_key = self.load_plans()
-            self.ratings = self.load_ratings()
-            self.items = self.load_items()
-            self.items_by_key = {item["uid"]: item for item in self.items}
+            plan_tails: Dict[str, JsonlTail] = {}
+            for plan_name in self.plan_names:
+                plan_path = self.output_dir / f"{plan_name}.jsonl"
+                if not plan_path.exists():
+                    raise FileNotFoundError(f"plan not found: {plan_path}")
+                plan_tails[plan_name] = JsonlTail(plan_path, allow_unterminated=True)
+            self.plan_tails = plan_tails
+            self.plan_decoders = {plan_name: CompactPlanDecoder() for plan_name in plan_tails}
+            self.plan_by_key = {}
+            self.reset_ratings()
+            self.reset_items()
+            self.refresh_locked()
+
+    def refresh(self) -> int:
+        """Apply only records appended since the last load/refresh; returns the number of new manifest records."""
+        with self.lock:
+            return self.refresh_locked()
+
+    def refresh_locked(self) -> int:
+        plans_changed = False
+        plans_reset = False
+        for plan_name, tail in self.plan_tails.items():
+            reset, records = tail.read_new()
+            if reset:
+                self.plan_decoders[plan_name] = CompactPlanDecoder()
+                prefix = f"{plan_name}:"
+                self.plan_by_key = {k: v for k, v in self.plan_by_key.items() if not k.startswith(prefix)}
+                plans_reset = True
+            plans_changed = plans_changed or reset or bool(records)
+            self.apply_plan_records(plan_name, records)
+        if plans_reset:
+            # Items are joined with plan entries, so a rewritten plan means re-reading the manifest.
+            self.reset_items()
+
+        ratings_reset, ratings_records = self.read_new_ratings_records()
+        if ratings_reset:
+            self.reset_ratings()
+            _, ratings_records = self.read_new_ratings_records()
+        for plan_name, rec in ratings_records:
+            self.apply_rating_record(plan_name, rec)
+
+        manifest_reset, records = self.read_new_manifest_records()
+        if manifest_reset:
+            # The tail restarted from the top of a rewritten manifest; drop items built from the old one.
+            self.items_by_key = {}
+        for rec in records:
+            self.apply_manifest_record(rec)
+        if records or plans_changed or manifest_reset:
+            self.items = list(self.items_by_key.values())
             self.tag_options = self.build_tag_options()
-
-    def load_plans(self) -> Dict[str, dict]:
-        mapping: Dict[str, dict] = {}
-        for plan_name in self.plan_names:
-            plan_path = self.output_dir / f"{plan_name}.jsonl"
-            if not plan_path.exists():
-                raise FileNotFoundError(f"plan not found: {plan_path}")
-            for line in plan_path.read_text(encoding="utf-8").splitlines():
-                if not line.strip():
-                    continue
-                try:
-                    data = json.loads(line)
-                    idx = int(data["index"])
-                except Exception:
-                    continue
-                key = f"{plan_name}:{idx}"
-                mapping[key] = data
-        return mapping
-
-    def load_ratings(self) -> Dict[int, int]:
-        mapping: Dict[str, int] = {}
-        for plan_name, ratings_path in self.ratings_paths.items():
-            if not ratings_path.exists():
+        return len(records)
+
+    def reset_ratings(self) -> None:
+        self.ratings = {}
+        self.ratings_tails = {name: JsonlTail(path) for name, path in self.ratings_paths.items()}
+
+    def reset_items(self) -> None:
+        self.items_by_key = {}
+        self.manifest_tail = JsonlTail(self.manifest_path)
+        self.manifest_last_id = 0
+
+    def apply_plan_records(self, plan_name: str, records: List[dict]) -> None:
+        decoder = self.plan_decoders[plan_name]
+        for record in records:
+            data = decoder.feed(record)
+            if data is None:
                 continue
-            for line in ratings_path.read_text(encoding="utf-8").splitlines():
-                if not line.strip():
-                    continue
-                try:
-                    data = json.loads(line)
-                except Exception:
-                    continue
-                rec_plan = data.get("plan_name") or plan_name
-                if rec_plan not in self.plan_names:
-                    continue
-                idx = data.get("index")
-                rating = data.get("rating")
-                if not isinstance(idx, int) or rating not in (0, 1, 2):
-                    continue
-                key = f"{rec_plan}:{idx}"
-                mapping[key] = int(rating)
-        return mapping
+            try:
+                idx = int(data["index"])
+            except Exception:
+                continue
+            self.plan_by_key[f"{plan_name}:{idx}"] = data
+
+    def apply_rating_record(self, plan_name: str, data: dict) -> None:
+        rec_plan = data.get("plan_name") or plan_name
+        if rec_plan not in self.plan_names:
+            return
+        idx = data.get("index")
+        rating = data.get("rating")
+        if not isinstance(idx, int) or rating not in (0, 1, 2):
+            return
+        self.ratings[f"{rec_plan}:{idx}"] = int(rating)
 
     def build_words(self, axis_id: str, slots: dict) -> str:
         keys = AXIS_WORDS.get(axis_id)
@@ -122,59 +176,73 @@ class RaterState:
                 tags_by_cat.setdefault(cat, set()).add(tag)
         return {cat: sorted(tags) for cat, tags in tags_by_cat.items()}
 
-    def load_items(self) -> List[dict]:
-        if not self.manifest_path.exists():
-            return []
-        items_by_key: Dict[str, dict] = {}
-        for line in self.manifest_path.read_text(encoding="utf-8").splitlines():
-            if not line.strip():
-                continue
-            try:
-                rec = json.loads(line)
-            except Exception:
-                continue
-            plan_name = rec.get("plan_name")
-            if plan_name not in self.plan_names:
-                continue
-            if rec.get("status") != "success":
-                continue
-            fname = rec.get("final_image_filename")
-            axis_id = rec.get("axis_id")
-            if not fname or not axis_id:
-                continue
-            img_path = self.images_root / axis_id / fname
-            if not img_path.exists():
-                continue
-            index = rec.get("index")
-            if not isinstance(index, int):
-                continue
-            key = f"{plan_name}:{index}"
-            plan_item = self.plan_by_key.get(key)
-            if not plan_item:
-                continue
-            words = self.build_words(axis_id, plan_item.get("slots") or {})
-            item = {
-                "index": index,
-                "axis_id": axis_id,
-                "image_url": f"/images/{axis_id}/{fname}",
-                "words": words,
-                "final_image_filename": fname,
-                "slot_tags": plan_item.get("slot_tags") or {},
-                "plan_name": plan_name,
-                "uid": key,
-            }
-            existing = items_by_key.get(key)
-            if not existing:
-                items_by_key[key] = item
-                continue
-            existing_pref = self.is_preferred_filename(existing["final_image_filename"], plan_name)
-            new_pref = self.is_preferred_filename(fname, plan_name)
-            if new_pref and not existing_pref:
-                items_by_key[key] = item
-                continue
-            if new_pref == existing_pref:
-                items_by_key[key] = item
-        return list(items_by_key.values())
+    def read_new_ratings_records(self) -> Tuple[bool, List[Tuple[str, dict]]]:
+        reset = False
+        records: List[Tuple[str, dict]] = []
+        for plan_name, ratings_path in list(self.ratings_paths.items()):
+            tail = self.ratings_tails.setdefault(plan_name, JsonlTail(ratings_path))
+            tail_reset, new_records = tail.read_new()
+            reset = reset or tail_reset
+            records.extend((plan_name, rec) for rec in new_records)
+        return reset, records
+
+    def read_new_manifest_records(self) -> Tuple[bool, List[dict]]:
+        """(reset, records) appended since the last read; reset means the manifest was rewritten."""
+        if is_sqlite_manifest(self.manifest_path):
+            if not self.manifest_path.exists():
+                return False, []
+            db = open_sqlite_manifest(self.manifest_path)
+            records: List[dict] = []
+            for row_id, rec in db.iter_records(
+                plan_names=self.plan_names, status="success", after_id=self.manifest_last_id
+            ):
+                self.manifest_last_id = row_id
+                records.append(rec)
+            return False, records
+        return self.manifest_tail.read_new()
+
+    def apply_manifest_record(self, rec: dict) -> None:
+        plan_name = rec.get("plan_name")
+        if plan_name not in self.plan_names:
+            return
+        if rec.get("status") != "success":
+            return
+        fname = rec.get("final_image_filename")
+        axis_id = rec.get("axis_id")
+        if not fname or not axis_id:
+            return
+        img_path = self.images_root / axis_id / fname
+        if not img_path.exists():
+            return
+        index = rec.get("index")
+        if not isinstance(index, int):
+            return
+        key = f"{plan_name}:{index}"
+        plan_item = self.plan_by_key.get(key)
+        if not plan_item:
+            return
+        words = self.build_words(axis_id, plan_item.get("slots") or {})
+        item = {
+            "index": index,
+            "axis_id": axis_id,
+            "image_url": f"/images/{axis_id}/{fname}",
+            "words": words,
+            "final_image_filename": fname,
+            "slot_tags": plan_item.get("slot_tags") or {},
+            "plan_name": plan_name,
+            "uid": key,
+        }
+        existing = self.items_by_key.get(key)
+        if not existing:
+            self.items_by_key[key] = item
+            return
+        existing_pref = self.is_preferred_filename(existing["final_image_filename"], plan_name)
+        new_pref = self.is_preferred_filename(fname, plan_name)
+        if new_pref and not existing_pref:
+            self.items_by_key[key] = item
+            return
+        if new_pref == existing_pref:
+            self.items_by_key[key] = item
 
     def ordered_items(self, seed: Optional[int], items: Optional[List[dict]] = None) -> List[dict]:
         base = items if items is not None else self.items
@@ -329,9 +397,13 @@ def build_app(state: RaterState) -> FastAPI:
         return {"tags": state.tag_options}
 
     @app.post("/api/reload")
-    def api_reload():
-        state.load_all()
-        return {"ok": True, "items": len(state.items)}
+    def api_reload(full: bool = False):
+        if full:
+            state.load_all()
+            added = len(state.items)
+        else:
+            added = state.refresh()
+        return {"ok": True, "items": len(state.items), "new_records": added}
 
     return app
 
@@ -561,6 +633,20 @@ HTML_TEMPLATE = """<!doctype html>
 """
 
 
+def start_auto_reload(state: RaterState, interval: float) -> threading.Thread:
+    def loop() -> None:
+        while True:
+            time.sleep(interval)
+            try:
+                state.refresh()
+            except Exception as exc:
+                print(f"[warn] auto reload failed: {exc}")
+
+    thread = threading.Thread(target=loop, name="rater-reload", daemon=True)
+    thread.start()
+    return thread
+
+
 def main() -> None:
     parser = argparse.ArgumentParser(description="Serendipity Mining local rater")
     parser.add_argument("--profile", type=str, default="4cats", help="Profile name (e.g., 3labs, 4cats)")
@@ -572,6 +658,18 @@ def main() -> None:
         help="Comma-separated plan names to load together (overrides --plan-name).",
     )
     parser.add_argument("--output", type=str, default="./out", help="Output root (default: ./out)")
+    parser.add_argument(
+        "--manifest-backend",
+        choices=["jsonl", "sqlite"],
+        default=None,
+        help="Manifest backend to read (jsonl: manifest.jsonl, sqlite: manifest.sqlite; default: manifest_backend in config)",
+    )
+    parser.add_argument(
+        "--reload-interval",
+        type=float,
+        default=0.0,
+        help="Seconds between automatic incremental reloads (0 = only on /api/reload)",
+    )
     parser.add_argument("--host", type=str, default="127.0.0.1", help="Host")
     parser.add_argument("--port", type=int, default=8000, help="Port")
     args = parser.parse_args()
@@ -582,7 +680,10 @@ def main() -> None:
         plan_names = [p.strip() for p in args.plan_names.split(",") if p.strip()]
     else:
         plan_names = [args.plan_name]
-    state = RaterState(args.profile, plan_names, output_dir)
+    manifest_backend = args.manifest_backend or load_profile_config(args.profile).get("manifest_backend")
+    state = RaterState(args.profile, plan_names, output_dir, default_manifest_path(output_dir, manifest_backend))
+    if args.reload_interval > 0:
+        start_auto_reload(state, args.reload_interval)
     app = build_app(state)
 
     import uvicorn
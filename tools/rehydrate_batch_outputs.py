@@ -20,7 +20,9 @@ if str(REPO_ROOT) not in sys.path:
     sys.path.insert(0, str(REPO_ROOT))
 
 from src.config_loader import load_profile_config
-from src.output_handler import append_to_manifest, save_images, save_metadata
+from src.data_manager import iter_plan
+from src.manifest_store import default_manifest_path
+from src.output_handler import append_to_manifest, load_manifest_by_index, save_images, save_metadata
 
 
 def parse_batch_key(key: str) -> tuple[str | None, str | None, int | None]:
@@ -100,10 +102,7 @@ def handle_error_metadata(metadata: Dict[str, Any], error_info: Dict[str, Any])
 
 def load_plan(plan_path: Path) -> dict[int, dict]:
     plan_by_index: dict[int, dict] = {}
-    for line in plan_path.read_text(encoding="utf-8").splitlines():
-        if not line.strip():
-            continue
-        item = json.loads(line)
+    for item in iter_plan(plan_path):
         idx = item.get("index")
         if isinstance(idx, int):
             plan_by_index[idx] = item
@@ -112,19 +111,10 @@ def load_plan(plan_path: Path) -> dict[int, dict]:
 
 def load_latest_success(manifest_path: Path, plan_name: str) -> dict[int, str]:
     latest: dict[int, str] = {}
-    if not manifest_path.exists():
-        return latest
-    for line in manifest_path.read_text(encoding="utf-8").splitlines():
-        if not line.strip():
-            continue
-        rec = json.loads(line)
-        if rec.get("plan_name") != plan_name:
-            continue
-        if rec.get("status") != "success":
-            continue
-        idx = rec.get("index")
+    records = load_manifest_by_index(manifest_path, plan_name=plan_name, success_only=True)
+    for idx, rec in records.items():
         fname = rec.get("final_image_filename")
-        if isinstance(idx, int) and isinstance(fname, str):
+        if isinstance(fname, str):
             latest[idx] = fname
     return latest
 
@@ -146,8 +136,9 @@ def main() -> None:
     batch_outputs_dir = (
         Path(args.batch_outputs_dir) if args.batch_outputs_dir else output_dir / "batch_outputs"
     )
+    cfg = load_profile_config(profile)
     plan_path = output_dir / f"{plan_name}.jsonl"
-    manifest_path = output_dir / "manifest.jsonl"
+    manifest_path = default_manifest_path(output_dir, cfg.get("manifest_backend"))
     images_root = output_dir / "images"
     meta_root = output_dir / "meta"
 
@@ -158,7 +149,6 @@ def main() -> None:
         print(f"[error] batch_outputs not found: {batch_outputs_dir}")
         return
 
-    cfg = load_profile_config(profile)
     image_size = str(cfg.get("image_config", {}).get("image_size", "2K"))
     domain_injection = str(cfg.get("domain_injection", "context_and_hints"))
     model_name_meta = "models/gemini-3-pro-image-preview"